@@ -0,0 +1,194 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+import pymysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, get_db_config
+
+# Runs against its own database so the seeded rows never touch real data.
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'pdf_tools_bench')
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+SCHEMA = [
+    """
+    CREATE TABLE users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        session_id VARCHAR(64) NOT NULL,
+        first_visit DATETIME NOT NULL,
+        last_visit DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE operations (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        operation_type VARCHAR(50) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        file_count INT NOT NULL,
+        file_size BIGINT NOT NULL,
+        processing_time_ms INT NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+    """,
+]
+
+OPERATION_TYPES = ['split_pdf', 'merge_pdfs', 'compress_pdf', 'pdf_to_doc', 'doc_to_pdf', 'extract_images', 'images_to_pdf', 'resize_image', 'compress_image']
+
+# The per-figure queries get_dashboard_stats used to issue, one connection per call.
+LEGACY_QUERIES = [
+    ("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(last_visit) = %s", 'today'),
+    ("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(first_visit) = %s", 'today'),
+    ("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s", 'today'),
+    ("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'success'", 'today'),
+    ("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'failed'", 'today'),
+    ("SELECT COALESCE(SUM(file_size), 0) as total FROM operations WHERE DATE(created_at) = %s", 'today'),
+    ("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(last_visit) = %s", 'yesterday'),
+    ("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(first_visit) = %s", 'yesterday'),
+    ("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s", 'yesterday'),
+    ("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'success'", 'yesterday'),
+    ("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'failed'", 'yesterday'),
+    ("SELECT COALESCE(SUM(file_size), 0) as total FROM operations WHERE DATE(created_at) = %s", 'yesterday'),
+    ("SELECT COUNT(DISTINCT id) as count FROM users", None),
+    ("SELECT COUNT(*) as count FROM operations", None),
+    ("SELECT COUNT(*) as count FROM operations WHERE status = 'success'", None),
+    ("SELECT COUNT(*) as count FROM operations WHERE status = 'failed'", None),
+    ("SELECT COALESCE(SUM(file_size), 0) as total FROM operations", None),
+    ("SELECT COALESCE(AVG(processing_time_ms), 0) as avg_time FROM operations", None),
+    ("""SELECT operation_type, COUNT(*) as count,
+            COUNT(CASE WHEN status = 'success' THEN 1 END) as successful,
+            COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
+            COALESCE(AVG(processing_time_ms), 0) as avg_time
+        FROM operations WHERE created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+        GROUP BY operation_type ORDER BY count DESC""", None),
+    ("""SELECT o.operation_type, o.status, o.file_count, o.processing_time_ms, o.created_at, u.session_id
+        FROM operations o LEFT JOIN users u ON o.user_id = u.id
+        ORDER BY o.created_at DESC LIMIT 10""", None),
+]
+
+def bench_config():
+    config = get_db_config()
+    config['db'] = BENCH_DB_NAME
+    config['read_timeout'] = config['write_timeout'] = 600
+    return config
+
+def seed(config, users, operations, days, batch=10000):
+    server = {k: v for k, v in config.items() if k != 'db'}
+    connection = pymysql.connect(autocommit=True, **server)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{BENCH_DB_NAME}`")
+    cursor.execute(f"CREATE DATABASE `{BENCH_DB_NAME}`")
+    cursor.execute(f"USE `{BENCH_DB_NAME}`")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    rng = random.Random(42)
+    now = datetime.now()
+    span = days * 86400
+
+    rows = []
+    for i in range(users):
+        first = now - timedelta(seconds=rng.randint(0, span))
+        last = first + timedelta(seconds=rng.randint(0, int((now - first).total_seconds())))
+        rows.append((f"session-{i}", first, last))
+        if len(rows) >= batch:
+            cursor.executemany("INSERT INTO users (session_id, first_visit, last_visit) VALUES (%s, %s, %s)", rows)
+            rows = []
+    if rows:
+        cursor.executemany("INSERT INTO users (session_id, first_visit, last_visit) VALUES (%s, %s, %s)", rows)
+
+    rows = []
+    for i in range(operations):
+        rows.append((
+            rng.randint(1, users),
+            rng.choice(OPERATION_TYPES),
+            'success' if rng.random() < 0.93 else 'failed',
+            rng.randint(1, 5),
+            rng.randint(10_000, 50_000_000),
+            rng.randint(20, 20_000),
+            now - timedelta(seconds=rng.randint(0, span)),
+        ))
+        if len(rows) >= batch:
+            cursor.executemany(
+                "INSERT INTO operations (user_id, operation_type, status, file_count, file_size, processing_time_ms, created_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+            rows = []
+            print(f"\rseeded {i + 1:,} operations", end="", flush=True)
+    if rows:
+        cursor.executemany(
+            "INSERT INTO operations (user_id, operation_type, status, file_count, file_size, processing_time_ms, created_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+    print()
+    connection.close()
+
+def apply_migration(config, name):
+    connection = pymysql.connect(autocommit=True, **config)
+    cursor = connection.cursor()
+    with open(os.path.join(MIGRATIONS, name)) as f:
+        statements = [s.strip() for s in f.read().split(';')]
+    for statement in statements:
+        lines = [line for line in statement.splitlines() if not line.strip().startswith('--')]
+        if any(line.strip() for line in lines):
+            cursor.execute('\n'.join(lines))
+    cursor.execute("ANALYZE TABLE users, operations")
+    connection.close()
+
+def run_legacy(config):
+    connection = pymysql.connect(**config)
+    cursor = connection.cursor()
+    today = datetime.now().date()
+    dates = {'today': today, 'yesterday': today - timedelta(days=1)}
+    for sql, day in LEGACY_QUERIES:
+        cursor.execute(sql, (dates[day],) if day else None)
+        cursor.fetchall()
+    connection.close()
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard stats query benchmark")
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--operations", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the tables from a previous run")
+    args = parser.parse_args()
+
+    config = bench_config()
+    if not args.skip_seed:
+        print(f"Seeding {args.users:,} users and {args.operations:,} operations into {BENCH_DB_NAME}")
+        seed(config, args.users, args.operations, args.days)
+        print("Backfilling dashboard_daily_rollups...")
+        apply_migration(config, '002_dashboard_daily_rollups.sql')
+    manager = DatabaseManager(config)
+    manager.compute_dashboard_stats()
+
+    print("Dashboard stats benchmark (median of %d)" % args.repeat)
+    print("=" * 70)
+    results = [
+        ("legacy, no indexes", timed(lambda: run_legacy(config), args.repeat)),
+        ("pooled rollups, no indexes", timed(manager.compute_dashboard_stats, args.repeat)),
+    ]
+    print("Applying index migration...")
+    apply_migration(config, '001_dashboard_indexes.sql')
+    results += [
+        ("legacy, indexed", timed(lambda: run_legacy(config), args.repeat)),
+        ("pooled rollups, indexed", timed(manager.compute_dashboard_stats, args.repeat)),
+    ]
+    baseline = results[0][1]
+    for label, elapsed in results:
+        print(f"{label:<30} {elapsed * 1000:10.1f} ms  {baseline / elapsed:6.1f}x")
+    manager.pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_tools import balance_shards, extract_image_shard, plan_image_extraction
+
+PAGE_COUNTS = [50, 200, 500]
+
+def png(size, seed):
+    rng = random.Random(seed)
+    image = Image.frombytes('RGB', size, bytes(rng.getrandbits(8) for _ in range(size[0] * size[1] * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def make_pdf(path, pages, photo_every):
+    # A letterhead logo and a footer icon on every page, plus an occasional
+    # photo: the shape of a typical template-heavy report.
+    logo, icon = png((400, 160), 1), png((12, 12), 2)
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(36, 20, 236, 100), stream=logo)
+        page.insert_image(fitz.Rect(560, 800, 572, 812), stream=icon)
+        if i % photo_every == 0:
+            page.insert_image(fitz.Rect(72, 200, 520, 500), stream=png((320, 240), 100 + i))
+    doc.save(path)
+    doc.close()
+
+def run_legacy(path, out_dir):
+    # The loop extract_images used before: every placement is written out.
+    paths = []
+    with fitz.open(path) as doc:
+        for page_num in range(len(doc)):
+            for img_index, img in enumerate(doc.get_page_images(page_num)):
+                base_image = doc.extract_image(img[0])
+                image_path = os.path.join(out_dir, f"doc_page{page_num + 1}_img{img_index + 1}.{base_image['ext']}")
+                with open(image_path, "wb") as f:
+                    f.write(base_image["image"])
+                paths.append(image_path)
+    return paths
+
+def run_deduped(executor, workers, path, out_dir, min_size):
+    jobs = plan_image_extraction(path, min_size)
+    shards = [shard for shard in balance_shards(jobs, workers, lambda job: job[3]) if shard]
+    futures = [executor.submit(extract_image_shard, path, out_dir, "doc", shard) for shard in shards]
+    return [p for future in futures for p in future.result()]
+
+def timed(func, out_dir):
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    start = time.perf_counter()
+    paths = func()
+    elapsed = time.perf_counter() - start
+    return elapsed, len(paths), sum(os.path.getsize(p) for p in paths)
+
+def main():
+    parser = argparse.ArgumentParser(description="Image extraction benchmark")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--photo-every", type=int, default=25, help="one unique photo every N pages")
+    parser.add_argument("--min-size", type=int, default=16)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_extract_")
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        list(executor.map(abs, range(args.workers)))
+        print(f"Image extraction benchmark ({args.workers} workers, min size {args.min_size}px)")
+        print("=" * 78)
+        for pages in PAGE_COUNTS:
+            path = os.path.join(tmp, f"doc_{pages}.pdf")
+            make_pdf(path, pages, args.photo_every)
+            out_dir = os.path.join(tmp, "out")
+            results = [
+                ("legacy", timed(lambda: run_legacy(path, out_dir), out_dir)),
+                ("deduped", timed(lambda: run_deduped(executor, args.workers, path, out_dir, 0), out_dir)),
+                (f"deduped >= {args.min_size}px", timed(lambda: run_deduped(executor, args.workers, path, out_dir, args.min_size), out_dir)),
+            ]
+            baseline = results[0][1][0]
+            for label, (elapsed, files, size) in results:
+                print(f"{pages:4d} pages  {label:<16} {elapsed * 1000:9.1f} ms  {files:5d} files  "
+                      f"{size / 1024 / 1024:8.2f} MB  {baseline / elapsed:6.1f}x")
+    finally:
+        executor.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
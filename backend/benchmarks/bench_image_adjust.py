@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import subprocess
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image, ImageEnhance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_tools import apply_adjustments, apply_sharpen
+
+SIZES = [(1600, 1200), (4000, 3000), (8000, 6000)]
+
+CASES = {
+    "brightness": [("brightness", 1.2)],
+    "contrast": [("contrast", 1.3)],
+    "saturation": [("saturation", 1.4)],
+    "b+c+s": [("brightness", 1.2), ("contrast", 1.3), ("saturation", 1.4)],
+    "sharpen": "sharpen",
+}
+
+ENHANCERS = {
+    "brightness": ImageEnhance.Brightness,
+    "contrast": ImageEnhance.Contrast,
+    "saturation": ImageEnhance.Color,
+}
+
+def make_photo(width, height):
+    base = Image.linear_gradient("L").resize((width, height))
+    return Image.merge("RGB", (base, base.transpose(Image.FLIP_LEFT_RIGHT), Image.effect_noise((width, height), 40)))
+
+def run_pillow(img, case):
+    # The previous implementation: one ImageEnhance blend per adjustment.
+    if case == "sharpen":
+        return ImageEnhance.Sharpness(img).enhance(1.5)
+    for name, factor in case:
+        img = ENHANCERS[name](img).enhance(factor)
+    return img
+
+def run_fused(img, case):
+    if case == "sharpen":
+        return apply_sharpen(img, 1.5)
+    return apply_adjustments(img, case)
+
+ENGINES = {"pillow": run_pillow, "fused": run_fused}
+
+def memory_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+def child(engine, case, path, repeat):
+    # Runs in a fresh interpreter and measures the peak above the loaded
+    # source image. ru_maxrss would carry over the parent's peak through
+    # exec, so the kernel's high-water mark is reset and read instead (Linux).
+    img = Image.open(path)
+    img.load()
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    baseline_kb = memory_kb('VmRSS')
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = ENGINES[engine](img, CASES[case])
+        timings.append(time.perf_counter() - start)
+        del result
+    peak_kb = memory_kb('VmHWM')
+    print(json.dumps({'seconds': min(timings), 'extra_mb': (peak_kb - baseline_kb) / 1024}))
+
+def measure(engine, case, path, repeat):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', engine, case, path, '--repeat', str(repeat)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def max_difference(img, case):
+    a = np.asarray(run_pillow(img, CASES[case]), dtype=np.int16)
+    b = np.asarray(run_fused(img, CASES[case]), dtype=np.int16)
+    return int(np.abs(a - b).max())
+
+def main():
+    parser = argparse.ArgumentParser(description="Image adjustment benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="*", default=list(CASES))
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        engine, case, path = args.child
+        child(engine, case, path, args.repeat)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="bench_image_adjust_")
+    try:
+        print("Image adjustment benchmark (extra peak RSS over the decoded source)")
+        print("=" * 86)
+        for width, height in SIZES:
+            img = make_photo(width, height)
+            path = os.path.join(tmp, f"photo_{width}x{height}.ppm")
+            img.save(path)
+            print(f"\n{width}x{height} RGB ({width * height * 4 / 1024 / 1024:.0f} MB in memory)")
+            for case in args.cases:
+                pillow = measure("pillow", case, path, args.repeat)
+                fused = measure("fused", case, path, args.repeat)
+                print(f"   {case:<11} pillow {pillow['seconds'] * 1000:8.1f} ms {pillow['extra_mb']:7.1f} MB   "
+                      f"fused {fused['seconds'] * 1000:8.1f} ms {fused['extra_mb']:7.1f} MB   "
+                      f"{pillow['seconds'] / fused['seconds']:5.2f}x  max diff {max_difference(img, case)}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import io
+import math
+import multiprocessing
+import os
+import sys
+import time
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_tools import center_crop_image, resize_image
+
+def make_photo(width, height, format):
+    # Smooth gradients plus noise behaves more like a photo than pure noise.
+    base = Image.linear_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (base, base.transpose(Image.FLIP_LEFT_RIGHT), base.rotate(90).resize((width, height))))
+    img = Image.blend(img, Image.effect_noise((width, height), 20).convert("RGB"), 0.15)
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, quality=92)
+    return buffer.getvalue()
+
+def full_decode_resize(source, width, height):
+    img = Image.open(source)
+    img.load()
+    return img.resize((width, height))
+
+def full_decode_center_crop(source, width, height):
+    img = Image.open(source)
+    img.load()
+    left = (img.width - width) // 2
+    top = (img.height - height) // 2
+    return img.crop((left, top, left + width, top + height))
+
+CASES = {
+    "resize": (full_decode_resize, resize_image),
+    "center-crop": (full_decode_center_crop, center_crop_image),
+}
+
+def psnr(a, b):
+    diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    mse = sum(value ** 2 for value in ImageStat.Stat(diff).rms) / 3
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+def peak_rss_kb():
+    # VmHWM starts fresh with each exec, unlike ru_maxrss which survives it.
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+def _measure(func, data, width, height, queue):
+    start = time.perf_counter()
+    out = func(io.BytesIO(data), width, height)
+    out.load()
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, peak_rss_kb(), out.tobytes(), out.mode, out.size))
+
+def measure(func, data, width, height):
+    # Each run gets a fresh process so peak RSS reflects only that decode.
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(func, data, width, height, queue))
+    process.start()
+    elapsed, max_rss, raw, mode, size = queue.get()
+    process.join()
+    return elapsed, max_rss, Image.frombytes(mode, size, raw)
+
+def main():
+    print("Reduced-resolution decode benchmark")
+    print("=" * 70)
+    for format in ["JPEG", "PNG"]:
+        for source_size in [(4000, 3000), (8000, 6000)]:
+            data = make_photo(*source_size, format)
+            for case, target in [("resize", (400, 300)), ("resize", (1000, 750)), ("center-crop", (800, 600))]:
+                baseline, optimized = CASES[case]
+                base_time, base_rss, base_img = measure(baseline, data, *target)
+                opt_time, opt_rss, opt_img = measure(optimized, data, *target)
+                quality = psnr(base_img, opt_img)
+                print(f"{format:<5} {source_size[0]}x{source_size[1]} {case:<11} -> {target[0]}x{target[1]}: "
+                      f"time {base_time * 1000:7.1f} -> {opt_time * 1000:7.1f} ms, "
+                      f"peak RSS {base_rss // 1024:5d} -> {opt_rss // 1024:5d} MB, "
+                      f"PSNR {quality:6.1f} dB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import time
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_tools import encode_image, parse_pipeline, run_image_pipeline, IMAGE_OPERATIONS
+
+OPERATIONS = [
+    {"operation": "crop-image", "params": {"left": 200, "top": 150, "right": 3800, "bottom": 2850}},
+    {"operation": "resize-image", "params": {"width": 1200, "height": 900}},
+    {"operation": "rotate-image", "params": {"angle": 90}},
+    {"operation": "adjust-brightness", "params": {"factor": 1.1}},
+    {"operation": "adjust-contrast", "params": {"factor": 1.2}},
+    {"operation": "apply-sharpen", "params": {"factor": 1.5}},
+]
+
+def make_source(width=4000, height=3000):
+    img = Image.effect_noise((width, height), 40).convert("RGB")
+    data, _ = encode_image(img, "JPEG", quality=90)
+    return bytes(data)
+
+def run_chained(source):
+    # One decode/encode round trip per operation, like calling each endpoint in turn.
+    data = source
+    for operation in OPERATIONS:
+        func, spec = IMAGE_OPERATIONS[operation["operation"]]
+        args = [cast(operation["params"][name]) for name, cast in spec]
+        img = func(io.BytesIO(data), *args)
+        data = bytes(encode_image(img, "JPEG", quality=90)[0])
+    return data
+
+def run_pipeline(source):
+    steps, _ = parse_pipeline(OPERATIONS)
+    img = run_image_pipeline(io.BytesIO(source), steps)
+    return bytes(encode_image(img, "JPEG", quality=90)[0])
+
+def bench(label, func, source, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(source)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"   {label:<10} best {best * 1000:8.1f} ms   mean {sum(timings) / len(timings) * 1000:8.1f} ms")
+    return best
+
+def main():
+    print("Image pipeline benchmark")
+    print("=" * 50)
+    for width, height in [(1600, 1200), (4000, 3000)]:
+        source = make_source(width, height)
+        print(f"\n{width}x{height} JPEG, {len(OPERATIONS)} operations")
+        chained = bench("chained", run_chained, source)
+        pipeline = bench("pipeline", run_pipeline, source)
+        print(f"   speedup    {chained / pipeline:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import fitz
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_tools import merge_pdf_files
+
+INPUT_COUNTS = [2, 8, 32, 64]
+
+def make_logo():
+    # Noise does not compress, so each copy of the image weighs its full size.
+    rng = random.Random(7)
+    image = Image.frombytes('RGB', (600, 600), bytes(rng.getrandbits(8) for _ in range(600 * 600 * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def make_inputs(directory, count, pages, image_kb):
+    # Every input embeds the same "logo" and its own full-page scan, like a
+    # batch of scanned letters on the same letterhead.
+    logo = make_logo()
+    rng = random.Random(11)
+    paths = []
+    for i in range(count):
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(36, 36, 136, 136), stream=logo)
+            scan = Image.frombytes('L', (image_kb * 4, 256), bytes(rng.getrandbits(8) for _ in range(image_kb * 1024)))
+            buffer = io.BytesIO()
+            scan.save(buffer, format='PNG')
+            page.insert_image(fitz.Rect(36, 160, 576, 760), stream=buffer.getvalue())
+            page.insert_text((160, 80), f"Letter {i + 1}, page {p + 1}", fontsize=14)
+        path = os.path.join(directory, f"input_{i}.pdf")
+        doc.save(path, deflate=True)
+        doc.close()
+        paths.append(path)
+    return paths
+
+def child(engine, paths, output, flush_pages):
+    # Runs in a fresh interpreter so ru_maxrss is the peak of this merge alone.
+    start = time.perf_counter()
+    merge_pdf_files(paths, output, engine=engine, flush_pages=flush_pages)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': elapsed, 'peak_mb': peak_kb / 1024, 'output_mb': os.path.getsize(output) / 1024 / 1024}))
+
+def measure(engine, paths, output, flush_pages):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', engine, '--flush-pages', str(flush_pages), '--output', output, *paths],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge memory benchmark")
+    parser.add_argument("--pages", type=int, default=10, help="pages per input")
+    parser.add_argument("--image-kb", type=int, default=256, help="scan size per page")
+    parser.add_argument("--flush-pages", type=int, default=200)
+    parser.add_argument("--counts", type=int, nargs="*", default=INPUT_COUNTS)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.paths, args.output, args.flush_pages)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="bench_merge_")
+    try:
+        paths = make_inputs(tmp, max(args.counts), args.pages, args.image_kb)
+        input_mb = os.path.getsize(paths[0]) / 1024 / 1024
+        print(f"Merge benchmark ({args.pages} pages and {input_mb:.1f} MB per input, flush every {args.flush_pages} pages)")
+        print("=" * 78)
+        for count in args.counts:
+            for engine in ("pypdf2", "pymupdf"):
+                result = measure(engine, paths[:count], os.path.join(tmp, "merged.pdf"), args.flush_pages)
+                print(f"{count:4d} inputs ({count * input_mb:7.1f} MB)  {engine:<8} peak RSS {result['peak_mb']:7.1f} MB  "
+                      f"output {result['output_mb']:7.1f} MB  {result['seconds']:6.2f} s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
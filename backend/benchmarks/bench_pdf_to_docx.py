@@ -0,0 +1,84 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_tools import convert_pdf_to_docx, make_docx_from_shards, parse_docx_shard, plan_docx_shards
+
+PAGE_COUNTS = [5, 25, 100, 300]
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {i + 1}", fontsize=18)
+        page.insert_textbox(fitz.Rect(72, 110, 520, 480), "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 25, fontsize=10)
+        for row in range(6):
+            for col in range(4):
+                rect = fitz.Rect(72 + col * 110, 500 + row * 20, 182 + col * 110, 520 + row * 20)
+                page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                page.insert_textbox(rect + (3, 3, -3, -3), f"r{row}c{col}", fontsize=8)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def run_sharded(executor, path, docx_path, pages, workers, min_shard_pages):
+    shards = plan_docx_shards(pages, workers, min_shard_pages)
+    if len(shards) == 1:
+        return executor.submit(convert_pdf_to_docx, path, docx_path).result(), 1
+    json_paths = [f"{docx_path}.{i}.json" for i in range(len(shards))]
+    futures = [executor.submit(parse_docx_shard, path, start, end, json_path) for (start, end), json_path in zip(shards, json_paths)]
+    for future in futures:
+        future.result()
+    make_docx_from_shards(path, json_paths, docx_path)
+    return docx_path, len(shards)
+
+def run_files_parallel(executor, paths, out_dir):
+    futures = [executor.submit(convert_pdf_to_docx, path, os.path.join(out_dir, f"parallel_{i}.docx")) for i, path in enumerate(paths)]
+    return [future.result() for future in futures]
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF to DOCX conversion benchmark")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--min-shard-pages", type=int, default=16)
+    parser.add_argument("--pages", type=int, nargs="*", default=PAGE_COUNTS)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    tmp = tempfile.mkdtemp(prefix="bench_pdf_to_docx_")
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        list(executor.map(abs, range(args.workers)))
+        print(f"PDF to DOCX benchmark ({args.workers} workers, min {args.min_shard_pages} pages per shard)")
+        print("=" * 70)
+        paths = []
+        for pages in args.pages:
+            path = os.path.join(tmp, f"doc_{pages}.pdf")
+            make_pdf(path, pages)
+            paths.append(path)
+            serial, _ = timed(lambda: convert_pdf_to_docx(path, os.path.join(tmp, "serial.docx")))
+            sharded, (_, shards) = timed(lambda: run_sharded(executor, path, os.path.join(tmp, "sharded.docx"), pages, args.workers, args.min_shard_pages))
+            print(f"{pages:5d} pages  serial {serial:8.2f} s  sharded x{shards:<2d} {sharded:8.2f} s  {serial / sharded:5.1f}x")
+
+        print("-" * 70)
+        serial, _ = timed(lambda: [convert_pdf_to_docx(path, os.path.join(tmp, "serial.docx")) for path in paths])
+        parallel, _ = timed(lambda: run_files_parallel(executor, paths, tmp))
+        print(f"{len(paths)} files  one after another {serial:8.2f} s  in parallel {parallel:8.2f} s  {serial / parallel:5.1f}x")
+    finally:
+        executor.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
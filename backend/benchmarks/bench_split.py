@@ -0,0 +1,77 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_tools import plan_split, shard_ranges, split_pdf_ranges
+
+PAGE_COUNTS = [10, 100, 1000, 5000]
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}", fontsize=24)
+        page.insert_textbox(fitz.Rect(72, 120, 520, 760), "Lorem ipsum dolor sit amet. " * 60, fontsize=10)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def run_serial(path, out_dir, ranges, engine):
+    return split_pdf_ranges(path, out_dir, ranges, engine)
+
+def run_sharded(executor, workers, path, out_dir, ranges, min_shard_pages):
+    shards = [s for s in shard_ranges(ranges, workers, min_shard_pages) if s]
+    futures = [executor.submit(split_pdf_ranges, path, out_dir, shard, "pymupdf") for shard in shards]
+    return [p for future in futures for p in future.result()]
+
+def timed(func, out_dir):
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    start = time.perf_counter()
+    outputs = func()
+    return time.perf_counter() - start, len(outputs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Split engine benchmark")
+    parser.add_argument("--split-type", default="one-one", choices=["one-one", "two-two"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--min-shard-pages", type=int, default=64)
+    parser.add_argument("--max-legacy-pages", type=int, default=1000,
+                        help="skip the PyPDF2 baseline above this many pages")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_split_")
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        # Warm the pool so process start-up is not billed to the first case.
+        list(executor.map(abs, range(args.workers)))
+        print(f"Split benchmark ({args.split_type}, {args.workers} workers)")
+        print("=" * 70)
+        for pages in PAGE_COUNTS:
+            path = os.path.join(tmp, f"doc_{pages}.pdf")
+            make_pdf(path, pages)
+            ranges = plan_split(pages, "doc.pdf", args.split_type)
+            out_dir = os.path.join(tmp, "out")
+            results = []
+            if pages <= args.max_legacy_pages:
+                results.append(("pypdf2 serial", timed(lambda: run_serial(path, out_dir, ranges, "pypdf2"), out_dir)))
+            results.append(("pymupdf serial", timed(lambda: run_serial(path, out_dir, ranges, "pymupdf"), out_dir)))
+            results.append(("pymupdf sharded", timed(
+                lambda: run_sharded(executor, args.workers, path, out_dir, ranges, args.min_shard_pages), out_dir)))
+            baseline = results[0][1][0]
+            for label, (elapsed, outputs) in results:
+                print(f"{pages:5d} pages  {label:<16} {elapsed * 1000:9.1f} ms  "
+                      f"{outputs:5d} files  {baseline / elapsed:5.1f}x")
+    finally:
+        executor.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
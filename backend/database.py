@@ -1,7 +1,14 @@
+import asyncio
 import os
+import queue
+import threading
+import time
 import pymysql
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import partial
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -29,90 +36,335 @@ def to_json_serializable(obj):
         return float(obj)
     return obj
 
-class DatabaseManager:
-    def __init__(self):
-        self.config = get_db_config()
+def get_pool_config():
+    return {
+        'size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'timeout_seconds': float(os.getenv('DB_POOL_TIMEOUT_SECONDS', '10')),
+        'ping_interval_seconds': float(os.getenv('DB_POOL_PING_INTERVAL_SECONDS', '30')),
+        'recycle_seconds': float(os.getenv('DB_POOL_RECYCLE_SECONDS', '3600')),
+        'query_timeout_seconds': float(os.getenv('DB_QUERY_TIMEOUT_SECONDS', '5')),
+    }
 
-    def get_connection(self):
-        return pymysql.connect(**self.config)
+class ConnectionPool:
+    # Bounded pool of reusable connections. Idle connections are pinged
+    # before reuse once they have sat for a while, and replaced once they
+    # reach the recycle age so the server's wait_timeout never bites.
+    def __init__(self, connect, config=None):
+        self.connect = connect
+        self.config = config or get_pool_config()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.config['size'])
+        self._counters = {'created': 0, 'reused': 0, 'discarded': 0, 'timeouts': 0}
+        self._in_use = {}
+        self._abandoned = set()
+        self._lock = threading.Lock()
 
-    def get_dashboard_stats(self):
+    def _take_idle(self):
+        while True:
+            try:
+                connection, created_at, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            now = time.monotonic()
+            if now - created_at > self.config['recycle_seconds']:
+                self._discard(connection)
+                continue
+            if now - last_used > self.config['ping_interval_seconds']:
+                try:
+                    connection.ping(reconnect=False)
+                except Exception:
+                    self._discard(connection)
+                    continue
+            self._counters['reused'] += 1
+            return connection, created_at
+
+    def _discard(self, connection):
+        self._counters['discarded'] += 1
         try:
-            connection = self.get_connection()
-            cursor = connection.cursor()
-            today = datetime.now().date()
-            yesterday = today - timedelta(days=1)
+            connection.close()
+        except Exception:
+            pass
 
-            # Today's stats
-            cursor.execute("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(last_visit) = %s", (today,))
-            today_visitors = cursor.fetchone()['count']
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.config['timeout_seconds']):
+            self._counters['timeouts'] += 1
+            raise TimeoutError("Timed out waiting for a database connection")
+        try:
+            taken = self._take_idle()
+            if taken is None:
+                taken = self.connect(), time.monotonic()
+                self._counters['created'] += 1
+            connection, created_at = taken
+            with self._lock:
+                self._in_use[threading.get_ident()] = connection
+            try:
+                yield connection
+            except Exception:
+                self._discard(connection)
+                raise
+            finally:
+                with self._lock:
+                    self._in_use.pop(threading.get_ident(), None)
+                    abandoned = connection in self._abandoned
+                    self._abandoned.discard(connection)
+            if connection.open and not abandoned:
+                self._idle.put((connection, created_at, time.monotonic()))
+            else:
+                self._discard(connection)
+        finally:
+            self._slots.release()
 
-            cursor.execute("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(first_visit) = %s", (today,))
-            today_new_visitors = cursor.fetchone()['count']
+    def abandon(self, thread_ident):
+        # The caller gave up on the query running on this thread's connection,
+        # so whatever state it ends in, the connection is closed rather than
+        # going back to the pool. Returns the connection, or None if the
+        # thread no longer holds one.
+        with self._lock:
+            connection = self._in_use.get(thread_ident)
+            if connection is not None:
+                self._abandoned.add(connection)
+            return connection
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s", (today,))
-            today_operations = cursor.fetchone()['count']
+    def close(self):
+        while True:
+            try:
+                connection, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'success'", (today,))
-            today_successful = cursor.fetchone()['count']
+    def stats(self):
+        return {**self._counters, 'idle': self._idle.qsize(), 'in_use': len(self._in_use), 'size': self.config['size']}
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'failed'", (today,))
-            today_failed = cursor.fetchone()['count']
+SUMMARY_QUERY = """
+    SELECT
+        tv.today_visitors, tv.yesterday_visitors,
+        tn.today_new_visitors, tn.yesterday_new_visitors,
+        w.today_operations, w.today_successful, w.today_failed, w.today_data_processed,
+        w.today_processing_time_ms, w.today_timed_operations,
+        w.yesterday_operations, w.yesterday_successful, w.yesterday_failed, w.yesterday_data_processed,
+        r.rollup_users, r.rollup_operations, r.rollup_successful, r.rollup_failed, r.rollup_data_processed,
+        r.rollup_processing_time_ms, r.rollup_timed_operations
+    FROM (
+        SELECT
+            COUNT(CASE WHEN last_visit >= %(today)s THEN 1 END) AS today_visitors,
+            COUNT(CASE WHEN last_visit < %(today)s THEN 1 END) AS yesterday_visitors
+        FROM users
+        WHERE last_visit >= %(yesterday)s AND last_visit < %(tomorrow)s
+    ) tv
+    CROSS JOIN (
+        SELECT
+            COUNT(CASE WHEN first_visit >= %(today)s THEN 1 END) AS today_new_visitors,
+            COUNT(CASE WHEN first_visit < %(today)s THEN 1 END) AS yesterday_new_visitors
+        FROM users
+        WHERE first_visit >= %(yesterday)s AND first_visit < %(tomorrow)s
+    ) tn
+    CROSS JOIN (
+        SELECT
+            COUNT(CASE WHEN created_at >= %(today)s THEN 1 END) AS today_operations,
+            COALESCE(SUM(created_at >= %(today)s AND status = 'success'), 0) AS today_successful,
+            COALESCE(SUM(created_at >= %(today)s AND status = 'failed'), 0) AS today_failed,
+            COALESCE(SUM(CASE WHEN created_at >= %(today)s THEN file_size END), 0) AS today_data_processed,
+            COALESCE(SUM(CASE WHEN created_at >= %(today)s THEN processing_time_ms END), 0) AS today_processing_time_ms,
+            COUNT(CASE WHEN created_at >= %(today)s THEN processing_time_ms END) AS today_timed_operations,
+            COUNT(CASE WHEN created_at < %(today)s THEN 1 END) AS yesterday_operations,
+            COALESCE(SUM(created_at < %(today)s AND status = 'success'), 0) AS yesterday_successful,
+            COALESCE(SUM(created_at < %(today)s AND status = 'failed'), 0) AS yesterday_failed,
+            COALESCE(SUM(CASE WHEN created_at < %(today)s THEN file_size END), 0) AS yesterday_data_processed
+        FROM operations
+        WHERE created_at >= %(yesterday)s AND created_at < %(tomorrow)s
+    ) w
+    CROSS JOIN (
+        SELECT
+            COALESCE(SUM(new_users), 0) AS rollup_users,
+            COALESCE(SUM(operations), 0) AS rollup_operations,
+            COALESCE(SUM(successful), 0) AS rollup_successful,
+            COALESCE(SUM(failed), 0) AS rollup_failed,
+            COALESCE(SUM(data_processed), 0) AS rollup_data_processed,
+            COALESCE(SUM(processing_time_ms), 0) AS rollup_processing_time_ms,
+            COALESCE(SUM(timed_operations), 0) AS rollup_timed_operations
+        FROM dashboard_daily_rollups
+        WHERE stat_date < %(today_date)s
+    ) r
+"""
 
-            cursor.execute("SELECT COALESCE(SUM(file_size), 0) as total FROM operations WHERE DATE(created_at) = %s", (today,))
-            today_data_processed = cursor.fetchone()['total']
+# Rolls closed days into dashboard_daily_rollups. Re-running a day simply
+# overwrites it, so the most recent rolled day is always recomputed to pick
+# up late writes.
+ROLLUP_OPERATIONS_QUERY = """
+    INSERT INTO dashboard_daily_rollups (stat_date, operations, successful, failed, data_processed, processing_time_ms, timed_operations)
+    SELECT
+        DATE(created_at),
+        COUNT(*),
+        COALESCE(SUM(status = 'success'), 0),
+        COALESCE(SUM(status = 'failed'), 0),
+        COALESCE(SUM(file_size), 0),
+        COALESCE(SUM(processing_time_ms), 0),
+        COUNT(processing_time_ms)
+    FROM operations
+    WHERE created_at >= %(start)s AND created_at < %(end)s
+    GROUP BY DATE(created_at)
+    ON DUPLICATE KEY UPDATE
+        operations = VALUES(operations),
+        successful = VALUES(successful),
+        failed = VALUES(failed),
+        data_processed = VALUES(data_processed),
+        processing_time_ms = VALUES(processing_time_ms),
+        timed_operations = VALUES(timed_operations)
+"""
 
-            # Yesterday's stats
-            cursor.execute("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(last_visit) = %s", (yesterday,))
-            yesterday_visitors = cursor.fetchone()['count']
+ROLLUP_USERS_QUERY = """
+    INSERT INTO dashboard_daily_rollups (stat_date, new_users)
+    SELECT DATE(first_visit), COUNT(*)
+    FROM users
+    WHERE first_visit >= %(start)s AND first_visit < %(end)s
+    GROUP BY DATE(first_visit)
+    ON DUPLICATE KEY UPDATE new_users = VALUES(new_users)
+"""
 
-            cursor.execute("SELECT COUNT(DISTINCT id) as count FROM users WHERE DATE(first_visit) = %s", (yesterday,))
-            yesterday_new_visitors = cursor.fetchone()['count']
+BREAKDOWN_QUERY = """
+    SELECT
+        operation_type,
+        COUNT(*) as count,
+        COUNT(CASE WHEN status = 'success' THEN 1 END) as successful,
+        COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
+        COALESCE(AVG(processing_time_ms), 0) as avg_time
+    FROM operations
+    WHERE created_at >= %(breakdown_since)s
+    GROUP BY operation_type
+    ORDER BY count DESC
+"""
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s", (yesterday,))
-            yesterday_operations = cursor.fetchone()['count']
+INSERT_OPERATION_QUERY = """
+    INSERT INTO operations (operation_type, status, file_count, file_size, processing_time_ms, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'success'", (yesterday,))
-            yesterday_successful = cursor.fetchone()['count']
+RECENT_OPERATIONS_QUERY = """
+    SELECT
+        o.operation_type,
+        o.status,
+        o.file_count,
+        o.processing_time_ms,
+        o.created_at,
+        u.session_id
+    FROM operations o
+    LEFT JOIN users u ON o.user_id = u.id
+    ORDER BY o.created_at DESC
+    LIMIT 10
+"""
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE DATE(created_at) = %s AND status = 'failed'", (yesterday,))
-            yesterday_failed = cursor.fetchone()['count']
+def empty_dashboard_stats():
+    return {
+        'today': {'visitors': 0, 'new_visitors': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0},
+        'yesterday': {'visitors': 0, 'new_visitors': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0},
+        'total': {'users': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0, 'avg_processing_time': 0},
+        'operation_breakdown': [],
+        'recent_operations': []
+    }
 
-            cursor.execute("SELECT COALESCE(SUM(file_size), 0) as total FROM operations WHERE DATE(created_at) = %s", (yesterday,))
-            yesterday_data_processed = cursor.fetchone()['total']
+class DatabaseManager:
+    def __init__(self, config=None, pool_config=None):
+        self.config = config or get_db_config()
+        self.pool = ConnectionPool(self.get_connection, pool_config)
+        # Database calls get their own threads, one per pooled connection, so
+        # a slow database can never tie up the threads used for file work.
+        self._executor = ThreadPoolExecutor(max_workers=self.pool.config['size'], thread_name_prefix='db')
+        self._timeouts = 0
+        self._rolled_through = None
 
-            # Total stats
-            cursor.execute("SELECT COUNT(DISTINCT id) as count FROM users")
-            total_users = cursor.fetchone()['count']
+    def get_connection(self):
+        # Autocommit keeps reads out of a long-lived REPEATABLE READ snapshot
+        # and commits the writes that share the pool: telemetry INSERTs and
+        # the rollup upserts. Each of those statements stands alone and is
+        # safe to lose or re-run, so none of them needs a wider transaction.
+        return pymysql.connect(autocommit=True, **self.config)
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations")
-            total_operations = cursor.fetchone()['count']
+    async def run(self, func, *args, timeout=None):
+        # Runs a blocking database call off the event loop. If it outlives the
+        # timeout or the caller is cancelled, the statement still executing on
+        # its connection is killed server-side so the thread is freed quickly.
+        timeout = timeout or self.pool.config['query_timeout_seconds']
+        loop = asyncio.get_running_loop()
+        worker = {}
+        future = loop.run_in_executor(self._executor, partial(self._run_in_thread, worker, func, *args))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._timeouts += 1
+            connection = self.pool.abandon(worker.get('ident'))
+            if connection is not None:
+                threading.Thread(target=self.kill_query, args=(connection.thread_id(),), daemon=True).start()
+            raise
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE status = 'success'")
-            total_successful = cursor.fetchone()['count']
+    def _run_in_thread(self, worker, func, *args):
+        worker['ident'] = threading.get_ident()
+        return func(*args)
 
-            cursor.execute("SELECT COUNT(*) as count FROM operations WHERE status = 'failed'")
-            total_failed = cursor.fetchone()['count']
+    def kill_query(self, thread_id):
+        try:
+            connection = self.get_connection()
+            try:
+                connection.cursor().execute("KILL QUERY %s", (thread_id,))
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"Failed to cancel database query {thread_id}: {e}")
 
-            cursor.execute("SELECT COALESCE(SUM(file_size), 0) as total FROM operations")
-            total_data_processed = cursor.fetchone()['total']
+    def stats(self):
+        return {**self.pool.stats(), 'query_timeouts': self._timeouts}
 
-            cursor.execute("SELECT COALESCE(AVG(processing_time_ms), 0) as avg_time FROM operations")
-            avg_processing_time = cursor.fetchone()['avg_time']
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
 
-            # Operation breakdown
-            cursor.execute("""
-                SELECT 
-                    operation_type,
-                    COUNT(*) as count,
-                    COUNT(CASE WHEN status = 'success' THEN 1 END) as successful,
-                    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
-                    COALESCE(AVG(processing_time_ms), 0) as avg_time
-                FROM operations 
-                WHERE created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-                GROUP BY operation_type
-                ORDER BY count DESC
-            """)
+    def refresh_rollups(self, connection):
+        # Everything before today is served from dashboard_daily_rollups; only
+        # days that closed since the last rollup are aggregated from the raw
+        # tables.
+        today = datetime.now().date()
+        if self._rolled_through == today:
+            return
+        cursor = connection.cursor()
+        cursor.execute("SELECT MAX(stat_date) AS last_day FROM dashboard_daily_rollups")
+        last_day = cursor.fetchone()['last_day']
+        if last_day is None:
+            cursor.execute("SELECT MIN(created_at) AS first_seen FROM operations")
+            first_seen = cursor.fetchone()['first_seen']
+            cursor.execute("SELECT MIN(first_visit) AS first_seen FROM users")
+            first_user = cursor.fetchone()['first_seen']
+            starts = [value.date() for value in (first_seen, first_user) if value is not None]
+            last_day = min(starts) if starts else today
+        start = datetime.combine(min(last_day, today), datetime.min.time())
+        end = datetime.combine(today, datetime.min.time())
+        if start < end:
+            cursor.execute(ROLLUP_OPERATIONS_QUERY, {'start': start, 'end': end})
+            cursor.execute(ROLLUP_USERS_QUERY, {'start': start, 'end': end})
+        cursor.close()
+        self._rolled_through = today
+
+    def compute_dashboard_stats(self):
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        yesterday = today - timedelta(days=1)
+        tomorrow = today + timedelta(days=1)
+        params = {
+            'yesterday': yesterday,
+            'today': today,
+            'today_date': today.date(),
+            'tomorrow': tomorrow,
+            'breakdown_since': datetime.now() - timedelta(days=30),
+        }
+
+        with self.pool.connection() as connection:
+            self.refresh_rollups(connection)
+            cursor = connection.cursor()
+            # One round trip: live today/yesterday windows over indexed range
+            # predicates, plus all-time totals from the daily rollups.
+            cursor.execute(SUMMARY_QUERY, params)
+            summary = cursor.fetchone()
+
+            cursor.execute(BREAKDOWN_QUERY, params)
             operation_breakdown = []
             for row in cursor.fetchall():
                 operation_breakdown.append({
@@ -123,20 +375,7 @@ class DatabaseManager:
                     'avg_time': float(row['avg_time']) if row['avg_time'] is not None else 0
                 })
 
-            # Recent operations
-            cursor.execute("""
-                SELECT 
-                    o.operation_type,
-                    o.status,
-                    o.file_count,
-                    o.processing_time_ms,
-                    o.created_at,
-                    u.session_id
-                FROM operations o
-                LEFT JOIN users u ON o.user_id = u.id
-                ORDER BY o.created_at DESC
-                LIMIT 10
-            """)
+            cursor.execute(RECENT_OPERATIONS_QUERY)
             recent_operations = []
             for row in cursor.fetchall():
                 recent_operations.append({
@@ -147,45 +386,50 @@ class DatabaseManager:
                     'created_at': to_json_serializable(row['created_at']),
                     'session_id': row['session_id']
                 })
+            cursor.close()
 
-            connection.close()
+        timed_operations = summary['rollup_timed_operations'] + summary['today_timed_operations']
+        processing_time_ms = summary['rollup_processing_time_ms'] + summary['today_processing_time_ms']
+        return {
+            'today': {
+                'visitors': summary['today_visitors'],
+                'new_visitors': summary['today_new_visitors'],
+                'operations': summary['today_operations'],
+                'successful': int(summary['today_successful']),
+                'failed': int(summary['today_failed']),
+                'data_processed': summary['today_data_processed']
+            },
+            'yesterday': {
+                'visitors': summary['yesterday_visitors'],
+                'new_visitors': summary['yesterday_new_visitors'],
+                'operations': summary['yesterday_operations'],
+                'successful': int(summary['yesterday_successful']),
+                'failed': int(summary['yesterday_failed']),
+                'data_processed': summary['yesterday_data_processed']
+            },
+            'total': {
+                'users': int(summary['rollup_users']) + summary['today_new_visitors'],
+                'operations': int(summary['rollup_operations']) + summary['today_operations'],
+                'successful': int(summary['rollup_successful'] + summary['today_successful']),
+                'failed': int(summary['rollup_failed'] + summary['today_failed']),
+                'data_processed': summary['rollup_data_processed'] + summary['today_data_processed'],
+                'avg_processing_time': float(processing_time_ms) / float(timed_operations) if timed_operations else 0
+            },
+            'operation_breakdown': operation_breakdown,
+            'recent_operations': recent_operations
+        }
+
+    def record_operations(self, rows):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.executemany(INSERT_OPERATION_QUERY, rows)
+            cursor.close()
 
-            return {
-                'today': {
-                    'visitors': today_visitors,
-                    'new_visitors': today_new_visitors,
-                    'operations': today_operations,
-                    'successful': today_successful,
-                    'failed': today_failed,
-                    'data_processed': today_data_processed
-                },
-                'yesterday': {
-                    'visitors': yesterday_visitors,
-                    'new_visitors': yesterday_new_visitors,
-                    'operations': yesterday_operations,
-                    'successful': yesterday_successful,
-                    'failed': yesterday_failed,
-                    'data_processed': yesterday_data_processed
-                },
-                'total': {
-                    'users': total_users,
-                    'operations': total_operations,
-                    'successful': total_successful,
-                    'failed': total_failed,
-                    'data_processed': total_data_processed,
-                    'avg_processing_time': float(avg_processing_time) if avg_processing_time is not None else 0
-                },
-                'operation_breakdown': operation_breakdown,
-                'recent_operations': recent_operations
-            }
+    def get_dashboard_stats(self):
+        try:
+            return self.compute_dashboard_stats()
         except Exception as e:
             print(f"Error in get_dashboard_stats: {e}")
-            return {
-                'today': {'visitors': 0, 'new_visitors': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0},
-                'yesterday': {'visitors': 0, 'new_visitors': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0},
-                'total': {'users': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0, 'avg_processing_time': 0},
-                'operation_breakdown': [],
-                'recent_operations': []
-            }
+            return empty_dashboard_stats()
 
 db_manager = DatabaseManager() 
\ No newline at end of file
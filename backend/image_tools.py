@@ -1,24 +1,126 @@
-from PIL import Image, ImageEnhance, ImageFilter
+import io
+import os
+from functools import partial
+import numpy as np
+import PIL
+from PIL import Image, ImageEnhance, ImageFilter, ImageMath, ImageOps
 
-def resize_image(path, width, height):
-    img = Image.open(path)
-    return img.resize((width, height))
+def get_image_batch_config():
+    return {
+        'max_files': int(os.getenv('IMAGE_BATCH_MAX_FILES', '500')),
+    }
+
+def get_image_compress_config():
+    return {
+        'min_quality': int(os.getenv('IMAGE_COMPRESS_MIN_QUALITY', '20')),
+        'max_quality': int(os.getenv('IMAGE_COMPRESS_MAX_QUALITY', '95')),
+        'ssim_max_side': int(os.getenv('IMAGE_COMPRESS_SSIM_MAX_SIDE', '1024')),
+        'webp_method': int(os.getenv('IMAGE_COMPRESS_WEBP_METHOD', '4')),
+        'avif_speed': int(os.getenv('IMAGE_COMPRESS_AVIF_SPEED', '6')),
+    }
+
+# Formats the compressor can produce, with the MIME type a client lists in
+# its Accept header to say it can decode them.
+COMPRESS_FORMATS = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "AVIF": "image/avif",
+    "PNG": "image/png",
+}
+SUBSAMPLING_MODES = ("auto", "4:4:4", "4:2:2", "4:2:0")
+
+# Rows of the image transformed at a time when adjustments include a
+# saturation, so the working set stays small however large the image is.
+ADJUST_STRIP_ROWS = 256
 
-def crop_image(path, left, top, right, bottom):
-    img = Image.open(path)
-    return img.crop((left, top, right, bottom))
+# Downscales keep at least this much headroom over the target size before the
+# final resample, the same trade-off Image.thumbnail makes by default.
+REDUCING_GAP = 2.0
+
+# Partial row decoding rewrites Image.tile and Image._size, which are
+# private to Pillow. It is only used on the major versions it was checked
+# against with tests/test_image_decode.py; others decode in full.
+PARTIAL_DECODE_PILLOW = ((10, 0), (13, 0))
+
+def load_image(source):
+    if isinstance(source, Image.Image):
+        return source
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return Image.open(source)
+
+def _is_decoded(img):
+    return not getattr(img, "tile", None)
+
+def _reduce_on_decode(img, width, height):
+    # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding (DCT
+    # scaling) when the target is much smaller than the source. Returns the
+    # resulting size so callers can rescale coordinates.
+    if _is_decoded(img) or img.format != "JPEG":
+        return img.size
+    requested = (max(1, int(width * REDUCING_GAP)), max(1, int(height * REDUCING_GAP)))
+    if requested[0] < img.width and requested[1] < img.height:
+        img.draft(img.mode, requested)
+    return img.size
+
+def _partial_decode_supported():
+    version = tuple(int(part) for part in PIL.__version__.split(".")[:2])
+    low, high = PARTIAL_DECODE_PILLOW
+    return low <= version < high
+
+def _decode_rows(img, rows):
+    # PNG (non-interlaced) and uncompressed top-down rasters are decoded row
+    # by row, so rows below a crop never need to be decoded or allocated.
+    if not _partial_decode_supported():
+        return False
+    if _is_decoded(img) or not 0 < rows < img.height or len(img.tile) != 1 or getattr(img, "n_frames", 1) > 1:
+        return False
+    tile, size = img.tile, img.size
+    decoder, extents, offset, args = tile[0]
+    if decoder == "zip":
+        if img.info.get("interlace"):
+            return False
+    elif decoder == "raw":
+        if not isinstance(args, str) and len(args) > 2 and args[2] != 1:
+            return False
+    else:
+        return False
+    try:
+        img.tile = [type(tile[0])(decoder, (0, 0, img.width, rows), offset, args)]
+        img._size = (img.width, rows)
+        if img.size == (size[0], rows):
+            return True
+    except (AttributeError, TypeError, ValueError):
+        pass
+    # Pillow no longer honours the rewrite; put it back and decode in full.
+    img.tile = tile
+    img._size = size
+    return False
 
-def center_crop_image(path, width, height):
-    img = Image.open(path)
+def _crop(img, box):
+    _decode_rows(img, box[3])
+    return img.crop(box)
+
+def resize_image(source, width, height):
+    img = load_image(source)
+    _reduce_on_decode(img, width, height)
+    return img.resize((width, height), reducing_gap=REDUCING_GAP)
+
+def crop_image(source, left, top, right, bottom):
+    img = load_image(source)
+    return _crop(img, (left, top, right, bottom))
+
+def center_crop_image(source, width, height):
+    img = load_image(source)
     img_width, img_height = img.size
     left = (img_width - width) // 2
     top = (img_height - height) // 2
     right = left + width
     bottom = top + height
-    return img.crop((left, top, right, bottom))
+    return _crop(img, (left, top, right, bottom))
 
-def aspect_ratio_crop(path, aspect_width, aspect_height):
-    img = Image.open(path)
+def aspect_ratio_crop(source, aspect_width, aspect_height):
+    img = load_image(source)
     img_width, img_height = img.size
     target_ratio = aspect_width / aspect_height
     img_ratio = img_width / img_height
@@ -34,59 +136,523 @@ def aspect_ratio_crop(path, aspect_width, aspect_height):
         bottom = top + new_height
         left = 0
         right = img_width
-    return img.crop((left, top, right, bottom))
+    return _crop(img, (left, top, right, bottom))
+
+def _pixel_bytes(mode):
+    # Bytes per pixel in Pillow's own storage: multi-band 8-bit modes are
+    # padded to four bytes, so RGB costs as much as RGBA once decoded.
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
 
-def get_image_info(path):
-    img = Image.open(path)
+def _orientation(img):
+    # img.getexif() loads the whole image for some formats (PNG keeps eXIf
+    # after the pixel data), so only EXIF already read with the header is used.
+    if hasattr(img, "tag_v2"):
+        return img.tag_v2.get(0x0112, 1)
+    raw = img.info.get("exif")
+    if not raw:
+        return 1
+    exif = Image.Exif()
+    exif.load(raw)
+    return exif.get(0x0112, 1)
+
+def get_image_info(source, file_size=None):
+    # Reads only the headers: Image.open is lazy, and nothing here loads
+    # pixel data, so a prefix of the file is enough for most formats.
+    # file_size is the full size when source is only a prefix; frame counts
+    # that would need the rest of the file are then reported as None.
+    img = load_image(source)
+    width, height = img.size
+    orientation = _orientation(img)
+    truncated = file_size is not None and hasattr(source, "seek") and source.seek(0, 2) < file_size
+    if not hasattr(img, "n_frames"):
+        frames = 1
+    elif truncated and img.format != "PNG":
+        # APNG declares its frame count up front; GIF, WebP and TIFF need
+        # every frame walked to count them.
+        frames = None
+    else:
+        try:
+            frames = img.n_frames
+        except (EOFError, OSError, SyntaxError):
+            frames = None
+    dpi = img.info.get("dpi")
+    decoded_bytes = width * height * _pixel_bytes(img.mode)
     return {
         "format": img.format,
         "mode": img.mode,
         "size": img.size,
+        # Width and height as displayed, after the EXIF orientation is applied.
+        "display_size": (height, width) if orientation in (5, 6, 7, 8) else (width, height),
+        "orientation": orientation,
+        "dpi": [round(float(value), 2) for value in dpi] if dpi else None,
+        "frames": frames,
+        "animated": bool(frames and frames > 1),
+        "file_size": file_size,
+        "decoded_bytes": decoded_bytes,
     }
 
-def save_image(img, path, format, quality):
-    img.save(path, format=format, quality=quality)
+def save_image(img, destination, format, quality):
+    img.save(destination, format=format, quality=quality)
+
+def encode_image(img, format=None, formats=None, **params):
+    if formats is not None:
+        # Compression settings from compress_params: compress_image picks
+        # the format and quality.
+        content, format, _ = compress_image(img, formats=formats, **params)
+        return content, format
+    format = (format or img.format or "PNG").upper()
+    buffer = io.BytesIO()
+    _encodable(img, format).save(buffer, format=format, **params)
+    return buffer.getbuffer(), format
 
-def convert_to_grayscale(path):
-    img = Image.open(path)
+def _encodable(img, format):
+    # JPEG has no alpha or palette, so those images are converted first, with
+    # transparency flattened onto white as compress_image does.
+    if format != "JPEG" or img.mode in ("RGB", "L", "CMYK"):
+        return img
+    if "A" in img.mode or "transparency" in img.info:
+        return _flatten(img.convert("RGBA"))
+    return img.convert("RGB")
+
+def convert_to_grayscale(source):
+    img = load_image(source)
     return img.convert("L")
 
-def rotate_image(path, angle):
-    img = Image.open(path)
+def rotate_image(source, angle):
+    img = load_image(source)
     return img.rotate(angle)
 
-def flip_image(path, direction):
-    img = Image.open(path)
+def flip_image(source, direction):
+    img = load_image(source)
     if direction == "horizontal":
         return img.transpose(Image.FLIP_LEFT_RIGHT)
     elif direction == "vertical":
         return img.transpose(Image.FLIP_TOP_BOTTOM)
     return img
 
-def adjust_brightness(path, factor):
-    img = Image.open(path)
-    enhancer = ImageEnhance.Brightness(img)
-    return enhancer.enhance(factor)
+ADJUSTMENTS = {
+    "brightness": ImageEnhance.Brightness,
+    "contrast": ImageEnhance.Contrast,
+    "saturation": ImageEnhance.Color,
+}
+
+def _blend_lut(lut, base, factor):
+    # Image.blend(base, img, factor) applied to a lookup table, with the
+    # same float32 arithmetic, clipping and truncation as Pillow's C code.
+    values = np.float32(base) + np.float32(factor) * (lut.astype(np.float32) - np.float32(base))
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+def _band_lut(lut, mode):
+    # Alpha passes through unchanged, as it does in Pillow's enhancers.
+    lut = lut.tolist()
+    return lut * min(3, len(mode)) + (list(range(256)) if mode == "RGBA" else [])
+
+def _desaturated(img):
+    return img.convert("LA" if img.mode == "RGBA" else "L").convert(img.mode)
+
+def _run_stages(img, stages):
+    for kind, value in stages:
+        if kind == "lut":
+            img = img.point(_band_lut(value, img.mode))
+        else:
+            img = Image.blend(_desaturated(img), img, value)
+    return img
+
+def _strips(img):
+    for top in range(0, img.height, ADJUST_STRIP_ROWS):
+        yield top, img.crop((0, top, img.width, min(img.height, top + ADJUST_STRIP_ROWS)))
+
+def _mean_luma(img, stages):
+    # The mean Pillow's Contrast enhancer would see after the earlier stages.
+    # It rounds every pixel's luma when converting to "L", so for colour
+    # images the mean of the per-band means can be off by one; the luma is
+    # measured on greyscale strips instead, like the saturation stage does.
+    pixels = img.width * img.height
+    if img.mode == "L":
+        lut = stages[0][1] if stages else np.arange(256, dtype=np.uint8)
+        return float(np.dot(img.histogram(), lut)) / pixels
+    total = 0
+    for _, strip in _strips(img):
+        total += int(np.dot(_run_stages(strip, stages).convert("L").histogram(), np.arange(256)))
+    return total / pixels
+
+def apply_adjustments(source, adjustments):
+    # Applies a sequence of (name, factor) brightness/contrast/saturation
+    # steps as one pass over the image. Brightness and contrast are per-value
+    # maps, so a run of them folds into one 256-entry lookup table built with
+    # NumPy, and the contrast mean is measured strip by strip instead of on a
+    # full greyscale copy. Saturation needs the pixel's luma, so it runs strip by
+    # strip and no full-size intermediate is ever allocated. The output is
+    # identical to chaining Pillow's ImageEnhance.
+    img = load_image(source)
+    if img.mode not in ("L", "RGB", "RGBA"):
+        for name, factor in adjustments:
+            img = ADJUSTMENTS[name](img).enhance(factor)
+        return img
+    stages = []
+    for name, factor in adjustments:
+        if name == "saturation":
+            # Colour saturation of a greyscale image is a no-op in Pillow too.
+            if img.mode != "L":
+                stages.append(("saturation", factor))
+            continue
+        base = 0 if name == "brightness" else int(_mean_luma(img, stages) + 0.5)
+        if stages and stages[-1][0] == "lut":
+            stages[-1] = ("lut", _blend_lut(stages[-1][1], base, factor))
+        else:
+            stages.append(("lut", _blend_lut(np.arange(256, dtype=np.uint8), base, factor)))
+    if not stages:
+        return img.copy()
+    if len(stages) == 1 and stages[0][0] == "lut":
+        return _run_stages(img, stages)
+    result = Image.new(img.mode, img.size)
+    for top, strip in _strips(img):
+        result.paste(_run_stages(strip, stages), (0, top))
+    return result
+
+def adjust_brightness(source, factor):
+    return apply_adjustments(source, [("brightness", factor)])
 
-def adjust_contrast(path, factor):
-    img = Image.open(path)
-    enhancer = ImageEnhance.Contrast(img)
-    return enhancer.enhance(factor)
+def adjust_contrast(source, factor):
+    return apply_adjustments(source, [("contrast", factor)])
 
-def adjust_saturation(path, factor):
-    img = Image.open(path)
-    enhancer = ImageEnhance.Color(img)
-    return enhancer.enhance(factor)
+def adjust_saturation(source, factor):
+    return apply_adjustments(source, [("saturation", factor)])
 
-def apply_blur(path, radius):
-    img = Image.open(path)
+def apply_blur(source, radius):
+    img = load_image(source)
     return img.filter(ImageFilter.GaussianBlur(radius))
 
-def apply_sharpen(path, factor):
-    img = Image.open(path)
-    enhancer = ImageEnhance.Sharpness(img)
-    return enhancer.enhance(factor)
+def apply_sharpen(source, factor):
+    # ImageEnhance.Sharpness blends the image with a SMOOTH-filtered copy.
+    # The blend is linear, so it folds into one 3x3 kernel and a single pass.
+    img = load_image(source)
+    if img.mode not in ("L", "RGB", "RGBA"):
+        return ImageEnhance.Sharpness(img).enhance(factor)
+    edge = (1 - factor) / 13
+    kernel = ImageFilter.Kernel((3, 3), [edge] * 4 + [edge * 5 + factor] + [edge] * 4, scale=1)
+    sharpened = img.filter(kernel)
+    if img.mode == "RGBA":
+        sharpened.putalpha(img.getchannel("A"))
+    return sharpened
+
+def _can_save(format):
+    Image.init()
+    return format in Image.SAVE
+
+def save_format(format):
+    # The Image.save format name for a save-image request, shared by the
+    # endpoint and the pipeline step so both reject the same formats.
+    format = format.strip().upper()
+    if not _can_save(format):
+        raise ValueError(f"Unsupported format: {format!r}.")
+    return format
+
+def compress_formats(format, accept=""):
+    # "AUTO" tries every format the client says it accepts; JPEG is always
+    # acceptable. Anything else is a single explicit format.
+    format = format.upper()
+    if format != "AUTO":
+        if format not in COMPRESS_FORMATS or not _can_save(format):
+            raise ValueError(f"Unsupported format '{format}'. Use auto or one of: {', '.join(f for f in COMPRESS_FORMATS if _can_save(f))}.")
+        return [format]
+    accept = accept.lower()
+    return ["JPEG"] + [f for f in ("WEBP", "AVIF") if COMPRESS_FORMATS[f] in accept and _can_save(f)]
+
+def compress_params(quality=80, format="JPEG", target_bytes=0, target_ssim=0, subsampling="auto", accept=""):
+    # Validated keyword arguments for compress_image, shared by the
+    # compress-image endpoint and the pipeline and batch step of that name.
+    subsampling = subsampling.strip().lower()
+    formats = compress_formats(format.strip(), accept)
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100.")
+    if subsampling not in SUBSAMPLING_MODES:
+        raise ValueError(f"subsampling must be one of: {', '.join(SUBSAMPLING_MODES)}.")
+    if target_bytes < 0 or not 0 <= target_ssim < 1:
+        raise ValueError("target_bytes must not be negative and target_ssim must be between 0 and 1.")
+    if target_bytes and target_ssim:
+        raise ValueError("Give either target_bytes or target_ssim, not both.")
+    return {"quality": quality, "formats": formats, "target_bytes": target_bytes or None,
+            "target_ssim": target_ssim or None, "subsampling": subsampling}
+
+# ICC colour space signatures matching the modes images are compressed in.
+ICC_COLOUR_SPACES = {"RGB": b"RGB ", "RGBA": b"RGB ", "L": b"GRAY"}
+
+def _prepare_for_compression(img):
+    # Bake the EXIF orientation into the pixels, then drop all metadata
+    # except the ICC profile, which is needed to show the colours right.
+    img = ImageOps.exif_transpose(img)
+    icc_profile = img.info.get("icc_profile")
+    if img.mode not in ("RGB", "RGBA", "L"):
+        has_alpha = "A" in img.mode or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    if img.mode == "RGBA" and img.getchannel("A").getextrema() == (255, 255):
+        img = img.convert("RGB")
+    # A CMYK profile no longer describes the converted RGB pixels.
+    if icc_profile and icc_profile[16:20] != ICC_COLOUR_SPACES[img.mode]:
+        icc_profile = None
+    img.info = {}
+    return img, icc_profile
+
+def _flatten(img):
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel("A"))
+    return background
+
+def _encode_trial(img, format, quality, icc_profile, subsampling, config):
+    # Trials are encoded to memory only; nothing touches disk until the
+    # winner is returned.
+    params = {"icc_profile": icc_profile} if icc_profile else {}
+    if format == "JPEG":
+        if subsampling == "auto":
+            subsampling = "4:4:4" if quality >= 90 else "4:2:0"
+        params.update(quality=quality, optimize=True, progressive=True, subsampling=subsampling)
+    elif format == "WEBP":
+        params.update(quality=quality, method=config['webp_method'])
+    elif format == "AVIF":
+        params.update(quality=quality, speed=config['avif_speed'])
+        if subsampling != "auto":
+            params["subsampling"] = subsampling
+    else:
+        params.update(optimize=True)
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+def _ssim_reference(img, max_side):
+    img = img.convert("L")
+    img.thumbnail((max_side, max_side), Image.BOX)
+    return img.convert("F")
+
+def _ssim(reference, data):
+    # Mean SSIM over 8x8 blocks of the luma channel, with block means taken
+    # by a box downscale so the whole computation stays inside Pillow.
+    candidate = Image.open(io.BytesIO(data))
+    if candidate.mode in ("RGBA", "LA"):
+        candidate = _flatten(candidate.convert("RGBA"))
+    candidate = candidate.convert("L").resize(reference.size, Image.BOX).convert("F")
+    grid = (max(1, reference.width // 8), max(1, reference.height // 8))
+    def mean(image):
+        return image.resize(grid, Image.BOX)
+    x, y = reference, candidate
+    mx, my = mean(x), mean(y)
+    xx = mean(ImageMath.lambda_eval(lambda a: a["x"] * a["x"], x=x))
+    yy = mean(ImageMath.lambda_eval(lambda a: a["y"] * a["y"], y=y))
+    xy = mean(ImageMath.lambda_eval(lambda a: a["x"] * a["y"], x=x, y=y))
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim_map = ImageMath.lambda_eval(
+        lambda a: ((2 * a["mx"] * a["my"] + c1) * (2 * (a["xy"] - a["mx"] * a["my"]) + c2))
+        / ((a["mx"] * a["mx"] + a["my"] * a["my"] + c1) * (a["xx"] - a["mx"] * a["mx"] + a["yy"] - a["my"] * a["my"] + c2)),
+        mx=mx, my=my, xx=xx, yy=yy, xy=xy,
+    )
+    # ImageStat bins float images into a histogram, so average exactly instead.
+    return ssim_map.resize((1, 1), Image.BOX).getpixel((0, 0))
+
+def _bisect_quality(encode, good, low, high, prefer_high):
+    # Output size and fidelity both grow with quality, so the best quality
+    # meeting the target is found in log2(high - low) trial encodes.
+    best = None
+    trials = 0
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(quality)
+        trials += 1
+        if good(data):
+            best = (quality, data)
+            if prefer_high:
+                low = quality + 1
+            else:
+                high = quality - 1
+        elif prefer_high:
+            high = quality - 1
+        else:
+            low = quality + 1
+    return best, trials
+
+def compress_image(source, quality=80, formats=("JPEG",), target_bytes=None, target_ssim=None, subsampling="auto", config=None):
+    # Encodes the image in each candidate format and keeps the smallest.
+    # With target_bytes the highest quality that fits is searched for, with
+    # target_ssim the lowest quality that still looks close enough;
+    # otherwise the given quality is used as is.
+    config = config or get_image_compress_config()
+    img, icc_profile = _prepare_for_compression(load_image(source))
+    has_alpha = img.mode == "RGBA"
+    if has_alpha and len(formats) > 1:
+        # JPEG would lose the transparency, so PNG stands in for it.
+        formats = [f for f in formats if f != "JPEG"] + ["PNG"]
+    reference = _ssim_reference(img, config['ssim_max_side']) if target_ssim else None
+    results = []
+    for format in formats:
+        candidate = _flatten(img) if has_alpha and format == "JPEG" else img
+        encode = partial(_encode_trial, candidate, format, icc_profile=icc_profile, subsampling=subsampling, config=config)
+        low, high = config['min_quality'], config['max_quality']
+        trials = 1
+        if format == "PNG":
+            chosen = (None, encode(None))
+            met = target_bytes is None or len(chosen[1]) <= target_bytes
+        elif target_bytes:
+            chosen, trials = _bisect_quality(encode, lambda data: len(data) <= target_bytes, low, high, prefer_high=True)
+            met = chosen is not None
+            if not met:
+                chosen = (low, encode(low))
+        elif target_ssim:
+            chosen, trials = _bisect_quality(encode, lambda data: _ssim(reference, data) >= target_ssim, low, high, prefer_high=False)
+            met = chosen is not None
+            if not met:
+                chosen = (high, encode(high))
+        else:
+            chosen, met = (quality, encode(quality)), True
+        results.append({'format': format, 'quality': chosen[0], 'data': chosen[1], 'target_met': met, 'trials': trials})
+    best = min(results, key=lambda r: (not r['target_met'], len(r['data'])))
+    report = {
+        'format': best['format'],
+        'quality': best['quality'],
+        'target_met': best['target_met'],
+        'candidates': {r['format']: {'bytes': len(r['data']), 'quality': r['quality'], 'trials': r['trials']} for r in results},
+    }
+    if reference is not None:
+        report['ssim'] = round(_ssim(reference, best['data']), 4)
+    return best['data'], best['format'], report
+
+def _positive(value):
+    value = int(value)
+    if value <= 0:
+        raise ValueError(value)
+    return value
+
+IMAGE_OPERATIONS = {
+    "resize-image": (resize_image, (("width", _positive), ("height", _positive))),
+    "crop-image": (crop_image, (("left", int), ("top", int), ("right", int), ("bottom", int))),
+    "center-crop-image": (center_crop_image, (("width", _positive), ("height", _positive))),
+    "aspect-ratio-crop": (aspect_ratio_crop, (("aspect_width", _positive), ("aspect_height", _positive))),
+    "convert-to-grayscale": (convert_to_grayscale, ()),
+    "rotate-image": (rotate_image, (("angle", int),)),
+    "flip-image": (flip_image, (("direction", str),)),
+    "adjust-brightness": (adjust_brightness, (("factor", float),)),
+    "adjust-contrast": (adjust_contrast, (("factor", float),)),
+    "adjust-saturation": (adjust_saturation, (("factor", float),)),
+    "apply-blur": (apply_blur, (("radius", float),)),
+    "apply-sharpen": (apply_sharpen, (("factor", float),)),
+}
+
+# Pipeline steps that apply_adjustments can fuse, by adjustment name.
+ADJUST_STEPS = {
+    "adjust-brightness": "brightness",
+    "adjust-contrast": "contrast",
+    "adjust-saturation": "saturation",
+}
+
+# Operations that only change how the final image is encoded, with the same
+# defaults as their standalone endpoints. The last one in a pipeline wins.
+ENCODE_OPERATIONS = {
+    "compress-image": {"quality": 80, "format": "JPEG", "target_bytes": 0, "target_ssim": 0, "subsampling": "auto"},
+    "save-image": {"quality": 80},
+}
+
+def _parse_params(name, spec, params):
+    args = []
+    for param, cast in spec:
+        if param not in params:
+            raise ValueError(f"Missing parameter '{param}' for {name}.")
+        try:
+            args.append(cast(params[param]))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for '{param}' in {name}: {params[param]!r}.")
+    return args
+
+def parse_pipeline(operations, accept=""):
+    steps = []
+    encode_params = {}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or "operation" not in operation:
+            raise ValueError(f"Pipeline step {index + 1} must be an object with an 'operation' key.")
+        name = str(operation["operation"]).replace("_", "-")
+        params = operation.get("params") or {}
+        if name in ENCODE_OPERATIONS:
+            params = {**ENCODE_OPERATIONS[name], **params}
+            if name == "compress-image":
+                spec = (("quality", int), ("format", str), ("target_bytes", int), ("target_ssim", float), ("subsampling", str))
+                encode_params = compress_params(*_parse_params(name, spec, params), accept=accept)
+                continue
+            quality, format = _parse_params(name, (("quality", int), ("format", str)), params)
+            try:
+                format = save_format(format)
+            except ValueError:
+                raise ValueError(f"Unsupported format for {name}: {format!r}.")
+            encode_params = {"quality": quality, "format": format}
+            continue
+        if name not in IMAGE_OPERATIONS:
+            raise ValueError(f"Unknown pipeline operation: {operation['operation']}.")
+        func, spec = IMAGE_OPERATIONS[name]
+        steps.append((name, func, _parse_params(name, spec, params)))
+    return steps, encode_params
+
+def _fuse_steps(steps):
+    # Collapse runs of geometric operations that can share one resample:
+    # a crop followed by a resize becomes a single resize with a source box,
+    # and back-to-back resizes only need the last target size. Runs of
+    # brightness/contrast/saturation become one fused adjustment.
+    fused = []
+    for step in steps:
+        name, _, args = step
+        if name in ADJUST_STEPS:
+            adjustment = (ADJUST_STEPS[name], args[0])
+            if fused and fused[-1][0] == "adjust":
+                fused[-1][2].append(adjustment)
+            else:
+                fused.append(("adjust", None, [adjustment]))
+            continue
+        if name == "resize-image" and fused:
+            prev_name, _, prev_args = fused[-1]
+            if prev_name == "resize-image":
+                fused[-1] = step
+                continue
+            if prev_name == "crop-image":
+                fused[-1] = ("crop-resize", None, [tuple(prev_args)] + args)
+                continue
+        fused.append(step)
+    return fused
+
+def run_image_pipeline(source, steps):
+    img = load_image(source)
+    for name, func, args in _fuse_steps(steps):
+        if name == "crop-resize":
+            box, width, height = args
+            left, top, right, bottom = box
+            if 0 <= left < right <= img.width and 0 <= top < bottom <= img.height:
+                full_width, full_height = img.size
+                scale_x = (right - left) / width
+                scale_y = (bottom - top) / height
+                reduced_width, reduced_height = _reduce_on_decode(img, full_width / scale_x, full_height / scale_y)
+                fx, fy = reduced_width / full_width, reduced_height / full_height
+                box = (left * fx, top * fy, right * fx, bottom * fy)
+                img = img.resize((width, height), box=box, reducing_gap=REDUCING_GAP)
+            else:
+                img = resize_image(crop_image(img, *box), width, height)
+        elif name == "adjust":
+            img = apply_adjustments(img, args)
+        else:
+            img = func(img, *args)
+    return img
 
-def compress_image(path, quality, format):
-    img = Image.open(path)
-    return img 
\ No newline at end of file
+def process_image_file(source_path, output_path, steps, format=None, **save_params):
+    # One file of a batch, run on the process pool: decode, apply the steps
+    # and encode straight to disk, so only the output path crosses back.
+    with open(source_path, "rb") as source:
+        img = run_image_pipeline(source, steps)
+        img.load()
+    if "formats" in save_params:
+        # compress_image picks the format, so the extension follows it.
+        content, format = encode_image(img, **save_params)
+        output_path = f"{os.path.splitext(output_path)[0]}.{format.lower()}"
+        with open(output_path, "wb") as output:
+            output.write(content)
+        return output_path
+    if format is None:
+        format = Image.registered_extensions().get(os.path.splitext(output_path)[1].lower()) or img.format or "PNG"
+    _encodable(img, format.upper()).save(output_path, format=format.upper(), **save_params)
+    return output_path
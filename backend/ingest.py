@@ -0,0 +1,118 @@
+import hashlib
+import os
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+MB = 1024 * 1024
+
+# Largest single upload accepted per kind of input.
+DEFAULT_MAX_BYTES = {
+    'pdf': 200 * MB,
+    'document': 50 * MB,
+    'image': 50 * MB,
+    'any': 200 * MB,
+}
+
+# Leading bytes that identify each kind. PDFs may carry a little junk before
+# the header, so it is searched for within the first kilobyte.
+SIGNATURES = {
+    'pdf': [],
+    'document': [b'PK\x03\x04', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'],
+    'image': [
+        b'\xff\xd8\xff',
+        b'\x89PNG\r\n\x1a\n',
+        b'GIF87a',
+        b'GIF89a',
+        b'BM',
+        b'II*\x00',
+        b'MM\x00*',
+        b'\x00\x00\x00\x0cjP  \r\n\x87\n',
+        b'\xff\x4f\xff\x51',
+        b'\x00\x00\x01\x00',
+    ],
+}
+
+LABELS = {'pdf': 'PDF', 'document': 'Word document', 'image': 'image'}
+
+def get_ingest_config():
+    max_bytes = dict(DEFAULT_MAX_BYTES)
+    for kind in max_bytes:
+        override = os.getenv(f'INGEST_MAX_{kind.upper()}_BYTES')
+        if override:
+            max_bytes[kind] = int(override)
+    return {
+        'chunk_size': int(os.getenv('INGEST_CHUNK_SIZE', str(MB))),
+        'max_request_bytes': int(os.getenv('INGEST_MAX_REQUEST_BYTES', str(1024 * MB))),
+        'max_bytes': max_bytes,
+    }
+
+def describe_size(size):
+    return f"{size // MB} MB" if size >= MB else f"{size} bytes"
+
+def sniff(head, kind):
+    if kind == 'pdf':
+        return b'%PDF-' in head[:1024]
+    if kind == 'image':
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return True
+        # ISO base media (AVIF/HEIF): size, 'ftyp', brand
+        if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis', b'heic', b'heix', b'mif1'):
+            return True
+    return any(head.startswith(signature) for signature in SIGNATURES.get(kind, []))
+
+def ingest_upload(file, kind=None, dest=None, reserve=None, config=None):
+    # Reads the upload once in fixed-size chunks: the first chunk is sniffed
+    # so a wrong type fails before anything is copied, the size limit is
+    # checked as bytes arrive and the sha256 is computed on the way through.
+    # Returns (size, hexdigest); without a dest the file is rewound for reuse.
+    config = config or ingest_config
+    label = LABELS.get(kind, 'upload')
+    max_bytes = config['max_bytes'].get(kind or 'any', config['max_bytes']['any'])
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{file.filename} exceeds the {describe_size(max_bytes)} limit for {label} files.")
+    digest = hashlib.sha256()
+    size = 0
+    file.file.seek(0)
+    chunk = file.file.read(config['chunk_size'])
+    if kind is not None and not sniff(chunk, kind):
+        raise HTTPException(status_code=415, detail=f"{file.filename} is not a valid {label} file.")
+    while chunk:
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"{file.filename} exceeds the {describe_size(max_bytes)} limit for {label} files.")
+        if reserve is not None:
+            reserve(len(chunk))
+        digest.update(chunk)
+        if dest is not None:
+            dest.write(chunk)
+        chunk = file.file.read(config['chunk_size'])
+    if dest is None:
+        file.file.seek(0)
+    return size, digest.hexdigest()
+
+class ContentLengthLimitMiddleware:
+    # Rejects requests that announce a body larger than the server will ever
+    # accept, before a single byte of it is read or spooled to disk.
+    def __init__(self, app, max_request_bytes=None):
+        self.app = app
+        self.max_request_bytes = max_request_bytes or ingest_config['max_request_bytes']
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            for name, value in scope['headers']:
+                if name == b'content-length':
+                    try:
+                        too_large = int(value) > self.max_request_bytes
+                    except ValueError:
+                        too_large = False
+                    if too_large:
+                        response = JSONResponse(
+                            status_code=413,
+                            content={'detail': f"Request body exceeds the {describe_size(self.max_request_bytes)} limit."},
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+ingest_config = get_ingest_config()
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+def get_jobs_config():
+    root = os.getenv('JOBS_ROOT', 'jobs')
+    return {
+        'root': root,
+        'db_path': os.getenv('JOBS_DB_PATH', os.path.join(root, 'jobs.sqlite3')),
+        'workers': int(os.getenv('JOBS_WORKERS', '2')),
+        'max_attempts': int(os.getenv('JOBS_MAX_ATTEMPTS', '3')),
+        'lease_seconds': float(os.getenv('JOBS_LEASE_SECONDS', '60')),
+        'poll_interval_seconds': float(os.getenv('JOBS_POLL_INTERVAL_SECONDS', '1')),
+        'result_ttl_seconds': int(os.getenv('JOBS_RESULT_TTL_SECONDS', str(24 * 3600))),
+        'max_queued': int(os.getenv('JOBS_MAX_QUEUED', '500')),
+        'busy_retry_seconds': float(os.getenv('JOBS_BUSY_RETRY_SECONDS', '5')),
+    }
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        operation TEXT NOT NULL,
+        status TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        params TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        progress REAL NOT NULL DEFAULT 0,
+        error TEXT,
+        result_path TEXT,
+        result_name TEXT,
+        media_type TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        lease_expires_at REAL,
+        available_at REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, created_at);
+"""
+
+class JobError(Exception):
+    # Raised by a job handler for failures that retrying cannot fix.
+    pass
+
+class Job:
+    def __init__(self, queue, row):
+        self.queue = queue
+        self.id = row['id']
+        self.operation = row['operation']
+        self.params = json.loads(row['params'])
+        self.attempts = row['attempts']
+        self.dir = queue.job_dir(self.id)
+        self.input_dir = os.path.join(self.dir, 'input')
+
+    def inputs(self):
+        # Upload order is kept by the index prefix added at submit time.
+        names = sorted(os.listdir(self.input_dir))
+        return [(name.split('_', 1)[1], os.path.join(self.input_dir, name)) for name in names]
+
+    def output(self, filename, index=None):
+        # Outputs of one input carry its index, like the inputs themselves.
+        filename = os.path.basename(filename)
+        if index is not None:
+            filename = f"{index:04d}_{filename}"
+        return os.path.join(self.dir, filename)
+
+    def set_progress(self, progress):
+        self.queue._execute(
+            "UPDATE jobs SET progress = ?, lease_expires_at = ? WHERE id = ?",
+            (progress, time.time() + self.queue.config['lease_seconds'], self.id),
+        )
+
+class JobQueue:
+    # Persistent priority queue in SQLite. Inputs and results live in one
+    # directory per job. A running job holds a lease that is renewed while
+    # it works; if the process dies, the lease expires and another worker
+    # picks the job up again, up to max_attempts.
+    def __init__(self, config=None):
+        self.config = config or get_jobs_config()
+        self.root = self.config['root']
+        self._handlers = {}
+        self._local = threading.local()
+        self._workers = []
+        self._wakeup = None
+        self._loop = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def register(self, operation, handler):
+        # handler is an async callable taking a Job and returning
+        # (result_path, result_name, media_type).
+        self._handlers[operation] = handler
+
+    @property
+    def operations(self):
+        return list(self._handlers)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(self.root, exist_ok=True)
+                    os.makedirs(os.path.dirname(self.config['db_path']) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.config['db_path'], timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            with self._init_lock:
+                if not self._initialized:
+                    connection.executescript(SCHEMA)
+                    columns = {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}
+                    if 'available_at' not in columns:
+                        connection.execute("ALTER TABLE jobs ADD COLUMN available_at REAL NOT NULL DEFAULT 0")
+                    self._initialized = True
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, sql, params=()):
+        return self._connection().execute(sql, params)
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def create(self):
+        # Reserves a job id and its input directory. The job only becomes
+        # visible to workers once enqueue() is called.
+        job_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.job_dir(job_id), 'input'))
+        return job_id
+
+    def enqueue(self, job_id, operation, params=None, priority=0):
+        self._execute(
+            "INSERT INTO jobs (id, operation, status, priority, params, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, operation, priority, json.dumps(params or {}), time.time()),
+        )
+        # Submissions may come from a worker thread, and asyncio events are
+        # not thread-safe.
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def discard(self, job_id):
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def queued_count(self):
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def get(self, job_id):
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def position(self, job):
+        return self._execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND created_at < ?))",
+            (job['priority'], job['priority'], job['created_at']),
+        ).fetchone()[0]
+
+    def claim(self):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker stopped renewing its lease crashed mid-run.
+            connection.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND lease_expires_at < ? AND attempts < ?",
+                (now, self.config['max_attempts']),
+            )
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Job crashed too many times.', finished_at = ? "
+                "WHERE status = 'running' AND lease_expires_at < ?",
+                (now, now),
+            )
+            placeholders = ','.join('?' * len(self._handlers)) or "''"
+            row = connection.execute(
+                f"SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? AND operation IN ({placeholders}) "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (now, *self._handlers),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_expires_at = ?, progress = 0 WHERE id = ?",
+                (now, now + self.config['lease_seconds'], row['id']),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        row = dict(row)
+        row['attempts'] += 1
+        return Job(self, row)
+
+    def _finish(self, job, status, error=None, result=None):
+        result_path, result_name, media_type = result or (None, None, None)
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, result_path = ?, result_name = ?, media_type = ?, "
+            "progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END, finished_at = ?, lease_expires_at = NULL WHERE id = ?",
+            (status, error, result_path, result_name, media_type, status, time.time(), job.id),
+        )
+
+    def _requeue(self, job, error):
+        self._execute(
+            "UPDATE jobs SET status = 'queued', error = ?, lease_expires_at = NULL WHERE id = ?",
+            (error, job.id),
+        )
+
+    def _defer(self, job, delay):
+        # The server was too busy to start the job; that is no fault of the
+        # job, so the attempt is handed back.
+        self._execute(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, available_at = ?, lease_expires_at = NULL WHERE id = ?",
+            (time.time() + delay, job.id),
+        )
+
+    async def _renew_lease(self, job):
+        interval = self.config['lease_seconds'] / 3
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ?",
+                (time.time() + self.config['lease_seconds'], job.id),
+            )
+
+    async def _retry(self, job, error):
+        # Worker crashes and transient I/O errors are worth another try.
+        if job.attempts < self.config['max_attempts']:
+            await asyncio.to_thread(self._requeue, job, f"Attempt {job.attempts} failed: {error}")
+        else:
+            await asyncio.to_thread(self._finish, job, 'failed', str(error))
+
+    async def _run(self, job):
+        lease = asyncio.create_task(self._renew_lease(job))
+        try:
+            result = await self._handlers[job.operation](job)
+        except JobError as e:
+            await asyncio.to_thread(self._finish, job, 'failed', str(e))
+        except HTTPException as e:
+            if isinstance(e.__cause__, BrokenProcessPool):
+                # The job may be what crashed the worker, so this counts.
+                await self._retry(job, e.detail)
+            elif e.status_code in (429, 503):
+                retry_after = (e.headers or {}).get('Retry-After')
+                await asyncio.to_thread(self._defer, job, float(retry_after or self.config['busy_retry_seconds']))
+            else:
+                await asyncio.to_thread(self._finish, job, 'failed', str(e.detail))
+        except (BrokenProcessPool, OSError) as e:
+            await self._retry(job, e)
+        except Exception as e:
+            print(f"Job {job.id} ({job.operation}) failed: {e!r}")
+            await asyncio.to_thread(self._finish, job, 'failed', str(e) or e.__class__.__name__)
+        else:
+            await asyncio.to_thread(self._finish, job, 'succeeded', None, result)
+        finally:
+            lease.cancel()
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.claim)
+            except Exception as e:
+                print(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.config['poll_interval_seconds'])
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._run(job)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.config['result_ttl_seconds']
+        rows = self._execute(
+            "SELECT id FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?", (cutoff,)
+        ).fetchall()
+        for row in rows:
+            self.discard(row['id'])
+            self._execute("DELETE FROM jobs WHERE id = ?", (row['id'],))
+        return len(rows)
+
+    async def _janitor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.purge_expired)
+            except Exception as e:
+                print(f"Job janitor error: {e}")
+            await asyncio.sleep(300)
+
+    def start(self):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.config['workers'])]
+        self._workers.append(asyncio.create_task(self._janitor()))
+
+    def stop(self):
+        # Running jobs keep their lease until it expires, then are retried by
+        # whichever process claims next.
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+
+    def stats(self):
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        for row in self._execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"):
+            counts[row['status']] = row['count']
+        return {**counts, 'workers': self.config['workers']}
+
+job_queue = JobQueue()
@@ -1,22 +1,22 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
 import os
-import zipfile
-from PyPDF2 import PdfReader, PdfWriter
-from pdf2docx import Converter
-from docx2pdf import convert
-import fitz
-import img2pdf
+import asyncio
+import json
+import time
+from collections import deque
+from functools import partial
 from typing import List
+from urllib.parse import quote
 from image_tools import (
     resize_image,
     crop_image,
     center_crop_image,
     aspect_ratio_crop,
     get_image_info,
-    save_image,
+    load_image,
+    encode_image,
     convert_to_grayscale,
     rotate_image,
     flip_image,
@@ -26,21 +26,91 @@ from image_tools import (
     apply_blur,
     apply_sharpen,
     compress_image,
+    compress_params,
+    save_format,
+    COMPRESS_FORMATS,
+    parse_pipeline,
+    run_image_pipeline,
+    get_image_batch_config,
+    process_image_file,
+    IMAGE_OPERATIONS,
+    ENCODE_OPERATIONS,
 )
-from PIL import Image
-from database import db_manager, to_json_serializable
-import collections.abc
+from pdf_tools import (
+    get_split_config,
+    pdf_page_count,
+    plan_split,
+    shard_ranges,
+    split_pdf_ranges,
+    pdf_page_sizes,
+    render_page_thumbnail,
+    get_merge_config,
+    merge_pdf_files,
+    convert_pdf_to_docx,
+    get_pdf_to_docx_config,
+    plan_docx_shards,
+    parse_docx_shard,
+    make_docx_from_shards,
+    EXTRACT_FORMATS,
+    get_extract_config,
+    plan_image_extraction,
+    extract_image_shard,
+    balance_shards,
+    convert_images_to_pdf,
+    collect_image_jobs,
+    shard_image_jobs,
+    recompress_images,
+    write_compressed_pdf,
+    COMPRESS_PROFILES,
+)
+from PIL import Image, UnidentifiedImageError
+from database import db_manager, to_json_serializable, empty_dashboard_stats
+from stats_cache import dashboard_stats_cache
+from telemetry import telemetry, TelemetryMiddleware, count_upload, register_operations
+from metrics import Gauge, MetricsMiddleware, disk_gauges, observe_stage, render_latest, stage, timed_stream
+from worker_pool import worker_pool
+from workspace import workspace_manager, display_name
+from result_cache import result_cache
+from ingest import ingest_upload, sniff, ContentLengthLimitMiddleware
+from zip_stream import stream_zip, iterate_paths
+from jobs import job_queue, JobError
+from office import office_converter, ConverterUnavailable
+from previews import preview_store
 
 app = FastAPI()
 
+app.add_middleware(ContentLengthLimitMiddleware)
+app.add_middleware(TelemetryMiddleware)
+app.add_middleware(MetricsMiddleware, routes=app.routes)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Adjust for production
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "X-Original-Size", "X-Compressed-Size", "X-Compression-Saved-Percent", "X-Processing-Time", "X-Compression-Report"],
 )
 
+@app.on_event("startup")
+async def start_background_tasks():
+    workspace_manager.start_janitor()
+    result_cache.start_purger()
+    preview_store.start_purger()
+    telemetry.start()
+    job_queue.start()
+    office_converter.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    job_queue.stop()
+    await telemetry.stop()
+    workspace_manager.stop_janitor()
+    result_cache.stop_purger()
+    preview_store.stop_purger()
+    worker_pool.shutdown()
+    db_manager.shutdown()
+    office_converter.shutdown()
+
 def recursive_serialize(obj):
     if isinstance(obj, dict):
         return {k: recursive_serialize(v) for k, v in obj.items()}
@@ -49,411 +119,810 @@ def recursive_serialize(obj):
     else:
         return to_json_serializable(obj)
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    with open(f"temp_{file.filename}", "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return {"filename": file.filename}
+async def save_upload(ws, file, kind=None, filename=None):
+    count_upload(file)
+    with stage("upload"):
+        return await worker_pool.run("upload", ws.save_upload, file, filename, kind, kind="thread")
+
+async def save_uploads(ws, files, kind=None):
+    return [await save_upload(ws, file, kind) for file in files]
+
+def attachment_headers(filename):
+    return {'Content-Disposition': f"attachment; filename*=utf-8''{quote(filename)}"}
+
+def cached_response(entry):
+    headers = entry.meta.get('headers') or {}
+    if entry.content is not None:
+        return Response(content=entry.content, media_type=entry.meta['media_type'], headers={**attachment_headers(entry.meta['filename']), **headers})
+    return FileResponse(entry.path, media_type=entry.meta['media_type'], filename=entry.meta['filename'], headers=headers)
+
+def zip_response(ws, cache_key, members, filename, headers=None):
+    headers = headers or {}
+    chunks = result_cache.tee(cache_key, timed_stream("response_stream", stream_zip(members)), media_type='application/zip', filename=filename, headers=headers)
+    return ws.stream_response(chunks, media_type='application/zip', headers={**attachment_headers(filename), **headers})
+
+def cacheable_file_response(ws, cache_key, path, media_type, filename, headers=None):
+    # The copy into the cache happens after the response has been sent.
+    headers = headers or {}
+    store = partial(result_cache.put_file, cache_key, path, media_type=media_type, filename=filename, headers=headers)
+    return ws.file_response(path, after=store, media_type=media_type, filename=filename, headers=headers)
+
+async def compress_pdf_document(file_path, output_path, quality):
+    # Unique images are recompressed in parallel across the process pool and
+    # written back in a single save.
+    started = time.perf_counter()
+    with stage("collect_images"):
+        jobs = await worker_pool.run("compress_pdf", collect_image_jobs, file_path, quality, kind='thread')
+    shards = [shard for shard in shard_image_jobs(jobs, worker_pool.config['process_workers']) if shard]
+    with stage("recompress_images"):
+        results = await asyncio.gather(*[
+            worker_pool.run("compress_pdf_images", recompress_images, file_path, shard, quality)
+            for shard in shards
+        ])
+    replacements = [replacement for result, _ in results for replacement in result]
+    with stage("write_pdf"):
+        await worker_pool.run("compress_pdf", write_compressed_pdf, file_path, output_path, replacements, quality)
+    original_size = os.path.getsize(file_path)
+    compressed_size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+    return {
+        'original_bytes': original_size,
+        'compressed_bytes': compressed_size,
+        'saved_percent': round(100 * (1 - compressed_size / original_size), 1) if original_size else 0,
+        'images': len(jobs),
+        'images_recompressed': len(replacements),
+        'images_failed': sum(failed for _, failed in results),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+async def convert_pdf_document(pdf_path, docx_path, total_pages):
+    # Short documents are converted in one go. Longer ones have page ranges
+    # parsed in parallel across the process pool, then stitched into one docx.
+    shards = plan_docx_shards(total_pages, worker_pool.config['process_workers'], get_pdf_to_docx_config()['min_shard_pages'])
+    if len(shards) == 1:
+        with stage("convert"):
+            await worker_pool.run("pdf_to_doc", convert_pdf_to_docx, pdf_path, docx_path)
+        return docx_path
+    json_paths = [f"{docx_path}.{index}.json" for index in range(len(shards))]
+    tasks = [
+        asyncio.ensure_future(worker_pool.run("pdf_to_doc_shard", parse_docx_shard, pdf_path, start, end, json_path))
+        for (start, end), json_path in zip(shards, json_paths)
+    ]
+    try:
+        with stage("parse_shards"):
+            await asyncio.gather(*tasks)
+        with stage("make_docx"):
+            await worker_pool.run("pdf_to_doc", make_docx_from_shards, pdf_path, json_paths, docx_path)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for json_path in json_paths:
+            if os.path.exists(json_path):
+                os.remove(json_path)
+    return docx_path
+
+async def pdf_page_counts(pdf_paths):
+    return [await worker_pool.run("pdf_to_doc", pdf_page_count, pdf_path, kind='thread') for pdf_path in pdf_paths]
+
+async def convert_pdf_documents(pairs, page_counts):
+    # Keeps as many files in flight as the operation may run at once, so a
+    # large upload queues here rather than in the worker pool. Files are
+    # started largest first so the long conversions do not end up behind the
+    # short ones; results are yielded in upload order.
+    window = worker_pool.config['operation_limits']['pdf_to_doc']
+    pending = iter(sorted(range(len(pairs)), key=lambda i: -page_counts[i]))
+    tasks = {}
+    def schedule(_=None):
+        for index in pending:
+            tasks[index] = asyncio.ensure_future(convert_pdf_document(*pairs[index], page_counts[index]))
+            tasks[index].add_done_callback(schedule)
+            return
+    for _ in range(window):
+        schedule()
+    try:
+        for index in range(len(pairs)):
+            while index not in tasks:
+                await asyncio.wait([task for task in tasks.values() if not task.done()], return_when=asyncio.FIRST_COMPLETED)
+            yield await tasks[index]
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+def compression_headers(report):
+    original_size = sum(item['original_bytes'] for item in report)
+    compressed_size = sum(item['compressed_bytes'] for item in report)
+    return {
+        'X-Original-Size': str(original_size),
+        'X-Compressed-Size': str(compressed_size),
+        'X-Compression-Saved-Percent': str(round(100 * (1 - compressed_size / original_size), 1) if original_size else 0),
+        'X-Processing-Time': str(round(sum(item['seconds'] for item in report), 3)),
+        'X-Compression-Report': json.dumps(report, separators=(',', ':')),
+    }
+
+def apply_image_operation(func, source, filename, *args, format=None, **save_params):
+    # Runs on a worker thread, so stage timings are returned to the caller
+    # to be recorded against the request's route.
+    started = time.perf_counter()
+    img = func(source, *args)
+    img.load()
+    processed = time.perf_counter()
+    if format is None:
+        format = Image.registered_extensions().get(os.path.splitext(filename)[1].lower())
+    content, format = encode_image(img, format, **save_params)
+    return content, format, {'process': processed - started, 'encode': time.perf_counter() - processed}
+
+async def run_image_operation(endpoint, file, filename, params, func, *args, **kwargs):
+    count_upload(file)
+    with stage("upload"):
+        _, digest = await worker_pool.run("upload", ingest_upload, file, "image", kind="thread")
+    cache_key = result_cache.make_key(endpoint, [(file.filename, digest)], params)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached_response(cached)
+    content, format, timings = await worker_pool.run("image", apply_image_operation, func, file.file, file.filename, *args, kind="thread", **kwargs)
+    for name, seconds in timings.items():
+        observe_stage(name, seconds)
+    headers = {}
+    if 'formats' in kwargs:
+        # compress_image picked the format, so the name gets its extension now.
+        filename = f"{filename}.{format.lower()}"
+        if len(kwargs['formats']) > 1:
+            headers['Vary'] = 'Accept'
+    media_type = Image.MIME.get(format, 'application/octet-stream')
+    result_cache.put_bytes(cache_key, content, media_type=media_type, filename=filename, headers=headers)
+    return Response(content=content, media_type=media_type, headers={**attachment_headers(filename), **headers})
+
+async def process_image_batch(ws, inputs, steps, encode_params, errors):
+    # Keeps a fixed number of files in flight, so however large the batch
+    # only that many images are decoded at once. Results are yielded in
+    # upload order and each file is deleted as soon as it is no longer needed.
+    window = worker_pool.config['operation_limits']['image_batch']
+    pending = iter(inputs)
+    tasks = deque()
+    def schedule():
+        for name, source_path, output_path in pending:
+            task = asyncio.ensure_future(worker_pool.run("image_batch", process_image_file, source_path, output_path, steps, **encode_params))
+            tasks.append((name, source_path, output_path, task))
+            return
+    for _ in range(window):
+        schedule()
+    try:
+        while tasks:
+            name, source_path, output_path, task = tasks.popleft()
+            try:
+                with stage("process"):
+                    output_path = await task
+            except HTTPException as e:
+                errors.append({'file': name, 'error': e.detail})
+                continue
+            except UnidentifiedImageError:
+                errors.append({'file': name, 'error': f"{name} could not be read as an image."})
+                continue
+            except Exception as e:
+                errors.append({'file': name, 'error': str(e) or e.__class__.__name__})
+                continue
+            finally:
+                schedule()
+                os.remove(source_path)
+            ws.track(output_path)
+            yield display_name(output_path), output_path
+            # stream_zip has written the member by the time it asks for the next one.
+            os.remove(output_path)
+    finally:
+        for task in (entry[3] for entry in tasks):
+            task.cancel()
+    if errors:
+        errors_path = ws.file("errors.json")
+        with open(errors_path, "w") as f:
+            json.dump(errors, f, indent=2)
+        yield "errors.json", errors_path
 
 @app.post("/api/split")
 async def split_pdf(files: List[UploadFile] = File(...), split_type: str = Form(...), custom_ranges: str = Form("")):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    output_paths = []
-    for file in files:
-        file_path = f"temp_files/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        reader = PdfReader(file_path)
-        total_pages = len(reader.pages)
-        if total_pages == 0:
-            continue
-        if split_type == "one-one":
-            for i in range(total_pages):
-                writer = PdfWriter()
-                writer.add_page(reader.pages[i])
-                output_filename = f"temp_files/{file.filename.replace('.pdf', '')}_page_{i + 1}.pdf"
-                with open(output_filename, "wb") as output_pdf:
-                    writer.write(output_pdf)
-                output_paths.append(output_filename)
-        elif split_type == "two-two":
-            for i in range(0, total_pages, 2):
-                writer = PdfWriter()
-                writer.add_page(reader.pages[i])
-                if i + 1 < total_pages:
-                    writer.add_page(reader.pages[i+1])
-                output_filename = f"temp_files/{file.filename.replace('.pdf', '')}_pages_{i + 1}-{min(i+2, total_pages)}.pdf"
-                with open(output_filename, "wb") as output_pdf:
-                    writer.write(output_pdf)
-                output_paths.append(output_filename)
-        elif split_type == "custom":
-            ranges = custom_ranges.split(',')
-            for r in ranges:
+    split_type = split_type.strip().lower()
+    with workspace_manager.create() as ws:
+        file_paths = await save_uploads(ws, files, 'pdf')
+        split_config = get_split_config()
+        cache_key = result_cache.make_key("split_pdf", ws.uploads, {'split_type': split_type, 'custom_ranges': custom_ranges.replace(' ', ''), 'engine': split_config['engine']})
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        # Every file is planned before the response starts, so a bad range
+        # on any of them is still a 400 rather than a broken stream.
+        plans = []
+        for file, file_path in zip(files, file_paths):
+            try:
+                with stage("plan"):
+                    total_pages = await worker_pool.run("split_pdf", pdf_page_count, file_path, kind='thread')
+                    plans.append((file_path, plan_split(total_pages, file.filename, split_type, custom_ranges)))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        if not any(ranges for _, ranges in plans):
+            raise HTTPException(status_code=400, detail="No pages were split based on the provided criteria.")
+        async def split_members():
+            for file_path, ranges in plans:
+                shards = shard_ranges(ranges, worker_pool.config['process_workers'], split_config['min_shard_pages'])
+                tasks = [
+                    asyncio.ensure_future(worker_pool.run("split_pdf_shard", split_pdf_ranges, file_path, ws.path, shard, split_config['engine']))
+                    for shard in shards if shard
+                ]
                 try:
-                    start, end = map(int, r.split('-'))
-                    if start < 1 or end > total_pages or start > end:
-                        raise HTTPException(status_code=400, detail=f"Invalid page range: {r}. Pages must be within 1 and {total_pages} and start must be less than or equal to end.")
-                    writer = PdfWriter()
-                    for i in range(start - 1, end):
-                        writer.add_page(reader.pages[i])
-                    output_filename = f"temp_files/{file.filename.replace('.pdf', '')}_custom_{start}-{end}.pdf"
-                    with open(output_filename, "wb") as output_pdf:
-                        writer.write(output_pdf)
-                    output_paths.append(output_filename)
-                except ValueError:
-                    raise HTTPException(status_code=400, detail=f"Invalid custom range format: {r}. Expected format like '1-5'.")
-        else:
-            raise HTTPException(status_code=400, detail="Invalid split type.")
-    if not output_paths:
-        raise HTTPException(status_code=400, detail="No pages were split based on the provided criteria.")
-    zip_path = f"temp_files/split_results.zip"
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for output_file_path in output_paths:
-            zipf.write(output_file_path, os.path.basename(output_file_path))
-    return FileResponse(zip_path, media_type='application/zip', filename="split_results.zip")
+                    for task in tasks:
+                        with stage("split_shards"):
+                            output_paths = await task
+                        ws.track(*output_paths)
+                        for output_path in output_paths:
+                            yield os.path.basename(output_path), output_path
+                finally:
+                    for task in tasks:
+                        task.cancel()
+        return zip_response(ws, cache_key, split_members(), "split_results.zip")
 
 @app.post("/api/merge")
-async def merge_pdfs(files: List[UploadFile] = File(...)):
+async def merge_pdfs(files: List[UploadFile] = File(...), page_ranges: str = Form("")):
     if len(files) < 2:
         raise HTTPException(status_code=400, detail="Please select at least two files to merge.")
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    merger = PdfWriter()
-    for file in files:
-        file_path = f"temp_files/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        merger.append(file_path)
-    output_filename = "temp_files/merged.pdf"
-    with open(output_filename, "wb") as output_pdf:
-        merger.write(output_pdf)
-    merger.close()
-    return FileResponse(output_filename, media_type='application/pdf', filename="merged.pdf")
+    # Optional JSON list with one range spec per file, e.g. ["1-3", "", "2,5-"].
+    try:
+        ranges = json.loads(page_ranges) if page_ranges.strip() else [""] * len(files)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="page_ranges must be a JSON list of range strings.")
+    if not isinstance(ranges, list) or len(ranges) != len(files) or not all(isinstance(r, str) for r in ranges):
+        raise HTTPException(status_code=400, detail="page_ranges must list one range string per file.")
+    with workspace_manager.create() as ws:
+        file_paths = await save_uploads(ws, files, 'pdf')
+        merge_config = get_merge_config()
+        cache_key = result_cache.make_key("merge_pdfs", ws.uploads, {'page_ranges': [r.replace(' ', '') for r in ranges], 'engine': merge_config['engine']})
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        output_filename = ws.file("merged.pdf")
+        try:
+            await worker_pool.run("merge_pdfs", merge_pdf_files, file_paths, output_filename, ranges, merge_config['engine'], merge_config['flush_pages'], merge_config['garbage'], merge_config['dedupe'], [file.filename for file in files])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        ws.track(output_filename)
+        return cacheable_file_response(ws, cache_key, output_filename, media_type='application/pdf', filename="merged.pdf")
 
 @app.post("/api/pdf-to-doc")
 async def pdf_to_doc(files: List[UploadFile] = File(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    output_paths = []
-    for file in files:
-        pdf_path = f"temp_files/{file.filename}"
-        docx_path = f"temp_files/{file.filename.replace('.pdf', '.docx')}"
-        with open(pdf_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        cv = Converter(pdf_path)
-        cv.convert(docx_path, start=0, end=None)
-        cv.close()
-        output_paths.append(docx_path)
-    if not output_paths:
-        raise HTTPException(status_code=400, detail="No files were converted.")
-    zip_path = "temp_files/converted_docs.zip"
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for output_file_path in output_paths:
-            zipf.write(output_file_path, os.path.basename(output_file_path))
-    return FileResponse(zip_path, media_type='application/zip', filename="converted_docs.zip")
+    with workspace_manager.create() as ws:
+        pdf_paths = await save_uploads(ws, files, 'pdf')
+        cache_key = result_cache.make_key("pdf_to_doc", ws.uploads)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        pairs = [(pdf_path, ws.file(file.filename.replace('.pdf', '.docx'), index)) for index, (file, pdf_path) in enumerate(zip(files, pdf_paths))]
+        page_counts = await pdf_page_counts(pdf_paths)
+        async def converted_members():
+            async for docx_path in convert_pdf_documents(pairs, page_counts):
+                ws.track(docx_path)
+                yield display_name(docx_path), docx_path
+        return zip_response(ws, cache_key, converted_members(), "converted_docs.zip")
 
 @app.post("/api/doc-to-pdf")
 async def doc_to_pdf(files: List[UploadFile] = File(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    output_paths = []
-    for file in files:
-        docx_path = f"temp_files/{file.filename}"
-        pdf_path = f"temp_files/{file.filename.replace('.docx', '.pdf')}"
-        with open(docx_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        convert(docx_path, pdf_path)
-        output_paths.append(pdf_path)
-    if not output_paths:
-        raise HTTPException(status_code=400, detail="No files were converted.")
-    zip_path = "temp_files/converted_pdfs.zip"
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for output_file_path in output_paths:
-            zipf.write(output_file_path, os.path.basename(output_file_path))
-    return FileResponse(zip_path, media_type='application/zip', filename="converted_pdfs.zip")
+    with workspace_manager.create() as ws:
+        docx_paths = await save_uploads(ws, files, 'document')
+        cache_key = result_cache.make_key("doc_to_pdf", ws.uploads)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        # The whole batch goes to the converter at once so it can spread the
+        # documents over its warm LibreOffice workers.
+        pairs = [(docx_path, ws.file(file.filename.replace('.docx', '.pdf'), index)) for index, (file, docx_path) in enumerate(zip(files, docx_paths))]
+        try:
+            with stage("convert"):
+                pdf_paths = await worker_pool.run("doc_to_pdf", office_converter.convert_batch, pairs, None, [file.filename for file in files], kind="thread")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ConverterUnavailable as e:
+            raise HTTPException(status_code=503, detail=f"Document conversion is unavailable: {e}")
+        except TimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        ws.track(*pdf_paths)
+        return zip_response(ws, cache_key, iterate_paths(pdf_paths, map(display_name, pdf_paths)), "converted_pdfs.zip")
 
 @app.post("/api/extract-images")
-async def extract_images(files: List[UploadFile] = File(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    image_paths = []
-    for file in files:
-        file_path = f"temp_files/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        doc = fitz.open(file_path)
-        for page_num in range(len(doc)):
-            for img_index, img in enumerate(doc.get_page_images(page_num)):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                image_ext = base_image["ext"]
-                image_filename = f"temp_files/{file.filename.replace('.pdf', '')}_page{page_num+1}_img{img_index+1}.{image_ext}"
-                with open(image_filename, "wb") as img_file:
-                    img_file.write(image_bytes)
-                image_paths.append(image_filename)
-    if not image_paths:
-        raise HTTPException(status_code=400, detail="No images were extracted.")
-    zip_path = "temp_files/extracted_images.zip"
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for image_path in image_paths:
-            zipf.write(image_path, os.path.basename(image_path))
-    return FileResponse(zip_path, media_type='application/zip', filename="extracted_images.zip")
+async def extract_images(files: List[UploadFile] = File(...), min_size: int = Form(0), format: str = Form("original")):
+    format = format.strip().lower()
+    if format not in EXTRACT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of: {', '.join(EXTRACT_FORMATS)}.")
+    if min_size < 0:
+        raise HTTPException(status_code=400, detail="min_size must not be negative.")
+    with workspace_manager.create() as ws:
+        file_paths = await save_uploads(ws, files, 'pdf')
+        cache_key = result_cache.make_key("extract_images", ws.uploads, {'min_size': min_size, 'format': format})
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        min_shard_images = get_extract_config()['min_shard_images']
+        # Planning reads every file before the response starts, so the
+        # stream itself only extracts.
+        plans = []
+        for file, file_path in zip(files, file_paths):
+            with stage("plan"):
+                plans.append((file, file_path, await worker_pool.run("extract_images", plan_image_extraction, file_path, min_size, kind='thread')))
+        if not any(jobs for _, _, jobs in plans):
+            raise HTTPException(status_code=400, detail="No images were extracted.")
+        async def image_members():
+            for file, file_path, jobs in plans:
+                shard_count = min(worker_pool.config['process_workers'], max(1, len(jobs) // max(1, min_shard_images)))
+                shards = [shard for shard in balance_shards(jobs, shard_count, lambda job: job[3]) if shard]
+                base_name = file.filename.replace('.pdf', '')
+                tasks = [
+                    asyncio.ensure_future(worker_pool.run("extract_images_shard", extract_image_shard, file_path, ws.path, base_name, shard, format))
+                    for shard in shards
+                ]
+                try:
+                    for task in tasks:
+                        with stage("extract_shards"):
+                            image_paths = await task
+                        ws.track(*image_paths)
+                        for image_path in image_paths:
+                            yield os.path.basename(image_path), image_path
+                finally:
+                    for task in tasks:
+                        task.cancel()
+        return zip_response(ws, cache_key, image_members(), "extracted_images.zip")
+
+def preview_listing(document_id, page_count, pages):
+    return {
+        'document_id': document_id,
+        'page_count': page_count,
+        'pages': pages,
+        'widths': preview_store.config['widths'],
+        'pages_url': f"/api/pdf/{document_id}/pages",
+        'thumbnail_url': f"/api/pdf/{document_id}/pages/{{page}}/thumbnail",
+    }
+
+@app.post("/api/pdf/pages")
+async def upload_pdf_for_preview(file: UploadFile = File(...), limit: int = Form(200)):
+    # Stores the document and returns its page count plus the sizes of the
+    # first pages; thumbnails are rendered later, one request per page.
+    limit = max(0, min(limit, preview_store.config['max_listing_pages']))
+    with workspace_manager.create() as ws:
+        file_path = await save_upload(ws, file, 'pdf')
+        document_id = ws.uploads[-1][1]
+        path = await worker_pool.run("preview", preview_store.put_document, file_path, document_id, kind='thread')
+    try:
+        page_count, pages = await worker_pool.run("preview", pdf_page_sizes, path, 0, limit, kind='thread')
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {file.filename}: {e}")
+    return JSONResponse(content=preview_listing(document_id, page_count, pages))
+
+@app.get("/api/pdf/{document_id}/pages")
+async def list_pdf_pages(document_id: str, offset: int = 0, limit: int = 200):
+    path = preview_store.document_path(document_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Document not found. Upload it again.")
+    limit = max(0, min(limit, preview_store.config['max_listing_pages']))
+    page_count, pages = await worker_pool.run("preview", pdf_page_sizes, path, max(0, offset), limit, kind='thread')
+    return JSONResponse(content=preview_listing(document_id, page_count, pages))
+
+@app.get("/api/pdf/{document_id}/pages/{page_number}/thumbnail")
+async def get_page_thumbnail(document_id: str, page_number: int, width: int = 240):
+    path = preview_store.document_path(document_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Document not found. Upload it again.")
+    width = preview_store.width_for(width)
+    key = (document_id, page_number, width)
+    content = preview_store.get_render(key)
+    if content is None:
+        try:
+            with stage("render"):
+                content = await worker_pool.run("render_page", render_page_thumbnail, path, page_number, width)
+        except IndexError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        preview_store.put_render(key, content)
+    # Documents are addressed by content, so a thumbnail never changes.
+    headers = {'Cache-Control': 'public, max-age=86400, immutable', 'ETag': f'"{document_id[:16]}-{page_number}-{width}"'}
+    return Response(content=content, media_type='image/jpeg', headers=headers)
 
 @app.post("/api/images-to-pdf")
 async def images_to_pdf(files: List[UploadFile] = File(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    image_paths = []
-    for file in files:
-        file_path = f"temp_files/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        image_paths.append(file_path)
-    output_pdf_path = "temp_files/combined_images.pdf"
-    with open(output_pdf_path, "wb") as f:
-        f.write(img2pdf.convert(image_paths))
-    return FileResponse(output_pdf_path, media_type='application/pdf', filename="combined_images.pdf")
+    with workspace_manager.create() as ws:
+        image_paths = await save_uploads(ws, files, 'image')
+        cache_key = result_cache.make_key("images_to_pdf", ws.uploads)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        output_pdf_path = ws.file("combined_images.pdf")
+        await worker_pool.run("images_to_pdf", convert_images_to_pdf, image_paths, output_pdf_path)
+        ws.track(output_pdf_path)
+        return cacheable_file_response(ws, cache_key, output_pdf_path, media_type='application/pdf', filename="combined_images.pdf")
 
 @app.post("/api/resize-image")
 async def resize_image_api(file: UploadFile = File(...), width: int = Form(...), height: int = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    resized_img = resize_image(file_path, width, height)
-    output_path = f"temp_files/resized_{file.filename}"
-    resized_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"resized_{file.filename}")
+    if width <= 0 or height <= 0:
+        raise HTTPException(status_code=400, detail="width and height must be greater than 0.")
+    return await run_image_operation("resize_image", file, f"resized_{file.filename}", {'width': width, 'height': height}, resize_image, width, height)
 
 @app.post("/api/crop-image")
 async def crop_image_api(file: UploadFile = File(...), left: int = Form(...), top: int = Form(...), right: int = Form(...), bottom: int = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    cropped_img = crop_image(file_path, left, top, right, bottom)
-    output_path = f"temp_files/cropped_{file.filename}"
-    cropped_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"cropped_{file.filename}")
+    return await run_image_operation("crop_image", file, f"cropped_{file.filename}", {'left': left, 'top': top, 'right': right, 'bottom': bottom}, crop_image, left, top, right, bottom)
+
+def probe_upload(file, file_size=None):
+    # Only the headers are read, straight from the spooled upload. Clients
+    # may send just the first few KB of a file along with its real size.
+    file.file.seek(0)
+    if not sniff(file.file.read(1024), 'image'):
+        raise HTTPException(status_code=415, detail=f"{file.filename} is not a valid image file.")
+    file.file.seek(0)
+    received = file.size
+    try:
+        info = get_image_info(file.file, file_size or received)
+    except (OSError, SyntaxError, ValueError, EOFError):
+        if file_size and received is not None and file_size > received:
+            raise HTTPException(status_code=422, detail=f"The first {received} bytes of {file.filename} do not hold the whole image header; send more of the file.")
+        raise HTTPException(status_code=415, detail=f"{file.filename} could not be read as an image.")
+    info['probed_bytes'] = received
+    return info
 
 @app.post("/api/get-image-info")
-async def get_image_info_api(file: UploadFile = File(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    info = get_image_info(file_path)
+async def get_image_info_api(file: UploadFile = File(...), file_size: int = Form(0)):
+    count_upload(file)
+    info = await worker_pool.run("image", probe_upload, file, file_size or None, kind="thread")
     return JSONResponse(content=info)
 
+@app.post("/api/get-image-info/batch")
+async def get_image_info_batch_api(files: List[UploadFile] = File(...), file_sizes: str = Form("")):
+    # file_sizes is an optional JSON list with the full size of each file,
+    # for clients that only upload prefixes. A file that cannot be probed
+    # gets an error entry instead of failing the whole request.
+    try:
+        file_sizes = json.loads(file_sizes) if file_sizes.strip() else [None] * len(files)
+        if not isinstance(file_sizes, list) or len(file_sizes) != len(files):
+            raise ValueError
+        file_sizes = [int(size) if size else None for size in file_sizes]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="file_sizes must be a JSON list with one size per file.")
+    images = []
+    for file, file_size in zip(files, file_sizes):
+        count_upload(file)
+        try:
+            info = await worker_pool.run("image", probe_upload, file, file_size, kind="thread")
+        except HTTPException as e:
+            if e.status_code not in (415, 422):
+                raise
+            images.append({'filename': file.filename, 'error': e.detail})
+        else:
+            images.append({'filename': file.filename, **info})
+    return JSONResponse(content={'images': images})
+
 @app.post("/api/save-image")
 async def save_image_api(file: UploadFile = File(...), format: str = Form(...), quality: int = Form(80)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    img = Image.open(file_path)
-    output_path = f"temp_files/saved_{file.filename}.{format.lower()}"
-    save_image(img, output_path, format, quality)
-    return FileResponse(output_path, media_type=f'image/{format.lower()}', filename=f"saved_{file.filename}.{format.lower()}")
+    try:
+        format = save_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_image_operation("save_image", file, f"saved_{file.filename}.{format.lower()}", {'format': format, 'quality': quality}, load_image, format=format, quality=quality)
 
 @app.post("/api/convert-to-grayscale")
 async def convert_to_grayscale_api(file: UploadFile = File(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    gray_img = convert_to_grayscale(file_path)
-    output_path = f"temp_files/grayscale_{file.filename}"
-    gray_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"grayscale_{file.filename}")
+    return await run_image_operation("convert_to_grayscale", file, f"grayscale_{file.filename}", {}, convert_to_grayscale)
 
 @app.post("/api/rotate-image")
 async def rotate_image_api(file: UploadFile = File(...), angle: int = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    rotated_img = rotate_image(file_path, angle)
-    output_path = f"temp_files/rotated_{file.filename}"
-    rotated_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"rotated_{file.filename}")
+    return await run_image_operation("rotate_image", file, f"rotated_{file.filename}", {'angle': angle}, rotate_image, angle)
 
 @app.post("/api/flip-image")
 async def flip_image_api(file: UploadFile = File(...), direction: str = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    flipped_img = flip_image(file_path, direction)
-    output_path = f"temp_files/flipped_{file.filename}"
-    flipped_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"flipped_{file.filename}")
+    return await run_image_operation("flip_image", file, f"flipped_{file.filename}", {'direction': direction}, flip_image, direction)
 
 @app.post("/api/adjust-brightness")
 async def adjust_brightness_api(file: UploadFile = File(...), factor: float = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    adjusted_img = adjust_brightness(file_path, factor)
-    output_path = f"temp_files/brightness_{file.filename}"
-    adjusted_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"brightness_{file.filename}")
+    return await run_image_operation("adjust_brightness", file, f"brightness_{file.filename}", {'factor': factor}, adjust_brightness, factor)
 
 @app.post("/api/adjust-contrast")
 async def adjust_contrast_api(file: UploadFile = File(...), factor: float = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    adjusted_img = adjust_contrast(file_path, factor)
-    output_path = f"temp_files/contrast_{file.filename}"
-    adjusted_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"contrast_{file.filename}")
+    return await run_image_operation("adjust_contrast", file, f"contrast_{file.filename}", {'factor': factor}, adjust_contrast, factor)
 
 @app.post("/api/adjust-saturation")
 async def adjust_saturation_api(file: UploadFile = File(...), factor: float = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    adjusted_img = adjust_saturation(file_path, factor)
-    output_path = f"temp_files/saturation_{file.filename}"
-    adjusted_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"saturation_{file.filename}")
+    return await run_image_operation("adjust_saturation", file, f"saturation_{file.filename}", {'factor': factor}, adjust_saturation, factor)
 
 @app.post("/api/apply-blur")
 async def apply_blur_api(file: UploadFile = File(...), radius: float = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    blurred_img = apply_blur(file_path, radius)
-    output_path = f"temp_files/blurred_{file.filename}"
-    blurred_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"blurred_{file.filename}")
+    return await run_image_operation("apply_blur", file, f"blurred_{file.filename}", {'radius': radius}, apply_blur, radius)
 
 @app.post("/api/apply-sharpen")
 async def apply_sharpen_api(file: UploadFile = File(...), factor: float = Form(...)):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    sharpened_img = apply_sharpen(file_path, factor)
-    output_path = f"temp_files/sharpened_{file.filename}"
-    sharpened_img.save(output_path)
-    return FileResponse(output_path, media_type='image/png', filename=f"sharpened_{file.filename}")
+    return await run_image_operation("apply_sharpen", file, f"sharpened_{file.filename}", {'factor': factor}, apply_sharpen, factor)
 
 @app.post("/api/compress-image")
-async def compress_image_api(file: UploadFile = File(...), quality: int = Form(80), format: str = Form("JPEG")):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    file_path = f"temp_files/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    compressed_img = compress_image(file_path, quality, format)
-    output_path = f"temp_files/compressed_{file.filename}.{format.lower()}"
-    save_image(compressed_img, output_path, format, quality)
-    return FileResponse(output_path, media_type=f'image/{format.lower()}', filename=f"compressed_{file.filename}.{format.lower()}")
+async def compress_image_api(request: Request, file: UploadFile = File(...), quality: int = Form(80), format: str = Form("JPEG"),
+                             target_bytes: int = Form(0), target_ssim: float = Form(0), subsampling: str = Form("auto")):
+    # format=auto picks the smallest of the formats listed in the Accept
+    # header. target_bytes or target_ssim switch from a fixed quality to a
+    # search for the quality that meets the target.
+    try:
+        params = compress_params(quality, format, target_bytes, target_ssim, subsampling, request.headers.get('accept', ''))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    count_upload(file)
+    with stage("upload"):
+        original_size, digest = await worker_pool.run("upload", ingest_upload, file, "image", kind="thread")
+    cache_key = result_cache.make_key("compress_image", [(file.filename, digest)], params)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached_response(cached)
+    started = time.perf_counter()
+    with stage("process"):
+        content, format, report = await worker_pool.run("image", compress_image, file.file, kind="thread", **params)
+    compressed_size = len(content)
+    headers = {
+        'X-Original-Size': str(original_size),
+        'X-Compressed-Size': str(compressed_size),
+        'X-Compression-Saved-Percent': str(round(100 * (1 - compressed_size / original_size), 1) if original_size else 0),
+        'X-Processing-Time': str(round(time.perf_counter() - started, 3)),
+        'X-Compression-Report': json.dumps({**report, 'ratio': round(original_size / compressed_size, 2) if compressed_size else 0}, separators=(',', ':')),
+    }
+    if len(params['formats']) > 1:
+        headers['Vary'] = 'Accept'
+    filename = f"compressed_{os.path.splitext(file.filename)[0]}.{format.lower()}"
+    media_type = COMPRESS_FORMATS[format]
+    result_cache.put_bytes(cache_key, content, media_type=media_type, filename=filename, headers=headers)
+    return Response(content=content, media_type=media_type, headers={**attachment_headers(filename), **headers})
+
+@app.post("/api/batch/{operation}")
+async def image_batch_api(request: Request, operation: str, files: List[UploadFile] = File(...), params: str = Form("{}")):
+    # Applies one image operation, with one set of parameters, to every
+    # uploaded file and streams the results back as a zip. A file that fails
+    # is listed in errors.json inside the archive instead of failing the batch.
+    max_files = get_image_batch_config()['max_files']
+    if len(files) > max_files:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {max_files} files.")
+    try:
+        params = json.loads(params)
+        if not isinstance(params, dict):
+            raise ValueError("Expected an object of parameters.")
+        steps, encode_params = parse_pipeline([{'operation': operation, 'params': params}], request.headers.get('accept', ''))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {e}")
+    with workspace_manager.create() as ws:
+        inputs = []
+        errors = []
+        for file in files:
+            try:
+                source_path = await save_upload(ws, file, 'image')
+            except HTTPException as e:
+                if e.status_code not in (413, 415):
+                    raise
+                errors.append({'file': file.filename, 'error': e.detail})
+                continue
+            output_name = os.path.basename(source_path)
+            if "format" in encode_params:
+                output_name = f"{os.path.splitext(output_name)[0]}.{encode_params['format'].lower()}"
+            inputs.append((file.filename, source_path, os.path.join(ws.path, 'out', output_name)))
+        if not inputs:
+            raise HTTPException(status_code=400, detail=f"No valid images in the batch: {errors[0]['error']}")
+        cache_key = result_cache.make_key(f"batch_{operation}", ws.uploads, {'params': params, 'encode': encode_params, 'rejected': errors})
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        os.makedirs(os.path.join(ws.path, 'out'))
+        members = process_image_batch(ws, inputs, steps, encode_params, errors)
+        headers = {'Vary': 'Accept'} if len(encode_params.get('formats', ())) > 1 else None
+        return zip_response(ws, cache_key, members, f"batch_{operation}.zip", headers=headers)
+
+@app.post("/api/image-pipeline")
+async def image_pipeline_api(request: Request, file: UploadFile = File(...), operations: str = Form(...)):
+    try:
+        operations = json.loads(operations)
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("Expected a non-empty list of operations.")
+        steps, encode_params = parse_pipeline(operations, request.headers.get('accept', ''))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid operations: {e}")
+    filename = f"processed_{file.filename}"
+    if "format" in encode_params:
+        filename = f"{filename}.{encode_params['format'].lower()}"
+    return await run_image_operation("image_pipeline", file, filename, {'operations': operations, 'encode': encode_params}, run_image_pipeline, steps, **encode_params)
 
 @app.post("/api/compress-pdf")
 async def compress_pdf(files: List[UploadFile] = File(...), quality: str = Form("medium")):
-    if not os.path.exists("temp_files"):
-        os.makedirs("temp_files")
-    output_paths = []
-    errors = []
-    for file in files:
-        if not file.filename.lower().endswith('.pdf'):
-            errors.append(f"File {file.filename} is not a PDF file.")
-            continue
-        file_path = f"temp_files/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        try:
-            doc = fitz.open(file_path)
-            if quality in ["low", "medium"]:
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    image_list = page.get_images()
-                    for img_index, img in enumerate(image_list):
-                        xref = img[0]
-                        try:
-                            pix = fitz.Pixmap(doc, xref)
-                            if pix.n - pix.alpha < 4:
-                                if quality == "low":
-                                    pix = pix.tobytes("jpeg", quality=30)
-                                elif quality == "medium":
-                                    pix = pix.tobytes("jpeg", quality=60)
-                                doc.update_stream(xref, pix)
-                        except Exception:
-                            continue
-            if quality == "low":
-                doc.save(f"temp_files/compressed_{file.filename}", 
-                        garbage=4, deflate=True, clean=True, 
-                        pretty=False, ascii=False)
-            elif quality == "medium":
-                doc.save(f"temp_files/compressed_{file.filename}", 
-                        garbage=3, deflate=True, clean=True, 
-                        pretty=False, ascii=False)
-            elif quality == "high":
-                doc.save(f"temp_files/compressed_{file.filename}", 
-                        garbage=2, deflate=True, clean=True, 
-                        pretty=False, ascii=False)
-            else:
-                errors.append(f"Invalid quality level for {file.filename}. Use 'low', 'medium', or 'high'.")
-                doc.close()
+    quality = quality.strip().lower()
+    if quality not in COMPRESS_PROFILES:
+        raise HTTPException(status_code=400, detail="Invalid quality level. Use 'low', 'medium', or 'high'.")
+    with workspace_manager.create() as ws:
+        output_paths = []
+        errors = []
+        pdf_files = []
+        for file in files:
+            if not file.filename.lower().endswith('.pdf'):
+                errors.append(f"File {file.filename} is not a PDF file.")
                 continue
-            doc.close()
-            output_path = f"temp_files/compressed_{file.filename}"
-            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-                errors.append(f"Compression failed for {file.filename} (output missing or empty).")
-            else:
-                output_paths.append(output_path)
-        except Exception as e:
-            errors.append(f"Error compressing {file.filename}: {str(e)}")
-    if errors:
-        raise HTTPException(status_code=500, detail="; ".join(errors))
-    if not output_paths:
-        raise HTTPException(status_code=400, detail="No files were compressed.")
-    if len(output_paths) > 1:
-        zip_path = f"temp_files/compressed_pdfs.zip"
-        try:
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for output_file_path in output_paths:
-                    zipf.write(output_file_path, os.path.basename(output_file_path))
-            if not os.path.exists(zip_path) or os.path.getsize(zip_path) == 0:
-                raise Exception("ZIP file creation failed or is empty.")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error creating ZIP: {str(e)}")
-        return FileResponse(zip_path, media_type='application/zip', filename="compressed_pdfs.zip")
-    else:
-        return FileResponse(output_paths[0], media_type='application/pdf', filename=os.path.basename(output_paths[0]))
+            pdf_files.append((file, await save_upload(ws, file, 'pdf')))
+        cache_key = result_cache.make_key("compress_pdf", ws.uploads, {'quality': quality})
+        cached = None if errors else result_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached)
+        report = []
+        for index, (file, file_path) in enumerate(pdf_files):
+            output_path = ws.file(f"compressed_{file.filename}", index)
+            try:
+                stats = await compress_pdf_document(file_path, output_path, quality)
+                if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+                    errors.append(f"Compression failed for {file.filename} (output missing or empty).")
+                else:
+                    ws.track(output_path)
+                    output_paths.append(output_path)
+                    report.append({'file': file.filename, **stats})
+            except HTTPException:
+                raise
+            except Exception as e:
+                errors.append(f"Error compressing {file.filename}: {str(e)}")
+        if errors:
+            raise HTTPException(status_code=500, detail="; ".join(errors))
+        if not output_paths:
+            raise HTTPException(status_code=400, detail="No files were compressed.")
+        headers = compression_headers(report)
+        if len(output_paths) > 1:
+            # Every file has to compress cleanly before we answer, so the
+            # outputs already exist here and are only streamed into the zip.
+            return zip_response(ws, cache_key, iterate_paths(output_paths, map(display_name, output_paths)), "compressed_pdfs.zip", headers=headers)
+        else:
+            return cacheable_file_response(ws, cache_key, output_paths[0], media_type='application/pdf', filename=display_name(output_paths[0]), headers=headers)
+
+# Job API names mapped to the queue operation and the kind of upload it takes.
+JOB_OPERATIONS = {
+    'pdf-to-doc': ('pdf_to_doc', 'pdf'),
+    'doc-to-pdf': ('doc_to_pdf', 'document'),
+    'compress-pdf': ('compress_pdf', 'pdf'),
+}
+
+register_operations('/api/batch', 'batch', [*IMAGE_OPERATIONS, *ENCODE_OPERATIONS])
+register_operations('/api/jobs', 'job', JOB_OPERATIONS)
+
+def save_job_input(job_id, index, file, kind):
+    path = os.path.join(job_queue.job_dir(job_id), 'input', f"{index:04d}_{os.path.basename(file.filename)}")
+    with open(path, 'wb') as buffer:
+        ingest_upload(file, kind, dest=buffer)
+
+async def write_zip_file(path, members):
+    with open(path, 'wb') as out:
+        async for chunk in stream_zip(members):
+            await asyncio.to_thread(out.write, chunk)
+
+async def pdf_to_doc_job(job):
+    pairs = [(input_path, job.output(filename.replace('.pdf', '.docx'), index)) for index, (filename, input_path) in enumerate(job.inputs())]
+    page_counts = await pdf_page_counts([input_path for input_path, _ in pairs])
+    output_paths = []
+    async for docx_path in convert_pdf_documents(pairs, page_counts):
+        output_paths.append(docx_path)
+        await asyncio.to_thread(job.set_progress, len(output_paths) / len(pairs))
+    zip_path = job.output("converted_docs.zip")
+    await write_zip_file(zip_path, iterate_paths(output_paths, map(display_name, output_paths)))
+    return zip_path, "converted_docs.zip", 'application/zip'
+
+async def doc_to_pdf_job(job):
+    inputs = job.inputs()
+    pairs = [(input_path, job.output(filename.replace('.docx', '.pdf'), index)) for index, (filename, input_path) in enumerate(inputs)]
+    progress = lambda done: job.set_progress(done / len(pairs))
+    output_paths = await worker_pool.run("doc_to_pdf", office_converter.convert_batch, pairs, progress, [filename for filename, _ in inputs], kind="thread")
+    zip_path = job.output("converted_pdfs.zip")
+    await write_zip_file(zip_path, iterate_paths(output_paths, map(display_name, output_paths)))
+    return zip_path, "converted_pdfs.zip", 'application/zip'
+
+async def compress_pdf_job(job):
+    inputs = job.inputs()
+    output_paths = []
+    for index, (filename, input_path) in enumerate(inputs):
+        output_path = job.output(f"compressed_{filename}", index)
+        await compress_pdf_document(input_path, output_path, job.params['quality'])
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            raise JobError(f"Compression failed for {filename} (output missing or empty).")
+        output_paths.append(output_path)
+        await asyncio.to_thread(job.set_progress, (index + 1) / len(inputs))
+    if len(output_paths) == 1:
+        return output_paths[0], display_name(output_paths[0]), 'application/pdf'
+    zip_path = job.output("compressed_pdfs.zip")
+    await write_zip_file(zip_path, iterate_paths(output_paths, map(display_name, output_paths)))
+    return zip_path, "compressed_pdfs.zip", 'application/zip'
+
+job_queue.register('pdf_to_doc', pdf_to_doc_job)
+job_queue.register('doc_to_pdf', doc_to_pdf_job)
+job_queue.register('compress_pdf', compress_pdf_job)
+
+def job_status(job):
+    status = {
+        'id': job['id'],
+        'operation': job['operation'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'progress': round(job['progress'], 3),
+        'attempts': job['attempts'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'status_url': f"/api/jobs/{job['id']}",
+    }
+    if job['status'] == 'queued':
+        status['position'] = job_queue.position(job)
+    if job['status'] == 'succeeded':
+        status['result_url'] = f"/api/jobs/{job['id']}/result"
+    return status
+
+@app.post("/api/jobs/{operation}")
+async def submit_job(operation: str, files: List[UploadFile] = File(...), priority: int = Form(0), quality: str = Form("medium")):
+    if operation not in JOB_OPERATIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown job operation '{operation}'. Use one of: {', '.join(JOB_OPERATIONS)}.")
+    name, kind = JOB_OPERATIONS[operation]
+    params = {}
+    if name == 'compress_pdf':
+        params['quality'] = quality.strip().lower()
+        if params['quality'] not in COMPRESS_PROFILES:
+            raise HTTPException(status_code=400, detail="Invalid quality level. Use 'low', 'medium', or 'high'.")
+    if await asyncio.to_thread(job_queue.queued_count) >= job_queue.config['max_queued']:
+        raise HTTPException(status_code=503, detail="Too many jobs are queued. Please try again later.", headers={'Retry-After': '30'})
+    job_id = job_queue.create()
+    try:
+        for index, file in enumerate(files):
+            count_upload(file)
+            with stage("upload"):
+                await worker_pool.run("upload", save_job_input, job_id, index, file, kind, kind="thread")
+        await asyncio.to_thread(job_queue.enqueue, job_id, name, params, max(-10, min(10, priority)))
+    except BaseException:
+        job_queue.discard(job_id)
+        raise
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    return JSONResponse(status_code=202, content=await asyncio.to_thread(job_status, job))
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JSONResponse(content=await asyncio.to_thread(job_status, job))
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job['status'] == 'failed':
+        raise HTTPException(status_code=409, detail=f"Job failed: {job['error']}")
+    if job['status'] != 'succeeded':
+        raise HTTPException(status_code=409, detail="Job has not finished yet.")
+    if not os.path.exists(job['result_path']):
+        raise HTTPException(status_code=410, detail="Job result has expired.")
+    return FileResponse(job['result_path'], media_type=job['media_type'], filename=job['result_name'])
+
+WORKSPACE_DISK = disk_gauges('workspace_disk_bytes', 'Scratch workspace disk usage.', lambda: workspace_manager.root)
+RESULT_CACHE_DISK = disk_gauges('result_cache_disk_bytes', 'Result cache disk usage.', lambda: result_cache.root)
+PREVIEWS_DISK = disk_gauges('preview_documents_disk_bytes', 'Stored preview document disk usage.', lambda: preview_store.root)
+JOBS_DISK = disk_gauges('jobs_disk_bytes', 'Job input and result disk usage.', lambda: job_queue.root)
+WORKER_JOBS = Gauge('worker_jobs', 'Jobs waiting for or running in the worker pool.', ('operation', 'state'), collect=lambda: {
+    **{(operation, 'waiting'): count for operation, count in worker_pool.stats()['waiting'].items()},
+    **{(operation, 'running'): count for operation, count in worker_pool.stats()['running'].items()},
+})
+
+@app.get("/metrics")
+async def get_metrics():
+    content = await asyncio.to_thread(render_latest)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+@app.get("/api/system/stats")
+async def get_system_stats():
+    return JSONResponse(content={
+        'workers': worker_pool.stats(),
+        'workspaces': workspace_manager.stats(),
+        'result_cache': result_cache.stats(),
+        'database': db_manager.stats(),
+        'dashboard_stats_cache': dashboard_stats_cache.stats(),
+        'telemetry': telemetry.stats(),
+        'jobs': await asyncio.to_thread(job_queue.stats),
+        'office': office_converter.stats(),
+        'previews': preview_store.stats(),
+    })
 
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats():
     try:
-        stats = db_manager.get_dashboard_stats()
+        stats = await dashboard_stats_cache.get()
         stats = recursive_serialize(stats)
         return JSONResponse(content=stats)
     except Exception as e:
-        print(f"Dashboard stats error: {e}")
-        return JSONResponse(content={
-            'today': {'visitors': 0, 'new_visitors': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0},
-            'yesterday': {'visitors': 0, 'new_visitors': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0},
-            'total': {'users': 0, 'operations': 0, 'successful': 0, 'failed': 0, 'data_processed': 0, 'avg_processing_time': 0},
-            'operation_breakdown': [],
-            'recent_operations': []
-        }) 
\ No newline at end of file
+        print(f"Dashboard stats error: {e!r}")
+        return JSONResponse(content=empty_dashboard_stats()) 
\ No newline at end of file
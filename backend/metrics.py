@@ -0,0 +1,253 @@
+import bisect
+import contextvars
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from starlette.routing import Match
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_current_route = contextvars.ContextVar('metrics_route', default='unmatched')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), registry=None, collect=None):
+        # collect, if given, is called at scrape time and returns either a
+        # number or a {label_values_tuple: number} mapping.
+        super().__init__(name, help, labelnames, registry)
+        self.collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.collect is not None:
+            try:
+                collected = self.collect()
+            except Exception as e:
+                print(f"Metrics collector for {self.name} failed: {e}")
+                collected = {}
+            with self._lock:
+                self._values = collected if isinstance(collected, dict) else {(): collected}
+        return super().render()
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests handled.', ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time from request arrival to the last response byte.', ('route', 'method'))
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests currently being handled.', ('route',))
+BYTES_IN = Counter('http_request_bytes_total', 'Request body bytes received.', ('route',))
+BYTES_OUT = Counter('http_response_bytes_total', 'Response body bytes sent.', ('route',))
+STAGE_DURATION = Histogram('stage_duration_seconds', 'Time spent in each processing stage of a request.', ('route', 'stage'))
+WORKER_QUEUE_WAIT = Histogram('worker_queue_wait_seconds', 'Time a job waited for a worker slot.', ('operation',))
+WORKER_RUN = Histogram('worker_run_seconds', 'Time a job spent running in the worker pool.', ('operation',))
+WORKER_PROCESS_RESTARTS = Counter('worker_process_pool_restarts_total', 'Times the process pool was replaced after a worker process died.')
+
+def observe_stage(name, seconds):
+    # Attributed to the route of the request being handled.
+    STAGE_DURATION.observe(seconds, route=_current_route.get(), stage=name)
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+async def timed_stream(name, chunks):
+    started = time.perf_counter()
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+def directory_size(path):
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    total += entry.stat(follow_symlinks=False).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+def disk_gauges(name, help, path_getter):
+    # Bytes used under the directory plus used/free space on its filesystem.
+    def collect():
+        path = path_getter()
+        values = {('directory',): directory_size(path)}
+        if os.path.isdir(path):
+            usage = shutil.disk_usage(path)
+            values[('filesystem_used',)] = usage.used
+            values[('filesystem_free',)] = usage.free
+        return values
+    return Gauge(name, help, ('kind',), collect=collect)
+
+def render_latest():
+    return REGISTRY.render()
+
+class MetricsMiddleware:
+    def __init__(self, app, routes=()):
+        self.app = app
+        # The app's live route list, so routes registered after the
+        # middleware was added are still matched.
+        self.routes = routes
+
+    def _route_for(self, scope):
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        route = self._route_for(scope)
+        method = scope['method']
+        started = time.perf_counter()
+        status = {'code': 500}
+        token = _current_route.set(route)
+        IN_FLIGHT.inc(route=route)
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request':
+                BYTES_IN.inc(len(message.get('body', b'')), route=route)
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            elif message['type'] == 'http.response.body':
+                BYTES_OUT.inc(len(message.get('body', b'')), route=route)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _current_route.reset(token)
+            IN_FLIGHT.dec(route=route)
+            REQUEST_DURATION.observe(time.perf_counter() - started, route=route, method=method)
+            REQUESTS.inc(route=route, method=method, status=str(status['code']))
@@ -0,0 +1,12 @@
+-- Indexes backing the dashboard stats queries in database.py.
+-- Apply once: mysql -u <user> -p <db_name> < migrations/001_dashboard_indexes.sql
+
+-- Today/yesterday windows, the 30-day breakdown and the recent operations
+-- list all range-scan created_at. The extra columns make the window and
+-- breakdown aggregates index-only.
+CREATE INDEX idx_operations_created_at
+    ON operations (created_at, status, operation_type, file_size, processing_time_ms);
+
+-- Visitor and new-visitor counts for today and yesterday.
+CREATE INDEX idx_users_last_visit ON users (last_visit);
+CREATE INDEX idx_users_first_visit ON users (first_visit);
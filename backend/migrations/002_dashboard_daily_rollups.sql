@@ -0,0 +1,45 @@
+-- Daily rollups that back the all-time dashboard totals in database.py.
+-- Closed days are rolled up at runtime. This script creates the table and
+-- backfills history once so the first dashboard load does not have to.
+-- Production already has a daily_stats table whose columns this code does
+-- not define, so the rollups get a table of their own and daily_stats is
+-- left untouched.
+-- Apply once: mysql -u <user> -p <db_name> < migrations/002_dashboard_daily_rollups.sql
+
+CREATE TABLE IF NOT EXISTS dashboard_daily_rollups (
+    stat_date DATE NOT NULL PRIMARY KEY,
+    new_users INT NOT NULL DEFAULT 0,
+    operations INT NOT NULL DEFAULT 0,
+    successful INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    data_processed BIGINT NOT NULL DEFAULT 0,
+    processing_time_ms BIGINT NOT NULL DEFAULT 0,
+    timed_operations INT NOT NULL DEFAULT 0
+);
+
+INSERT INTO dashboard_daily_rollups (stat_date, operations, successful, failed, data_processed, processing_time_ms, timed_operations)
+SELECT
+    DATE(created_at),
+    COUNT(*),
+    COALESCE(SUM(status = 'success'), 0),
+    COALESCE(SUM(status = 'failed'), 0),
+    COALESCE(SUM(file_size), 0),
+    COALESCE(SUM(processing_time_ms), 0),
+    COUNT(processing_time_ms)
+FROM operations
+WHERE created_at < CURDATE()
+GROUP BY DATE(created_at)
+ON DUPLICATE KEY UPDATE
+    operations = VALUES(operations),
+    successful = VALUES(successful),
+    failed = VALUES(failed),
+    data_processed = VALUES(data_processed),
+    processing_time_ms = VALUES(processing_time_ms),
+    timed_operations = VALUES(timed_operations);
+
+INSERT INTO dashboard_daily_rollups (stat_date, new_users)
+SELECT DATE(first_visit), COUNT(*)
+FROM users
+WHERE first_visit < CURDATE()
+GROUP BY DATE(first_visit)
+ON DUPLICATE KEY UPDATE new_users = VALUES(new_users);
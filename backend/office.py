@@ -0,0 +1,316 @@
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from pdf_tools import convert_docx_to_pdf
+
+OFFICE_ENGINES = ('auto', 'unoserver', 'soffice', 'docx2pdf')
+
+def get_office_config():
+    return {
+        'engine': os.getenv('OFFICE_ENGINE', 'auto').lower(),
+        'soffice_binary': os.getenv('SOFFICE_BINARY', 'soffice'),
+        'unoserver_binary': os.getenv('UNOSERVER_BINARY', 'unoserver'),
+        'pool_size': int(os.getenv('OFFICE_POOL_SIZE', '2')),
+        # 0 lets every worker take free ports when it starts, which keeps
+        # several server processes on one host apart.
+        'base_port': int(os.getenv('OFFICE_BASE_PORT', '0')),
+        'start_timeout_seconds': float(os.getenv('OFFICE_START_TIMEOUT_SECONDS', '60')),
+        'convert_timeout_seconds': float(os.getenv('OFFICE_CONVERT_TIMEOUT_SECONDS', '120')),
+        'acquire_timeout_seconds': float(os.getenv('OFFICE_ACQUIRE_TIMEOUT_SECONDS', '300')),
+        'max_conversions': int(os.getenv('OFFICE_MAX_CONVERSIONS', '200')),
+        'profile_root': os.getenv('OFFICE_PROFILE_ROOT', os.path.join(tempfile.gettempdir(), 'office-profiles')),
+    }
+
+def resolve_engine(config):
+    engine = config['engine']
+    if engine not in OFFICE_ENGINES:
+        raise ValueError(f"Unknown OFFICE_ENGINE '{engine}'. Use one of: {', '.join(OFFICE_ENGINES)}.")
+    if engine != 'auto':
+        return engine
+    if sys.platform in ('win32', 'darwin'):
+        return 'docx2pdf'
+    if shutil.which(config['unoserver_binary']):
+        return 'unoserver'
+    return 'soffice'
+
+class ConverterUnavailable(RuntimeError):
+    # No converter is installed or none could be started.
+    pass
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+class OfficeWorker:
+    # One long-lived unoserver process with its own LibreOffice profile, so
+    # several can run side by side. LibreOffice stays loaded between
+    # conversions, which is what removes the startup cost from each call.
+    def __init__(self, index, config):
+        self.index = index
+        self.config = config
+        self.port = None
+        self.uno_port = None
+        self.profile = os.path.join(config['profile_root'], f"worker-{os.getpid()}-{index}")
+        self.process = None
+        self.conversions = 0
+        self.restarts = 0
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        if self.config['base_port']:
+            self.port = self.config['base_port'] + self.index * 2
+            self.uno_port = self.port + 1
+        else:
+            self.port, self.uno_port = _free_port(), _free_port()
+        os.makedirs(self.profile, exist_ok=True)
+        self.process = subprocess.Popen(
+            [
+                self.config['unoserver_binary'],
+                '--interface', '127.0.0.1',
+                '--port', str(self.port),
+                '--uno-port', str(self.uno_port),
+                '--executable', shutil.which(self.config['soffice_binary']) or self.config['soffice_binary'],
+                '--user-installation', f"file://{os.path.abspath(self.profile)}",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self.conversions = 0
+        deadline = time.monotonic() + self.config['start_timeout_seconds']
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise ConverterUnavailable(f"unoserver exited with code {self.process.returncode} while starting.")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.25)
+        self.stop()
+        raise ConverterUnavailable(f"unoserver did not start within {self.config['start_timeout_seconds']:.0f} seconds.")
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            # unoserver starts soffice as a child, so stop the whole group.
+            try:
+                os.killpg(self.process.pid, 15)
+                self.process.wait(timeout=10)
+            except (ProcessLookupError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self.process.pid, 9)
+                except ProcessLookupError:
+                    pass
+                self.process.wait()
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def convert(self, source_path, output_path, name):
+        proxy = xmlrpc.client.ServerProxy(
+            f"http://127.0.0.1:{self.port}",
+            transport=_TimeoutTransport(self.config['convert_timeout_seconds']),
+            allow_none=True,
+        )
+        try:
+            # inpath, indata, outpath, convert_to, filtername, filter_options,
+            # update_index, infiltername
+            proxy.convert(os.path.abspath(source_path), None, os.path.abspath(output_path), 'pdf', None, [], True, None)
+        except xmlrpc.client.Fault as e:
+            raise ValueError(f"Could not convert {name}: {e.faultString.strip().splitlines()[-1]}")
+        finally:
+            self.conversions += 1
+
+class OfficeConverter:
+    def __init__(self, config=None):
+        self.config = config or get_office_config()
+        self.engine = resolve_engine(self.config)
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._executor = None
+        self._counters = {'conversions': 0, 'failures': 0, 'timeouts': 0, 'recycled': 0}
+
+    def _ensure_workers(self):
+        with self._lock:
+            if not self._workers:
+                self._workers = [OfficeWorker(i, self.config) for i in range(self.config['pool_size'])]
+                for worker in self._workers:
+                    self._idle.put(worker)
+
+    def start(self):
+        # Warms the pool in the background so the first request does not pay
+        # for LibreOffice starting up.
+        if self.engine != 'unoserver':
+            return
+        self._ensure_workers()
+        for _ in self._workers:
+            threading.Thread(target=self._warm, daemon=True).start()
+
+    def _warm(self):
+        # Takes a worker out of the idle queue so a request cannot use it
+        # while it is starting.
+        worker = self._idle.get()
+        try:
+            if not worker.alive():
+                worker.start()
+        except Exception as e:
+            print(f"Office worker {worker.index} failed to start: {e}")
+        finally:
+            self._idle.put(worker)
+
+    def _recycle(self, worker):
+        try:
+            worker.restart()
+            self._counters['recycled'] += 1
+        except Exception as e:
+            print(f"Office worker {worker.index} failed to restart: {e}")
+        self._idle.put(worker)
+
+    def _convert_pooled(self, source_path, output_path, name):
+        self._ensure_workers()
+        try:
+            worker = self._idle.get(timeout=self.config['acquire_timeout_seconds'])
+        except queue.Empty:
+            raise TimeoutError("No document converter became available in time.")
+        recycle = False
+        try:
+            if not worker.alive():
+                worker.start()
+            worker.convert(source_path, output_path, name)
+            recycle = worker.conversions >= self.config['max_conversions']
+        except (socket.timeout, TimeoutError):
+            # A conversion that hangs leaves LibreOffice unusable, so the
+            # worker is replaced rather than reused.
+            self._counters['timeouts'] += 1
+            recycle = True
+            raise TimeoutError(f"Converting {name} took longer than {self.config['convert_timeout_seconds']:.0f} seconds.")
+        except (ConnectionError, xmlrpc.client.ProtocolError):
+            recycle = True
+            raise
+        finally:
+            if recycle:
+                threading.Thread(target=self._recycle, args=(worker,), daemon=True).start()
+            else:
+                self._idle.put(worker)
+
+    def _convert_soffice(self, pairs, names):
+        # Cold fallback: one soffice run converts the whole batch, with a
+        # throwaway profile so concurrent runs do not share a lock file.
+        binary = shutil.which(self.config['soffice_binary'])
+        if binary is None:
+            raise ConverterUnavailable("No DOCX to PDF converter is installed. Install LibreOffice, and unoserver for pooled conversion.")
+        with tempfile.TemporaryDirectory(prefix='soffice-') as scratch:
+            out_dir = os.path.join(scratch, 'out')
+            os.makedirs(out_dir)
+            staged = []
+            for index, (source_path, _) in enumerate(pairs):
+                # Inputs are staged under unique names because soffice names
+                # each output after its input.
+                staged_path = os.path.join(scratch, f"{index:04d}{os.path.splitext(source_path)[1]}")
+                try:
+                    os.link(source_path, staged_path)
+                except OSError:
+                    shutil.copy(source_path, staged_path)
+                staged.append(staged_path)
+            timeout = self.config['convert_timeout_seconds'] * len(pairs) + self.config['start_timeout_seconds']
+            try:
+                # A document soffice cannot read only makes the exit code
+                # non-zero, so failures are found by their missing output.
+                subprocess.run(
+                    [binary, '--headless', '--norestore', f"-env:UserInstallation=file://{scratch}/profile",
+                     '--convert-to', 'pdf', '--outdir', out_dir, *staged],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout,
+                )
+            except subprocess.TimeoutExpired:
+                self._counters['timeouts'] += 1
+                raise TimeoutError(f"Converting {len(pairs)} document(s) took longer than {timeout:.0f} seconds.")
+            for index, ((source_path, output_path), name) in enumerate(zip(pairs, names)):
+                converted = os.path.join(out_dir, f"{index:04d}.pdf")
+                if not os.path.exists(converted):
+                    raise ValueError(f"Could not convert {name}.")
+                shutil.move(converted, output_path)
+
+    def convert(self, source_path, output_path):
+        self.convert_batch([(source_path, output_path)])
+        return output_path
+
+    def convert_batch(self, pairs, progress=None, names=None):
+        # Converts every (source, output) pair, using the whole pool at once.
+        # progress, if given, is called with the number of finished documents;
+        # names are what errors call the documents, their file names by default.
+        names = names or [os.path.basename(source_path) for source_path, _ in pairs]
+        try:
+            if self.engine == 'unoserver':
+                done = [0]
+                def convert_one(pair, name):
+                    self._convert_pooled(*pair, name)
+                    with self._lock:
+                        done[0] += 1
+                        finished = done[0]
+                    if progress is not None:
+                        progress(finished)
+                with self._lock:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(max_workers=self.config['pool_size'], thread_name_prefix='office')
+                for _ in self._executor.map(convert_one, pairs, names):
+                    pass
+            elif self.engine == 'soffice':
+                self._convert_soffice(pairs, names)
+                if progress is not None:
+                    progress(len(pairs))
+            else:
+                for index, (source_path, output_path) in enumerate(pairs):
+                    convert_docx_to_pdf(source_path, output_path)
+                    if progress is not None:
+                        progress(index + 1)
+        except Exception:
+            self._counters['failures'] += 1
+            raise
+        self._counters['conversions'] += len(pairs)
+        return [output_path for _, output_path in pairs]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        for worker in self._workers:
+            worker.stop()
+            shutil.rmtree(worker.profile, ignore_errors=True)
+
+    def stats(self):
+        return {
+            'engine': self.engine,
+            **self._counters,
+            'workers': [
+                {'port': worker.port, 'alive': worker.alive(), 'conversions': worker.conversions, 'restarts': worker.restarts}
+                for worker in self._workers
+            ],
+            'idle': self._idle.qsize(),
+        }
+
+office_converter = OfficeConverter()
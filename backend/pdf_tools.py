@@ -0,0 +1,480 @@
+import hashlib
+import io
+import math
+import os
+import re
+from PyPDF2 import PdfReader, PdfWriter
+from pdf2docx import Converter
+from docx2pdf import convert
+import fitz
+import img2pdf
+from PIL import Image
+
+def get_split_config():
+    return {
+        'engine': os.getenv('SPLIT_ENGINE', 'pymupdf').lower(),
+        'min_shard_pages': int(os.getenv('SPLIT_MIN_SHARD_PAGES', '64')),
+    }
+
+def pdf_page_count(file_path):
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+def plan_split(total_pages, filename, split_type, custom_ranges=""):
+    # Returns (start, end, output_name) with 1-based inclusive page numbers.
+    base_name = filename.replace('.pdf', '')
+    ranges = []
+    if total_pages == 0:
+        return ranges
+    if split_type == "one-one":
+        for i in range(total_pages):
+            ranges.append((i + 1, i + 1, f"{base_name}_page_{i + 1}.pdf"))
+    elif split_type == "two-two":
+        for i in range(0, total_pages, 2):
+            end = min(i + 2, total_pages)
+            ranges.append((i + 1, end, f"{base_name}_pages_{i + 1}-{end}.pdf"))
+    elif split_type == "custom":
+        for r in custom_ranges.split(','):
+            try:
+                start, end = map(int, r.split('-'))
+            except ValueError:
+                raise ValueError(f"Invalid custom range format: {r}. Expected format like '1-5'.")
+            if start < 1 or end > total_pages or start > end:
+                raise ValueError(f"Invalid page range: {r}. Pages must be within 1 and {total_pages} and start must be less than or equal to end.")
+            ranges.append((start, end, f"{base_name}_custom_{start}-{end}.pdf"))
+    else:
+        raise ValueError("Invalid split type.")
+    return ranges
+
+def shard_ranges(ranges, shards, min_shard_pages=1):
+    # Cut the plan into contiguous shards with roughly equal page counts, so
+    # each worker opens the source once and writes its own slice of outputs.
+    total = sum(end - start + 1 for start, end, _ in ranges)
+    shards = max(1, min(shards, len(ranges), total // max(1, min_shard_pages)))
+    target = total / shards
+    result = [[]]
+    pages = 0
+    for item in ranges:
+        if result[-1] and pages >= target * len(result) and len(result) < shards:
+            result.append([])
+        result[-1].append(item)
+        pages += item[1] - item[0] + 1
+    return result
+
+def split_pdf_ranges(file_path, out_dir, ranges, engine="pymupdf"):
+    if engine == "pypdf2":
+        return _split_ranges_pypdf2(file_path, out_dir, ranges)
+    if engine == "pymupdf":
+        return _split_ranges_pymupdf(file_path, out_dir, ranges)
+    raise ValueError(f"Unknown split engine: {engine}")
+
+def _split_ranges_pymupdf(file_path, out_dir, ranges):
+    output_paths = []
+    with fitz.open(file_path) as src:
+        for start, end, name in ranges:
+            output_filename = os.path.join(out_dir, name)
+            with fitz.open() as part:
+                part.insert_pdf(src, from_page=start - 1, to_page=end - 1)
+                part.save(output_filename, garbage=1, deflate=True)
+            output_paths.append(output_filename)
+    return output_paths
+
+def _split_ranges_pypdf2(file_path, out_dir, ranges):
+    reader = PdfReader(file_path)
+    output_paths = []
+    for start, end, name in ranges:
+        writer = PdfWriter()
+        for i in range(start - 1, end):
+            writer.add_page(reader.pages[i])
+        output_filename = os.path.join(out_dir, name)
+        with open(output_filename, "wb") as output_pdf:
+            writer.write(output_pdf)
+        output_paths.append(output_filename)
+    return output_paths
+
+def pdf_page_sizes(file_path, offset=0, limit=None):
+    # Sizes come from the page tree alone, without parsing any page content,
+    # so this stays cheap for very long documents. Returns (page_count, pages).
+    with fitz.open(file_path) as doc:
+        count = len(doc)
+        end = count if limit is None else min(count, offset + limit)
+        pages = []
+        for pno in range(offset, end):
+            rect = doc.page_cropbox(pno)
+            kind, value = doc.xref_get_key(doc.page_xref(pno), "Rotate")
+            rotation = int(value) % 360 if kind == 'int' else 0
+            width, height = (rect.height, rect.width) if rotation in (90, 270) else (rect.width, rect.height)
+            pages.append({'number': pno + 1, 'width': round(width, 2), 'height': round(height, 2), 'rotation': rotation})
+    return count, pages
+
+def render_page_thumbnail(file_path, page_number, width, jpeg_quality=75):
+    with fitz.open(file_path) as doc:
+        if not 1 <= page_number <= len(doc):
+            raise IndexError(f"Page {page_number} does not exist.")
+        page = doc[page_number - 1]
+        zoom = width / max(1, page.rect.width)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return pix.tobytes('jpeg', jpg_quality=jpeg_quality)
+
+def get_merge_config():
+    return {
+        'engine': os.getenv('MERGE_ENGINE', 'pymupdf').lower(),
+        'flush_pages': int(os.getenv('MERGE_FLUSH_PAGES', '200')),
+        'garbage': int(os.getenv('MERGE_GARBAGE', '3')),
+        'dedupe': os.getenv('MERGE_DEDUPE', 'true').lower() == 'true',
+    }
+
+def parse_page_ranges(spec, total_pages, filename):
+    # "1-3,5,9-" -> [(0, 2), (4, 4), (8, total_pages - 1)], 0-based inclusive.
+    # An empty spec selects every page.
+    if not spec or not spec.strip():
+        return [(0, total_pages - 1)] if total_pages else []
+    ranges = []
+    for part in spec.replace(' ', '').split(','):
+        try:
+            if '-' in part:
+                start, end = part.split('-', 1)
+                start, end = int(start or 1), int(end) if end else total_pages
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise ValueError(f"Invalid page range '{part}' for {filename}. Expected format like '1-3,5,8-'.")
+        if start < 1 or end > total_pages or start > end:
+            raise ValueError(f"Invalid page range '{part}' for {filename}. Pages must be within 1 and {total_pages} and start must be less than or equal to end.")
+        ranges.append((start - 1, end - 1))
+    return ranges
+
+def merge_pdf_files(file_paths, output_path, page_ranges=None, engine="pymupdf", flush_pages=200, garbage=3, dedupe=True, names=None):
+    # page_ranges holds one range spec per input (see parse_page_ranges);
+    # names are what errors call the inputs, their file names by default.
+    page_ranges = page_ranges or [""] * len(file_paths)
+    names = names or [os.path.basename(file_path) for file_path in file_paths]
+    if engine == "pypdf2":
+        return _merge_pypdf2(file_paths, output_path, page_ranges, names)
+    if engine == "pymupdf":
+        return _merge_pymupdf(file_paths, output_path, page_ranges, names, flush_pages, garbage, dedupe)
+    raise ValueError(f"Unknown merge engine: {engine}")
+
+def _merge_pypdf2(file_paths, output_path, page_ranges, names):
+    merger = PdfWriter()
+    for file_path, spec, name in zip(file_paths, page_ranges, names):
+        total_pages = len(PdfReader(file_path).pages)
+        for start, end in parse_page_ranges(spec, total_pages, name):
+            merger.append(file_path, pages=(start, end + 1))
+    with open(output_path, "wb") as output_pdf:
+        merger.write(output_pdf)
+    merger.close()
+    return output_path
+
+_REFERENCE = re.compile(rb'(\d+) 0 R')
+
+def _canonical_xref(doc, xref, memo, index, depth=0):
+    # Objects are keyed by their content with every reference they contain
+    # replaced by its own canonical xref, so an image whose ICC profile was
+    # copied once per input still matches its twins. Each stream is hashed
+    # once, which keeps this linear, unlike MuPDF's garbage=4 that compares
+    # streams pairwise.
+    if xref in memo:
+        return memo[xref]
+    if depth > 16:
+        return xref
+    memo[xref] = xref
+    body = _REFERENCE.sub(
+        lambda m: b"%d 0 R" % _canonical_xref(doc, int(m.group(1)), memo, index, depth + 1),
+        doc.xref_object(xref, compressed=True).encode(),
+    )
+    digest = hashlib.sha256(body)
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref))
+    memo[xref] = index.setdefault(digest.digest(), xref)
+    return memo[xref]
+
+def _resource_holder(doc, xref, category):
+    # Returns (xref, key prefix) of the dictionary holding a page or form
+    # XObject's resources of the given category, or None when they are
+    # inherited and cannot be rewritten in place.
+    kind, value = doc.xref_get_key(xref, "Resources")
+    if kind == 'xref':
+        xref, path = int(value.split()[0]), category
+    elif kind == 'dict':
+        path = f"Resources/{category}"
+    else:
+        return None
+    kind, value = doc.xref_get_key(xref, path)
+    if kind == 'xref':
+        return int(value.split()[0]), ""
+    if kind == 'dict':
+        return xref, f"{path}/"
+    return None
+
+def _dedupe_resources(doc):
+    # Points every page at one copy of each image and font that appears in
+    # several inputs. The copies left unreferenced are dropped by the
+    # garbage collection of the final save.
+    memo, index = {}, {}
+    replaced = 0
+    for page in doc:
+        used = [("XObject", image[0], image[7], image[9]) for image in page.get_images(full=True)]
+        used += [("Font", font[0], font[4], font[6]) for font in page.get_fonts(full=True)]
+        for category, xref, name, referencer in used:
+            if xref <= 0 or not name:
+                continue
+            canonical = _canonical_xref(doc, xref, memo, index)
+            if canonical == xref:
+                continue
+            holder = _resource_holder(doc, referencer or page.xref, category)
+            if holder is None:
+                continue
+            kind, value = doc.xref_get_key(holder[0], holder[1] + name)
+            if kind == 'xref' and int(value.split()[0]) == xref:
+                doc.xref_set_key(holder[0], holder[1] + name, f"{canonical} 0 R")
+                replaced += 1
+    return replaced
+
+def _merge_pymupdf(file_paths, output_path, page_ranges, names, flush_pages, garbage, dedupe):
+    # Pages copied by insert_pdf stay in memory until the document is saved,
+    # so every flush_pages pages the result is written out incrementally and
+    # reopened, which leaves only what is needed for the next inputs loaded.
+    # The final rewrite drops the incremental sections and the resources
+    # made redundant by the dedupe pass.
+    partial_path = output_path + ".partial"
+    merged = fitz.open()
+    pending = 0
+    on_disk = False
+    try:
+        for file_path, spec, name in zip(file_paths, page_ranges, names):
+            with fitz.open(file_path) as src:
+                for start, end in parse_page_ranges(spec, len(src), name):
+                    merged.insert_pdf(src, from_page=start, to_page=end)
+                    pending += end - start + 1
+            if pending >= flush_pages:
+                if on_disk:
+                    merged.saveIncr()
+                else:
+                    merged.save(partial_path)
+                    on_disk = True
+                merged.close()
+                merged = fitz.open(partial_path)
+                pending = 0
+        if len(merged) == 0:
+            raise ValueError("No pages were selected to merge.")
+        if dedupe:
+            _dedupe_resources(merged)
+        merged.save(output_path, garbage=garbage, deflate=True)
+    finally:
+        merged.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return output_path
+
+def get_pdf_to_docx_config():
+    return {
+        'min_shard_pages': int(os.getenv('PDF_TO_DOCX_MIN_SHARD_PAGES', '16')),
+    }
+
+def convert_pdf_to_docx(pdf_path, docx_path):
+    cv = Converter(pdf_path)
+    cv.convert(docx_path, start=0, end=None)
+    cv.close()
+    return docx_path
+
+def plan_docx_shards(total_pages, shards, min_shard_pages=1):
+    # Contiguous [start, end) page ranges of roughly equal size. Documents too
+    # short to give every shard min_shard_pages get fewer shards.
+    shards = max(1, min(shards, total_pages // max(1, min_shard_pages)))
+    bounds = [round(i * total_pages / shards) for i in range(shards + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def parse_docx_shard(pdf_path, start, end, json_path):
+    # The parsing half of pdf2docx's own multi_processing mode: layout is
+    # analysed for one page range and the parsed pages are stored as JSON.
+    cv = Converter(pdf_path)
+    settings = cv.default_settings
+    try:
+        cv.load_pages(start, end).parse_document(**settings).parse_pages(**settings).serialize(json_path)
+    finally:
+        cv.close()
+    return json_path
+
+def make_docx_from_shards(pdf_path, json_paths, docx_path):
+    cv = Converter(pdf_path)
+    settings = cv.default_settings
+    try:
+        for json_path in json_paths:
+            cv.deserialize(json_path)
+        cv.make_docx(docx_path, **settings)
+    finally:
+        cv.close()
+    return docx_path
+
+def convert_docx_to_pdf(docx_path, pdf_path):
+    convert(docx_path, pdf_path)
+    return pdf_path
+
+EXTRACT_FORMATS = ('original', 'png', 'jpeg')
+
+def get_extract_config():
+    return {
+        'min_shard_images': int(os.getenv('EXTRACT_MIN_SHARD_IMAGES', '8')),
+    }
+
+def plan_image_extraction(file_path, min_size=0):
+    # One job per distinct image, named after the first page that shows it.
+    # Images are told apart by content, so a logo drawn on every page, or
+    # embedded separately by each page, is extracted once. Returns
+    # (xref, page_number, image_index, pixels) in page order.
+    memo, index = {}, {}
+    seen = set()
+    jobs = []
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            for img_index, img in enumerate(page.get_images()):
+                xref, width, height = img[0], img[2], img[3]
+                if xref <= 0 or min(width, height) < min_size:
+                    continue
+                canonical = _canonical_xref(doc, xref, memo, index)
+                if canonical in seen:
+                    continue
+                seen.add(canonical)
+                jobs.append((xref, page.number + 1, img_index + 1, width * height))
+    return jobs
+
+def _normalize_image(doc, xref, image_format):
+    pix = fitz.Pixmap(doc, xref)
+    if pix.colorspace is not None and pix.colorspace.n > 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if image_format == 'jpeg':
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        return pix.tobytes('jpeg', jpg_quality=90), 'jpeg'
+    return pix.tobytes('png'), 'png'
+
+def extract_image_shard(file_path, out_dir, base_name, jobs, image_format='original'):
+    # Writes the images of one shard of plan_image_extraction's jobs. With an
+    # image_format other than 'original', images stored in another format
+    # (JPX, JBIG2, raw samples) are converted to it.
+    image_paths = []
+    with fitz.open(file_path) as doc:
+        for xref, page_number, img_index, _ in jobs:
+            base_image = doc.extract_image(xref)
+            image_bytes, image_ext = base_image["image"], base_image["ext"]
+            if image_format != 'original' and image_ext not in (('jpeg', 'jpg') if image_format == 'jpeg' else ('png',)):
+                image_bytes, image_ext = _normalize_image(doc, xref, image_format)
+            image_filename = os.path.join(out_dir, f"{base_name}_page{page_number}_img{img_index}.{image_ext}")
+            with open(image_filename, "wb") as img_file:
+                img_file.write(image_bytes)
+            image_paths.append(image_filename)
+    return image_paths
+
+def convert_images_to_pdf(image_paths, output_path):
+    with open(output_path, "wb") as f:
+        f.write(img2pdf.convert(image_paths))
+    return output_path
+
+COMPRESS_PROFILES = {
+    "low": {"dpi": 72, "jpeg_quality": 30, "garbage": 4},
+    "medium": {"dpi": 150, "jpeg_quality": 60, "garbage": 3},
+    "high": {"dpi": None, "jpeg_quality": None, "garbage": 2},
+}
+
+# Images smaller than this are left alone; re-encoding them saves nothing.
+MIN_RECOMPRESS_PIXELS = 64 * 64
+
+# What a damaged or unsupported image raises while being recompressed:
+# PyMuPDF's own errors (RuntimeError and ValueError subclasses, plus raw
+# MuPDF errors on releases that let them through) and Pillow's OSError.
+_FZ_ERROR = getattr(getattr(fitz, "mupdf", None), "FzErrorBase", RuntimeError)
+RECOMPRESS_ERRORS = (RuntimeError, ValueError, OSError, _FZ_ERROR)
+
+def _compress_profile(quality):
+    if quality not in COMPRESS_PROFILES:
+        raise ValueError("Invalid quality level. Use 'low', 'medium', or 'high'.")
+    return COMPRESS_PROFILES[quality]
+
+def collect_image_jobs(file_path, quality):
+    # One job per unique image xref, however many pages draw it. The target
+    # scale is taken from the largest placement so no page loses detail.
+    profile = _compress_profile(quality)
+    if profile["jpeg_quality"] is None:
+        return []
+    scales = {}
+    with fitz.open(file_path) as doc:
+        for page in doc:
+            for info in page.get_image_info(xrefs=True):
+                xref = info["xref"]
+                width, height = info["width"], info["height"]
+                if xref <= 0 or info["bpc"] == 1 or width * height < MIN_RECOMPRESS_PIXELS:
+                    continue
+                a, b, c, d = info["transform"][:4]
+                shown_width, shown_height = math.hypot(a, b) / 72, math.hypot(c, d) / 72
+                scale = max(shown_width * profile["dpi"] / width, shown_height * profile["dpi"] / height)
+                scales[xref] = max(scales.get(xref, (0, 0))[0], min(1.0, scale)), width * height
+    return [(xref, scale, pixels) for xref, (scale, pixels) in scales.items()]
+
+def balance_shards(items, shards, weight):
+    # Heaviest items first onto the least loaded shard.
+    buckets = [[] for _ in range(max(1, min(shards, len(items))))]
+    loads = [0] * len(buckets)
+    for item in sorted(items, key=weight, reverse=True):
+        i = loads.index(min(loads))
+        buckets[i].append(item)
+        loads[i] += weight(item)
+    return buckets
+
+def shard_image_jobs(jobs, shards):
+    return balance_shards(jobs, shards, lambda job: job[1] * job[1] * job[2])
+
+def recompress_images(file_path, jobs, quality):
+    # An image PyMuPDF cannot extract or Pillow cannot re-encode is left as
+    # it is; the count of those comes back so the report can show it.
+    jpeg_quality = _compress_profile(quality)["jpeg_quality"]
+    replacements = []
+    failed = 0
+    with fitz.open(file_path) as doc:
+        for xref, scale, _ in jobs:
+            try:
+                replacement = _recompress_image(doc, xref, scale, jpeg_quality)
+            except RECOMPRESS_ERRORS as e:
+                print(f"Could not recompress image {xref} in {os.path.basename(file_path)}: {e}")
+                failed += 1
+                continue
+            if replacement is not None:
+                replacements.append(replacement)
+    return replacements, failed
+
+def _recompress_image(doc, xref, scale, jpeg_quality):
+    if doc.xref_get_key(xref, "ImageMask")[1] == "true":
+        return None
+    original_size = len(doc.xref_stream_raw(xref))
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n not in (1, 3):
+        return None
+    mode, colorspace = ("L", "/DeviceGray") if pix.n == 1 else ("RGB", "/DeviceRGB")
+    img = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    if scale < 1:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=jpeg_quality, optimize=True)
+    data = buffer.getvalue()
+    if len(data) >= original_size:
+        return None
+    return xref, data, img.width, img.height, colorspace, original_size
+
+def write_compressed_pdf(file_path, output_path, replacements, quality):
+    garbage = _compress_profile(quality)["garbage"]
+    with fitz.open(file_path) as doc:
+        for xref, data, width, height, colorspace, _ in replacements:
+            doc.update_stream(xref, data, compress=False)
+            doc.xref_set_key(xref, "Filter", "/DCTDecode")
+            doc.xref_set_key(xref, "DecodeParms", "null")
+            doc.xref_set_key(xref, "Decode", "null")
+            doc.xref_set_key(xref, "Width", str(width))
+            doc.xref_set_key(xref, "Height", str(height))
+            doc.xref_set_key(xref, "ColorSpace", colorspace)
+            doc.xref_set_key(xref, "BitsPerComponent", "8")
+        doc.save(output_path, garbage=garbage, deflate=True, clean=True,
+                 pretty=False, ascii=False)
+    return output_path
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+DOCUMENT_ID = re.compile(r'^[0-9a-f]{64}$')
+
+def get_preview_config():
+    return {
+        'root': os.getenv('PREVIEW_DIR', 'previews'),
+        'ttl_seconds': int(os.getenv('PREVIEW_TTL_SECONDS', '3600')),
+        'max_disk_bytes': int(os.getenv('PREVIEW_MAX_DISK_BYTES', str(1024 * 1024 * 1024))),
+        'render_cache_bytes': int(os.getenv('PREVIEW_RENDER_CACHE_BYTES', str(64 * 1024 * 1024))),
+        'widths': sorted(int(w) for w in os.getenv('PREVIEW_WIDTHS', '120,240,480,960').split(',')),
+        'max_listing_pages': int(os.getenv('PREVIEW_MAX_LISTING_PAGES', '1000')),
+        'purge_interval_seconds': int(os.getenv('PREVIEW_PURGE_INTERVAL_SECONDS', '300')),
+    }
+
+class PreviewStore:
+    # Uploaded PDFs are kept by content hash, so a document is sent once and
+    # its pages are then fetched by id. Reading a document refreshes its
+    # mtime, which drives expiry and eviction. Rendered thumbnails live in an
+    # in-memory LRU keyed by document, page and width; widths are rounded up
+    # to a few fixed sizes so nearby requests share renders.
+    def __init__(self, config=None):
+        self.config = config or get_preview_config()
+        self.root = self.config['root']
+        self._renders = OrderedDict()
+        self._render_bytes = 0
+        self._lock = threading.Lock()
+        self._purge_task = None
+        self._counters = {'documents_stored': 0, 'render_hits': 0, 'render_misses': 0, 'render_evictions': 0, 'documents_purged': 0}
+
+    def _document_path(self, document_id):
+        return os.path.join(self.root, f"{document_id}.pdf")
+
+    def put_document(self, source_path, document_id):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._document_path(document_id)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        self._counters['documents_stored'] += 1
+        return path
+
+    def document_path(self, document_id):
+        if not DOCUMENT_ID.match(document_id):
+            return None
+        path = self._document_path(document_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def width_for(self, requested):
+        for width in self.config['widths']:
+            if width >= requested:
+                return width
+        return self.config['widths'][-1]
+
+    def get_render(self, key):
+        with self._lock:
+            data = self._renders.get(key)
+            if data is None:
+                self._counters['render_misses'] += 1
+                return None
+            self._renders.move_to_end(key)
+            self._counters['render_hits'] += 1
+            return data
+
+    def put_render(self, key, data):
+        with self._lock:
+            if key in self._renders or len(data) > self.config['render_cache_bytes']:
+                return
+            self._renders[key] = data
+            self._render_bytes += len(data)
+            while self._render_bytes > self.config['render_cache_bytes']:
+                _, evicted = self._renders.popitem(last=False)
+                self._render_bytes -= len(evicted)
+                self._counters['render_evictions'] += 1
+
+    def purge(self):
+        try:
+            entries = [entry for entry in os.scandir(self.root) if entry.name.endswith('.pdf')]
+        except FileNotFoundError:
+            return 0
+        now = time.time()
+        documents = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries)
+        total = sum(size for _, size, _ in documents)
+        removed = 0
+        for mtime, size, path in documents:
+            if now - mtime < self.config['ttl_seconds'] and total <= self.config['max_disk_bytes']:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._counters['documents_purged'] += removed
+        return removed
+
+    async def _purger(self):
+        while True:
+            await asyncio.sleep(self.config['purge_interval_seconds'])
+            try:
+                await asyncio.to_thread(self.purge)
+            except Exception as e:
+                print(f"Preview purge error: {e}")
+
+    def start_purger(self):
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purger())
+
+    def stop_purger(self):
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            self._purge_task = None
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'render_entries': len(self._renders), 'render_bytes': self._render_bytes}
+
+preview_store = PreviewStore()
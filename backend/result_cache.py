@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+def get_cache_config():
+    return {
+        'enabled': os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true',
+        'root': os.getenv('RESULT_CACHE_DIR', 'result_cache'),
+        'max_disk_bytes': int(os.getenv('RESULT_CACHE_MAX_DISK_BYTES', str(1024 * 1024 * 1024))),
+        'max_memory_bytes': int(os.getenv('RESULT_CACHE_MAX_MEMORY_BYTES', str(64 * 1024 * 1024))),
+        'max_memory_item_bytes': int(os.getenv('RESULT_CACHE_MAX_MEMORY_ITEM_BYTES', str(2 * 1024 * 1024))),
+        'ttl_seconds': int(os.getenv('RESULT_CACHE_TTL_SECONDS', '3600')),
+        'purge_interval_seconds': int(os.getenv('RESULT_CACHE_PURGE_INTERVAL_SECONDS', '300')),
+    }
+
+def _normalize(value):
+    # Strings are kept as given: handlers canonicalize the parameters they
+    # treat as case-insensitive before building the key.
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+class CacheEntry:
+    def __init__(self, key, size, expires_at, meta, content=None, path=None):
+        self.key = key
+        self.size = size
+        self.expires_at = expires_at
+        self.meta = meta
+        self.content = content
+        self.path = path
+
+class CacheWriter:
+    # Incrementally writes a result that is being streamed to the client and
+    # only publishes it once the stream completes.
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.size = 0
+        self.tmp_path = cache._tmp_path(key)
+        self._file = open(self.tmp_path, 'wb')
+
+    def write(self, data):
+        if self._file is None:
+            return
+        self.size += len(data)
+        if self.size > self.cache.config['max_disk_bytes']:
+            self.abort()
+            return
+        self._file.write(data)
+
+    def commit(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self.cache._commit(self.key, self.tmp_path, self.size, self.meta)
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self.cache._remove_files(self.tmp_path)
+
+class ResultCache:
+    def __init__(self, config=None):
+        self.config = config or get_cache_config()
+        self.root = self.config['root']
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._index_loaded = False
+        self._purge_task = None
+        self._counters = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0, 'stores': 0, 'evictions': 0, 'expirations': 0}
+
+    @property
+    def enabled(self):
+        return self.config['enabled']
+
+    def make_key(self, endpoint, inputs, params=None):
+        payload = json.dumps({
+            'endpoint': endpoint,
+            'inputs': list(inputs),
+            'params': _normalize(params or {}),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _load_index(self):
+        # Rebuild the disk index left by a previous process, oldest first so
+        # the LRU order roughly survives restarts.
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        os.makedirs(self.root, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith('.tmp'):
+                self._remove_files(os.path.join(self.root, name))
+                continue
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.root, name)
+            data_path = meta_path[:-len('.json')]
+            try:
+                with open(meta_path) as f:
+                    record = json.load(f)
+                size = os.path.getsize(data_path)
+            except (OSError, ValueError):
+                self._remove_files(data_path)
+                continue
+            entries.append((os.path.getmtime(meta_path), record, data_path, size))
+        for _, record, data_path, size in sorted(entries, key=lambda e: e[0]):
+            key = os.path.basename(data_path)
+            self._disk[key] = CacheEntry(key, size, record['expires_at'], record['meta'], path=data_path)
+            self._disk_bytes += size
+
+    def _remove_files(self, data_path):
+        for path in (data_path, data_path + '.json'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _drop(self, tier, key):
+        entry = tier.pop(key)
+        if tier is self._memory:
+            self._memory_bytes -= entry.size
+        else:
+            self._disk_bytes -= entry.size
+            self._remove_files(entry.path)
+        return entry
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            self._load_index()
+            for tier, counter in ((self._memory, 'memory_hits'), (self._disk, 'disk_hits')):
+                entry = tier.get(key)
+                if entry is None:
+                    continue
+                if entry.expires_at <= now or (entry.path is not None and not os.path.exists(entry.path)):
+                    self._drop(tier, key)
+                    self._counters['expirations'] += 1
+                    continue
+                tier.move_to_end(key)
+                self._counters['hits'] += 1
+                self._counters[counter] += 1
+                return entry
+            self._counters['misses'] += 1
+            return None
+
+    def put_bytes(self, key, content, **meta):
+        if not self.enabled:
+            return
+        content = bytes(content)
+        if len(content) > self.config['max_memory_item_bytes']:
+            self._put_disk(key, meta, lambda path: self._write_bytes(path, content), len(content))
+            return
+        entry = CacheEntry(key, len(content), time.time() + self.config['ttl_seconds'], meta, content=content)
+        with self._lock:
+            if key in self._memory:
+                self._drop(self._memory, key)
+            self._memory[key] = entry
+            self._memory_bytes += entry.size
+            self._counters['stores'] += 1
+            while self._memory_bytes > self.config['max_memory_bytes'] and self._memory:
+                self._drop(self._memory, next(iter(self._memory)))
+                self._counters['evictions'] += 1
+
+    def put_file(self, key, source_path, **meta):
+        if not self.enabled or not os.path.exists(source_path):
+            return
+        size = os.path.getsize(source_path)
+        self._put_disk(key, meta, lambda path: shutil.copyfile(source_path, path), size)
+
+    def _write_bytes(self, path, content):
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def _tmp_path(self, key):
+        return os.path.join(self.root, f"{key}.{threading.get_ident()}.{time.monotonic_ns()}.tmp")
+
+    def _put_disk(self, key, meta, write, size):
+        if size > self.config['max_disk_bytes']:
+            return
+        with self._lock:
+            self._load_index()
+        tmp_path = self._tmp_path(key)
+        try:
+            write(tmp_path)
+        except OSError as e:
+            print(f"Result cache write failed: {e}")
+            self._remove_files(tmp_path)
+            return
+        self._commit(key, tmp_path, size, meta)
+
+    def _commit(self, key, tmp_path, size, meta):
+        data_path = os.path.join(self.root, key)
+        expires_at = time.time() + self.config['ttl_seconds']
+        try:
+            os.replace(tmp_path, data_path)
+            with open(data_path + '.json', 'w') as f:
+                json.dump({'expires_at': expires_at, 'meta': meta}, f)
+        except OSError as e:
+            print(f"Result cache write failed: {e}")
+            self._remove_files(tmp_path)
+            return
+        with self._lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key).size
+            self._disk[key] = CacheEntry(key, size, expires_at, meta, path=data_path)
+            self._disk_bytes += size
+            self._counters['stores'] += 1
+            while self._disk_bytes > self.config['max_disk_bytes'] and len(self._disk) > 1:
+                self._drop(self._disk, next(iter(self._disk)))
+                self._counters['evictions'] += 1
+
+    def open_writer(self, key, **meta):
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._load_index()
+        return CacheWriter(self, key, meta)
+
+    async def tee(self, key, chunks, **meta):
+        # Pass a streamed response through unchanged while saving a copy.
+        writer = self.open_writer(key, **meta)
+        if writer is None:
+            async for chunk in chunks:
+                yield chunk
+            return
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(writer.write, chunk)
+                yield chunk
+        except BaseException:
+            writer.abort()
+            raise
+        await asyncio.to_thread(writer.commit)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for tier in (self._memory, self._disk):
+                for key in [k for k, entry in tier.items() if entry.expires_at <= now]:
+                    self._drop(tier, key)
+                    self._counters['expirations'] += 1
+
+    async def _purger(self):
+        while True:
+            await asyncio.sleep(self.config['purge_interval_seconds'])
+            try:
+                await asyncio.to_thread(self.purge_expired)
+            except Exception as e:
+                print(f"Result cache purge error: {e}")
+
+    def start_purger(self):
+        if self.enabled and self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purger())
+
+    def stop_purger(self):
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            self._purge_task = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_ratio': self._counters['hits'] / lookups if lookups else 0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+            }
+
+result_cache = ResultCache()
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import time
+from database import db_manager
+
+def get_stats_cache_config():
+    return {
+        'ttl_seconds': float(os.getenv('DASHBOARD_CACHE_TTL_SECONDS', '15')),
+        'max_stale_seconds': float(os.getenv('DASHBOARD_CACHE_MAX_STALE_SECONDS', '600')),
+    }
+
+class StatsCache:
+    # Serves the last computed value while it is fresh. Once it goes stale the
+    # old value is still returned straight away and a background refresh is
+    # started. Only one refresh runs at a time; every caller that needs a value
+    # while it is in flight shares it instead of issuing its own query.
+    def __init__(self, loader, config=None):
+        self.loader = loader
+        self.config = config or get_stats_cache_config()
+        self._value = None
+        self._loaded_at = 0
+        self._refresh = None
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def _start_refresh(self):
+        if self._refresh is None:
+            self._refresh = asyncio.create_task(self._run_refresh())
+            # Background refreshes have no awaiter; retrieve their exception
+            # so a failed one is not reported as never retrieved.
+            self._refresh.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._refresh
+
+    async def _run_refresh(self):
+        try:
+            value = await self.loader()
+        except Exception as e:
+            self._counters['refresh_errors'] += 1
+            print(f"Stats refresh failed: {e!r}")
+            raise
+        finally:
+            self._refresh = None
+        self._value = value
+        self._loaded_at = time.monotonic()
+        self._counters['refreshes'] += 1
+        return value
+
+    async def get(self):
+        age = time.monotonic() - self._loaded_at
+        if self._value is not None and age < self.config['ttl_seconds']:
+            self._counters['hits'] += 1
+            return self._value
+        if self._value is not None and age < self.config['ttl_seconds'] + self.config['max_stale_seconds']:
+            self._counters['stale_hits'] += 1
+            self._start_refresh()
+            return self._value
+        self._counters['misses'] += 1
+        try:
+            return await asyncio.shield(self._start_refresh())
+        except Exception:
+            if self._value is not None:
+                return self._value
+            raise
+
+    def stats(self):
+        return {
+            **self._counters,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._value is not None else None,
+            'refreshing': self._refresh is not None,
+        }
+
+dashboard_stats_cache = StatsCache(lambda: db_manager.run(db_manager.compute_dashboard_stats))
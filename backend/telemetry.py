@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from datetime import datetime
+from database import db_manager
+
+# Tool endpoints and the operation type they are recorded as. Requests to
+# any other path, including typos and 404s, are not recorded, so the
+# dashboard only ever sees operations the API actually serves. Page preview
+# listings and thumbnails are GETs and are not recorded either; only the
+# upload that starts a preview is.
+OPERATION_NAMES = {
+    '/api/split': 'split_pdf',
+    '/api/merge': 'merge_pdfs',
+    '/api/pdf-to-doc': 'pdf_to_doc',
+    '/api/doc-to-pdf': 'doc_to_pdf',
+    '/api/extract-images': 'extract_images',
+    '/api/compress-pdf': 'compress_pdf',
+    '/api/pdf/pages': 'preview',
+    '/api/images-to-pdf': 'images_to_pdf',
+    '/api/resize-image': 'resize_image',
+    '/api/crop-image': 'crop_image',
+    '/api/get-image-info': 'get_image_info',
+    '/api/get-image-info/batch': 'batch:get_image_info',
+    '/api/save-image': 'save_image',
+    '/api/convert-to-grayscale': 'convert_to_grayscale',
+    '/api/rotate-image': 'rotate_image',
+    '/api/flip-image': 'flip_image',
+    '/api/adjust-brightness': 'adjust_brightness',
+    '/api/adjust-contrast': 'adjust_contrast',
+    '/api/adjust-saturation': 'adjust_saturation',
+    '/api/apply-blur': 'apply_blur',
+    '/api/apply-sharpen': 'apply_sharpen',
+    '/api/compress-image': 'compress_image',
+    '/api/image-pipeline': 'image_pipeline',
+}
+
+_current_sample = contextvars.ContextVar('telemetry_sample', default=None)
+
+def get_telemetry_config():
+    return {
+        'enabled': os.getenv('TELEMETRY_ENABLED', 'true').lower() == 'true',
+        'queue_size': int(os.getenv('TELEMETRY_QUEUE_SIZE', '10000')),
+        'batch_size': int(os.getenv('TELEMETRY_BATCH_SIZE', '500')),
+        'flush_interval_seconds': float(os.getenv('TELEMETRY_FLUSH_INTERVAL_SECONDS', '2')),
+    }
+
+def register_operations(route, prefix, operations):
+    # Routes that take the operation in their path, like /api/batch/{op},
+    # are recorded as <prefix>:<op>, for the operations they accept only.
+    for operation in operations:
+        operation_type = f"{prefix}:{operation.replace('-', '_')}"
+        OPERATION_NAMES[f"{route}/{operation}"] = operation_type
+        OPERATION_NAMES[f"{route}/{operation.replace('-', '_')}"] = operation_type
+
+def operation_type_for(path):
+    return OPERATION_NAMES.get(path)
+
+def count_upload(file):
+    # Called by handlers as they ingest each upload, so the recorded size is
+    # the files themselves rather than the multipart envelope.
+    sample = _current_sample.get()
+    if sample is not None:
+        sample['file_count'] += 1
+        sample['file_size'] += file.size or 0
+
+class TelemetryWriter:
+    # Recording only appends a tuple to a bounded in-memory buffer. A
+    # background task drains it in batches with executemany. When the buffer
+    # is full or a flush fails, samples are dropped and counted instead of
+    # slowing requests down.
+    def __init__(self, config=None):
+        self.config = config or get_telemetry_config()
+        self._buffer = deque()
+        self._flush_task = None
+        self._wakeup = None
+        self._failing = False
+        self._counters = {'recorded': 0, 'flushed': 0, 'dropped': 0, 'flushes': 0, 'flush_errors': 0}
+
+    @property
+    def enabled(self):
+        return self.config['enabled']
+
+    def record(self, operation_type, status, file_count, file_size, processing_time_ms):
+        if len(self._buffer) >= self.config['queue_size']:
+            self._counters['dropped'] += 1
+            return
+        self._buffer.append((operation_type, status, file_count, file_size, processing_time_ms, datetime.now()))
+        self._counters['recorded'] += 1
+        if self._wakeup is not None and len(self._buffer) >= self.config['batch_size']:
+            self._wakeup.set()
+
+    async def flush(self):
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.config['batch_size']))]
+            try:
+                await db_manager.run(db_manager.record_operations, batch)
+            except Exception as e:
+                self._counters['dropped'] += len(batch)
+                self._counters['flush_errors'] += 1
+                if not self._failing:
+                    print(f"Telemetry flush failed, dropping samples until the database recovers: {e!r}")
+                self._failing = True
+                return
+            self._failing = False
+            self._counters['flushed'] += len(batch)
+            self._counters['flushes'] += 1
+
+    async def _flusher(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.config['flush_interval_seconds'])
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self.enabled and self._flush_task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flusher())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+            await self.flush()
+
+    def stats(self):
+        return {**self._counters, 'buffered': len(self._buffer)}
+
+class TelemetryMiddleware:
+    # Times every tool request from arrival until its last body chunk is sent
+    # and records the outcome.
+    def __init__(self, app, writer=None):
+        self.app = app
+        self.writer = writer or telemetry
+
+    async def __call__(self, scope, receive, send):
+        operation_type = None
+        if scope['type'] == 'http' and scope['method'] == 'POST' and self.writer.enabled:
+            operation_type = operation_type_for(scope['path'])
+        if operation_type is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        sample = {'file_count': 0, 'file_size': 0, 'status_code': 500, 'done': False}
+        token = _current_sample.set(sample)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                sample['status_code'] = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                sample['done'] = True
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_sample.reset(token)
+            status = 'success' if sample['done'] and sample['status_code'] < 400 else 'failed'
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            self.writer.record(operation_type, status, sample['file_count'], sample['file_size'], elapsed_ms)
+
+telemetry = TelemetryWriter()
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from contextlib import ExitStack
+import pytest
+from database import DatabaseManager, get_pool_config
+
+class BlockingConnection:
+    # Stands in for a pymysql connection. query() blocks until the statement
+    # is killed through another connection, like KILL QUERY does.
+    registry = {}
+
+    def __init__(self):
+        self.id = len(self.registry) + 1
+        self.open = True
+        self.killed = threading.Event()
+        self.registry[self.id] = self
+
+    def thread_id(self):
+        return self.id
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.open = False
+        self.killed.set()
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        if sql.startswith("KILL QUERY"):
+            self.registry[params[0]].killed.set()
+
+    def query(self, raise_on_kill):
+        self.killed.wait(5)
+        if raise_on_kill:
+            raise RuntimeError("Query execution was interrupted")
+        return "finished late"
+
+class StandInManager(DatabaseManager):
+    def __init__(self, size=2):
+        self.connections = []
+        super().__init__(config={}, pool_config={**get_pool_config(), 'size': size, 'timeout_seconds': 1})
+
+    def get_connection(self):
+        connection = BlockingConnection()
+        self.connections.append(connection)
+        return connection
+
+    def blocking_query(self, raise_on_kill=True):
+        with self.pool.connection() as connection:
+            return connection.query(raise_on_kill)
+
+@pytest.fixture
+def manager():
+    manager = StandInManager()
+    yield manager
+    for connection in manager.connections:
+        connection.close()
+    manager.shutdown()
+
+def time_out(manager, raise_on_kill=True):
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await manager.run(manager.blocking_query, raise_on_kill, timeout=0.1)
+        # The worker thread finishes once the kill has reached its query.
+        while manager.pool.stats()['in_use']:
+            await asyncio.sleep(0.01)
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+
+@pytest.mark.parametrize("raise_on_kill", [True, False])
+def test_timeout_kills_query_and_discards_connection(manager, raise_on_kill):
+    # Whether the killed query errors out or still returns, the caller gave
+    # up on it, so its connection must not go back to the pool.
+    time_out(manager, raise_on_kill)
+    blocked = manager.connections[0]
+    assert blocked.killed.is_set()
+    assert not blocked.open
+    stats = manager.stats()
+    assert stats['query_timeouts'] == 1
+    assert stats['discarded'] == 1
+    assert stats['idle'] == 0
+
+def test_pool_size_recovers_after_timeout(manager):
+    time_out(manager)
+    size = manager.pool.config['size']
+    with ExitStack() as stack:
+        held = [stack.enter_context(manager.pool.connection()) for _ in range(size)]
+        assert all(connection.open for connection in held)
+        assert manager.connections[0] not in held
+    assert manager.stats()['timeouts'] == 0
+    assert manager.stats()['idle'] == size
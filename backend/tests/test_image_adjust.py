@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+from image_tools import ADJUST_STRIP_ROWS, apply_adjustments, apply_sharpen
+
+# The fused pass must match chaining ImageEnhance to within this many levels
+# per channel. It is exact today; a non-zero tolerance would hide pivot and
+# rounding drift like the contrast mean being off by one.
+TOLERANCE = 0
+
+ENHANCERS = {
+    "brightness": ImageEnhance.Brightness,
+    "contrast": ImageEnhance.Contrast,
+    "saturation": ImageEnhance.Color,
+}
+
+def random_image(mode, width, height, seed):
+    bands = len(mode)
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, bands), dtype=np.uint8)
+    return Image.fromarray(pixels[:, :, 0] if bands == 1 else pixels, mode)
+
+def chained(img, adjustments):
+    for name, factor in adjustments:
+        img = ENHANCERS[name](img).enhance(factor)
+    return img
+
+def max_difference(a, b):
+    assert a.mode == b.mode and a.size == b.size
+    return int(np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).max())
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+@pytest.mark.parametrize("adjustments", [
+    [("brightness", 1.3)],
+    [("contrast", 0.6)],
+    [("saturation", 1.8)],
+    [("brightness", 0.8), ("contrast", 1.7)],
+    [("contrast", 1.4), ("saturation", 0.3), ("contrast", 0.9)],
+    [("saturation", 2.2), ("brightness", 1.1), ("contrast", 0.0)],
+])
+def test_fused_adjustments_match_image_enhance(mode, adjustments):
+    # Taller than one strip, so the strip-wise stages are exercised too.
+    img = random_image(mode, 97, ADJUST_STRIP_ROWS + 37, seed=len(adjustments))
+    assert max_difference(apply_adjustments(img, adjustments), chained(img, adjustments)) <= TOLERANCE
+
+def test_contrast_pivot_uses_rounded_luma():
+    # The weighted mean of the band means is 132 here, but Pillow rounds
+    # each pixel's luma and pivots on 133.
+    img = random_image("RGB", 16, 16, seed=43)
+    assert max_difference(apply_adjustments(img, [("contrast", 2.0)]), chained(img, [("contrast", 2.0)])) <= TOLERANCE
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_single_kernel_sharpen_matches_image_enhance(mode):
+    # One rounding instead of two (filter, then blend), so one level apart.
+    img = random_image(mode, 64, 48, seed=7)
+    assert max_difference(apply_sharpen(img, 2.0), ImageEnhance.Sharpness(img).enhance(2.0)) <= 1
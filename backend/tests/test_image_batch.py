@@ -0,0 +1,55 @@
+import io
+import json
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+import main
+from worker_pool import worker_pool
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # Workspaces and the result cache live under relative roots, so running
+    # from a scratch directory keeps the test's files out of the tree.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("batch"))
+        yield TestClient(main.app)
+    worker_pool.shutdown()
+
+def jpeg(size=(64, 48), colour=(200, 80, 40)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, colour).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def batch(client, operation, files, params):
+    return client.post(f"/api/batch/{operation}", files=[("files", file) for file in files], data={"params": json.dumps(params)})
+
+def test_failed_items_are_listed_in_errors_json(client):
+    response = batch(client, "resize-image", [
+        ("a.jpg", jpeg(), "image/jpeg"),
+        ("broken.png", b"\x89PNG\r\n\x1a\n" + b"\x00" * 64, "image/png"),
+        ("notes.txt", b"just some text", "text/plain"),
+        ("b.jpg", jpeg(colour=(10, 20, 30)), "image/jpeg"),
+    ], {"width": 32, "height": 24})
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.namelist() == ["a.jpg", "b.jpg", "errors.json"]
+    with Image.open(archive.open("a.jpg")) as img:
+        assert img.size == (32, 24)
+    errors = {error['file']: error['error'] for error in json.loads(archive.read("errors.json"))}
+    assert set(errors) == {"broken.png", "notes.txt"}
+    assert all(errors.values())
+
+def test_batch_without_failures_has_no_errors_json(client):
+    response = batch(client, "flip-image", [("a.jpg", jpeg(), "image/jpeg"), ("a.jpg", jpeg(colour=(0, 0, 0)), "image/jpeg")], {"direction": "horizontal"})
+    assert response.status_code == 200
+    # Uploads sharing a name are kept apart on disk and numbered in the zip.
+    assert zipfile.ZipFile(io.BytesIO(response.content)).namelist() == ["a.jpg", "a_2.jpg"]
+
+def test_batch_with_no_valid_images_is_rejected(client):
+    response = batch(client, "resize-image", [("notes.txt", b"just some text", "text/plain")], {"width": 32, "height": 24})
+    assert response.status_code == 400
+
+def test_invalid_parameters_reject_the_whole_batch(client):
+    response = batch(client, "resize-image", [("a.jpg", jpeg(), "image/jpeg")], {"width": 0, "height": 24})
+    assert response.status_code == 400
@@ -0,0 +1,75 @@
+import io
+import math
+import pytest
+from PIL import Image, ImageChops, ImageStat
+import image_tools
+from image_tools import center_crop_image, crop_image, resize_image
+
+# Reduced-resolution decodes must stay within this PSNR of a full decode.
+# Above ~40 dB differences are not visible.
+MIN_PSNR = 38.0
+
+def make_photo(width, height, format, **params):
+    # Smooth gradients plus noise behaves more like a photo than pure noise.
+    base = Image.linear_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (base, base.transpose(Image.FLIP_LEFT_RIGHT), base.rotate(90).resize((width, height))))
+    img = Image.blend(img, Image.effect_noise((width, height), 20).convert("RGB"), 0.15)
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+def full_decode(data):
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+def psnr(a, b):
+    diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    mse = sum(value ** 2 for value in ImageStat.Stat(diff).rms) / 3
+    return float("inf") if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+@pytest.fixture(scope="module")
+def jpeg():
+    return make_photo(2400, 1800, "JPEG", quality=92)
+
+@pytest.fixture(scope="module")
+def png():
+    return make_photo(1200, 900, "PNG")
+
+@pytest.mark.parametrize("target", [(200, 150), (500, 375)])
+def test_jpeg_reduced_decode_resize_matches_full_decode(jpeg, target):
+    out = resize_image(io.BytesIO(jpeg), *target)
+    assert out.size == target
+    assert psnr(full_decode(jpeg).resize(target), out) >= MIN_PSNR
+
+def test_jpeg_resize_uses_dct_scaling(jpeg):
+    img = Image.open(io.BytesIO(jpeg))
+    resize_image(img, 200, 150)
+    assert img.size[0] < 2400
+
+def test_png_crop_decodes_only_rows_above_the_crop(png):
+    img = Image.open(io.BytesIO(png))
+    out = crop_image(img, 100, 50, 400, 300)
+    assert img.size == (1200, 300)
+    assert out.tobytes() == full_decode(png).crop((100, 50, 400, 300)).tobytes()
+
+def test_png_center_crop_matches_full_decode(png):
+    out = center_crop_image(io.BytesIO(png), 400, 300)
+    left, top = (1200 - 400) // 2, (900 - 300) // 2
+    assert out.tobytes() == full_decode(png).crop((left, top, left + 400, top + 300)).tobytes()
+
+def test_unsupported_pillow_decodes_in_full(png, monkeypatch):
+    monkeypatch.setattr(image_tools, "PARTIAL_DECODE_PILLOW", ((0, 0), (0, 1)))
+    img = Image.open(io.BytesIO(png))
+    out = crop_image(img, 100, 50, 400, 300)
+    assert img.size == (1200, 900)
+    assert out.tobytes() == full_decode(png).crop((100, 50, 400, 300)).tobytes()
+
+def test_rewrite_not_honoured_falls_back_to_full_decode(png, monkeypatch):
+    # Stands in for a Pillow release where size no longer follows _size.
+    img = Image.open(io.BytesIO(png))
+    monkeypatch.setattr(type(img), "size", property(lambda self: (1200, 900)))
+    assert image_tools._decode_rows(img, 300) is False
+    assert img.tile[0][1] == (0, 0, 1200, 900)
+    monkeypatch.undo()
+    assert img.crop((100, 50, 400, 300)).tobytes() == full_decode(png).crop((100, 50, 400, 300)).tobytes()
@@ -0,0 +1,78 @@
+import pytest
+from PIL import Image
+from image_tools import _fuse_steps, parse_pipeline, run_image_pipeline, save_format
+
+def test_save_format_normalizes_known_formats():
+    assert save_format(" png ") == "PNG"
+    assert save_format("jpeg") == "JPEG"
+
+@pytest.mark.parametrize("format", ["BOGUS", "", "svg"])
+def test_save_format_rejects_formats_pillow_cannot_write(format):
+    with pytest.raises(ValueError):
+        save_format(format)
+
+def test_pipeline_save_image_uses_the_same_check():
+    assert parse_pipeline([{"operation": "save-image", "params": {"format": "webp"}}])[1] == {"quality": 80, "format": "WEBP"}
+    with pytest.raises(ValueError, match="save-image"):
+        parse_pipeline([{"operation": "save-image", "params": {"format": "BOGUS"}}])
+
+def fused_names(operations):
+    steps, _ = parse_pipeline(operations)
+    return [(name, args) for name, _, args in _fuse_steps(steps)]
+
+def test_crop_then_resize_becomes_one_step():
+    assert fused_names([
+        {"operation": "crop-image", "params": {"left": 10, "top": 20, "right": 410, "bottom": 320}},
+        {"operation": "resize-image", "params": {"width": 200, "height": 150}},
+    ]) == [("crop-resize", [(10, 20, 410, 320), 200, 150])]
+
+def test_consecutive_resizes_keep_only_the_last():
+    assert fused_names([
+        {"operation": "resize-image", "params": {"width": 800, "height": 600}},
+        {"operation": "resize-image", "params": {"width": 400, "height": 300}},
+        {"operation": "resize-image", "params": {"width": 200, "height": 150}},
+    ]) == [("resize-image", [200, 150])]
+
+def test_adjustment_runs_fuse_until_another_step():
+    assert fused_names([
+        {"operation": "adjust-brightness", "params": {"factor": 1.2}},
+        {"operation": "adjust_contrast", "params": {"factor": 0.8}},
+        {"operation": "flip-image", "params": {"direction": "horizontal"}},
+        {"operation": "adjust-saturation", "params": {"factor": 1.5}},
+    ]) == [
+        ("adjust", [("brightness", 1.2), ("contrast", 0.8)]),
+        ("flip-image", ["horizontal"]),
+        ("adjust", [("saturation", 1.5)]),
+    ]
+
+def test_resize_then_crop_is_not_fused():
+    assert [name for name, _ in fused_names([
+        {"operation": "resize-image", "params": {"width": 400, "height": 300}},
+        {"operation": "crop-image", "params": {"left": 0, "top": 0, "right": 100, "bottom": 100}},
+    ])] == ["resize-image", "crop-image"]
+
+def run_one_by_one(img, steps):
+    for _, func, args in steps:
+        img = func(img, *args)
+    return img
+
+def test_fused_adjustments_match_running_steps_one_by_one():
+    img = Image.effect_noise((640, 480), 40).convert("RGB")
+    steps, _ = parse_pipeline([
+        {"operation": "adjust-brightness", "params": {"factor": 1.1}},
+        {"operation": "adjust-contrast", "params": {"factor": 1.3}},
+        {"operation": "adjust-saturation", "params": {"factor": 0.7}},
+    ])
+    assert run_image_pipeline(img.copy(), steps).tobytes() == run_one_by_one(img, steps).tobytes()
+
+def test_fused_crop_resize_matches_running_steps_one_by_one():
+    # Resampling inside the source box may read pixels just outside the crop,
+    # so only a two-pixel border may differ from cropping first.
+    img = Image.effect_noise((640, 480), 40).convert("RGB")
+    steps, _ = parse_pipeline([
+        {"operation": "crop-image", "params": {"left": 40, "top": 30, "right": 600, "bottom": 450}},
+        {"operation": "resize-image", "params": {"width": 280, "height": 210}},
+    ])
+    fused = run_image_pipeline(img.copy(), steps)
+    assert fused.size == (280, 210)
+    assert fused.crop((2, 2, 278, 208)).tobytes() == run_one_by_one(img, steps).crop((2, 2, 278, 208)).tobytes()
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import io
+import pytest
+from fastapi import HTTPException
+from ingest import ContentLengthLimitMiddleware, get_ingest_config, ingest_upload, sniff
+
+PDF = b"%PDF-1.7\n" + b"x" * 100
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+class Upload:
+    # The parts of an UploadFile ingest_upload reads.
+    def __init__(self, data, filename="upload.bin", size=None):
+        self.file = io.BytesIO(data)
+        self.filename = filename
+        self.size = size
+
+def small_config(**max_bytes):
+    config = get_ingest_config()
+    return {**config, 'chunk_size': 16, 'max_bytes': {**config['max_bytes'], **max_bytes}}
+
+@pytest.mark.parametrize("head, kind", [
+    (PDF, 'pdf'),
+    (b"junk before the header " + PDF, 'pdf'),
+    (PNG, 'image'),
+    (b"\xff\xd8\xff\xe0" + b"\x00" * 20, 'image'),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", 'image'),
+    (b"\x00\x00\x00\x1cftypavif", 'image'),
+    (b"PK\x03\x04rest of a docx", 'document'),
+])
+def test_sniff_accepts_known_signatures(head, kind):
+    assert sniff(head, kind)
+
+@pytest.mark.parametrize("head, kind", [
+    (PNG, 'pdf'),
+    (b" " * 1024 + PDF, 'pdf'),
+    (PDF, 'image'),
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", 'image'),
+    (b"\x00\x00\x00\x1cftypmp42", 'image'),
+    (PDF, 'document'),
+])
+def test_sniff_rejects_other_content(head, kind):
+    assert not sniff(head, kind)
+
+def test_ingest_copies_and_hashes_in_chunks():
+    dest = io.BytesIO()
+    reserved = []
+    size, digest = ingest_upload(Upload(PDF), 'pdf', dest=dest, reserve=reserved.append, config=small_config())
+    assert (size, digest) == (len(PDF), hashlib.sha256(PDF).hexdigest())
+    assert dest.getvalue() == PDF
+    assert sum(reserved) == len(PDF) and max(reserved) == 16
+
+def test_ingest_without_dest_rewinds_the_upload():
+    upload = Upload(PNG)
+    ingest_upload(upload, 'image', config=small_config())
+    assert upload.file.read() == PNG
+
+def test_wrong_type_is_415_before_anything_is_copied():
+    dest = io.BytesIO()
+    with pytest.raises(HTTPException) as raised:
+        ingest_upload(Upload(PNG, "scan.pdf"), 'pdf', dest=dest, config=small_config())
+    assert raised.value.status_code == 415
+    assert "scan.pdf" in raised.value.detail
+    assert dest.getvalue() == b""
+
+def test_declared_size_over_the_limit_is_413_before_reading():
+    upload = Upload(PDF, size=10 ** 9)
+    with pytest.raises(HTTPException) as raised:
+        ingest_upload(upload, 'pdf', config=small_config(pdf=64))
+    assert raised.value.status_code == 413
+    assert upload.file.tell() == 0
+
+def test_streamed_size_over_the_limit_is_413():
+    # The size is unknown up front, so the limit is enforced as chunks arrive.
+    dest = io.BytesIO()
+    with pytest.raises(HTTPException) as raised:
+        ingest_upload(Upload(PDF), 'pdf', dest=dest, config=small_config(pdf=64))
+    assert raised.value.status_code == 413
+    assert len(dest.getvalue()) <= 64
+
+def request_with_length(length):
+    sent = []
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(True)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/api/merge', 'headers': [(b'content-length', str(length).encode())]}
+    asyncio.run(ContentLengthLimitMiddleware(app, max_request_bytes=1000)(scope, receive, send))
+    return called, sent
+
+def test_oversized_request_is_413_before_the_app_runs():
+    called, sent = request_with_length(1001)
+    assert not called
+    assert sent[0]['status'] == 413
+
+def test_request_within_the_limit_reaches_the_app():
+    called, sent = request_with_length(1000)
+    assert called and not sent
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from fastapi import HTTPException
+from jobs import JobError, JobQueue, get_jobs_config
+
+def make_queue(tmp_path, handler=None, **config):
+    root = str(tmp_path / "jobs")
+    queue = JobQueue({**get_jobs_config(), 'root': root, 'db_path': f"{root}/jobs.sqlite3", 'max_attempts': 2, **config})
+    queue.register('work', handler or succeed)
+    return queue
+
+def submit(queue, operation='work', priority=0):
+    job_id = queue.create()
+    queue.enqueue(job_id, operation, {}, priority)
+    return job_id
+
+async def succeed(job):
+    return ('out.pdf', 'out.pdf', 'application/pdf')
+
+def raising(error):
+    async def handler(job):
+        raise error
+    return handler
+
+def run(queue):
+    job = queue.claim()
+    asyncio.run(queue._run(job))
+    return queue.get(job.id)
+
+def expire_lease(queue, job_id):
+    queue._execute("UPDATE jobs SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, job_id))
+
+def test_claim_takes_highest_priority_then_oldest(tmp_path):
+    queue = make_queue(tmp_path)
+    low, first, second = submit(queue, priority=-1), submit(queue, priority=5), submit(queue, priority=5)
+    submit(queue, operation='unregistered', priority=10)
+    assert [queue.claim().id for _ in range(3)] == [first, second, low]
+    assert queue.claim() is None
+
+def test_expired_lease_is_reclaimed_until_max_attempts(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = submit(queue)
+    assert queue.claim().attempts == 1
+    assert queue.claim() is None
+    expire_lease(queue, job_id)
+    assert queue.claim().attempts == 2
+    expire_lease(queue, job_id)
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job['status'] == 'failed' and 'crashed' in job['error']
+
+def test_progress_renews_the_lease(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = submit(queue)
+    job = queue.claim()
+    expire_lease(queue, job_id)
+    job.set_progress(0.5)
+    assert queue.claim() is None
+    assert queue.get(job_id)['progress'] == 0.5
+
+def test_success_records_the_result(tmp_path):
+    queue = make_queue(tmp_path)
+    submit(queue)
+    job = run(queue)
+    assert (job['status'], job['progress'], job['result_name']) == ('succeeded', 1, 'out.pdf')
+
+@pytest.mark.parametrize("error", [
+    OSError("disk hiccup"),
+    BrokenProcessPool("worker died"),
+])
+def test_transient_errors_are_retried_then_fail(tmp_path, error):
+    queue = make_queue(tmp_path, raising(error))
+    submit(queue)
+    job = run(queue)
+    assert (job['status'], job['attempts']) == ('queued', 1)
+    assert job['error'].startswith("Attempt 1 failed")
+    job = run(queue)
+    assert (job['status'], job['attempts']) == ('failed', 2)
+
+def test_http_error_caused_by_a_broken_pool_is_retried(tmp_path):
+    error = HTTPException(status_code=503, detail="A worker process crashed.")
+    error.__cause__ = BrokenProcessPool()
+    queue = make_queue(tmp_path, raising(error))
+    submit(queue)
+    job = run(queue)
+    assert (job['status'], job['attempts']) == ('queued', 1)
+
+@pytest.mark.parametrize("error", [JobError("bad input"), HTTPException(status_code=400, detail="bad input")])
+def test_permanent_errors_fail_at_once(tmp_path, error):
+    queue = make_queue(tmp_path, raising(error))
+    submit(queue)
+    job = run(queue)
+    assert (job['status'], job['error'], job['attempts']) == ('failed', 'bad input', 1)
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_backpressure_defers_without_using_an_attempt(tmp_path, status_code):
+    queue = make_queue(tmp_path, raising(HTTPException(status_code=status_code, detail="busy", headers={'Retry-After': '30'})))
+    job_id = submit(queue)
+    before = time.time()
+    job = run(queue)
+    assert (job['status'], job['attempts']) == ('queued', 0)
+    assert job['available_at'] >= before + 30
+    assert queue.claim() is None
+    queue._execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+    assert queue.claim().id == job_id
+
+def test_defer_without_retry_after_uses_the_configured_delay(tmp_path):
+    queue = make_queue(tmp_path, raising(HTTPException(status_code=503, detail="busy")), busy_retry_seconds=7)
+    submit(queue)
+    before = time.time()
+    job = run(queue)
+    assert before + 7 <= job['available_at'] <= time.time() + 7
@@ -0,0 +1,30 @@
+import io
+import fitz
+from PIL import Image
+from pdf_tools import collect_image_jobs, recompress_images
+
+def make_pdf(path):
+    img = Image.effect_noise((400, 300), 60).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(0, 0, 200, 150), stream=buffer.getvalue())
+        doc.save(path)
+    return path
+
+def test_recompress_reports_no_failures(tmp_path):
+    path = make_pdf(str(tmp_path / "doc.pdf"))
+    jobs = collect_image_jobs(path, "low")
+    replacements, failed = recompress_images(path, jobs, "low")
+    assert len(jobs) == 1
+    assert len(replacements) == 1
+    assert failed == 0
+
+def test_recompress_counts_images_it_cannot_read(tmp_path, capsys):
+    path = make_pdf(str(tmp_path / "doc.pdf"))
+    jobs = collect_image_jobs(path, "low")
+    replacements, failed = recompress_images(path, jobs + [(9999, 0.5, 0)], "low")
+    assert len(replacements) == 1
+    assert failed == 1
+    assert "Could not recompress image 9999" in capsys.readouterr().out
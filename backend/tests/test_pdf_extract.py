@@ -0,0 +1,62 @@
+import io
+import os
+import fitz
+import numpy as np
+from PIL import Image
+from pdf_tools import extract_image_shard, plan_image_extraction
+
+def image_bytes(size=(120, 90), seed=50):
+    pixels = np.random.default_rng(seed).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    img = Image.fromarray(pixels)
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def make_pdf(path, pages):
+    # pages is a list of the images to draw on each page.
+    with fitz.open() as doc:
+        for images in pages:
+            page = doc.new_page()
+            for offset, image in enumerate(images):
+                page.insert_image(fitz.Rect(72, 72 + 100 * offset, 192, 162 + 100 * offset), stream=image)
+        doc.save(path)
+    return path
+
+def test_image_drawn_on_every_page_is_extracted_once(tmp_path):
+    logo = image_bytes()
+    path = make_pdf(str(tmp_path / "doc.pdf"), [[logo], [logo], [logo]])
+    assert [job[1:] for job in plan_image_extraction(path)] == [(1, 1, 120 * 90)]
+
+def test_image_embedded_separately_by_each_page_is_extracted_once(tmp_path):
+    logo = image_bytes()
+    sources = [make_pdf(str(tmp_path / f"{index}.pdf"), [[logo]]) for index in range(3)]
+    path = str(tmp_path / "doc.pdf")
+    with fitz.open() as doc:
+        for source in sources:
+            with fitz.open(source) as src:
+                doc.insert_pdf(src)
+        assert len({page.get_images()[0][0] for page in doc}) == 3
+        doc.save(path)
+    assert [job[1:3] for job in plan_image_extraction(path)] == [(1, 1)]
+
+def test_distinct_images_are_each_extracted_in_page_order(tmp_path):
+    path = make_pdf(str(tmp_path / "doc.pdf"), [[image_bytes(seed=10)], [image_bytes(seed=20), image_bytes(seed=10)]])
+    assert [job[1:3] for job in plan_image_extraction(path)] == [(1, 1), (2, 1)]
+
+def test_min_size_skips_images_with_a_short_side(tmp_path):
+    path = make_pdf(str(tmp_path / "doc.pdf"), [[image_bytes((200, 30)), image_bytes((120, 90))]])
+    assert len(plan_image_extraction(path)) == 2
+    assert [job[3] for job in plan_image_extraction(path, min_size=50)] == [120 * 90]
+    assert plan_image_extraction(path, min_size=100) == []
+
+def test_extract_shard_names_and_converts_images(tmp_path):
+    path = make_pdf(str(tmp_path / "doc.pdf"), [[image_bytes()], [image_bytes(seed=20)]])
+    jobs = plan_image_extraction(path)
+    out_dir = str(tmp_path / "out")
+    os.makedirs(out_dir)
+    original = extract_image_shard(path, out_dir, "doc", jobs)
+    assert [os.path.basename(p) for p in original] == ["doc_page1_img1.png", "doc_page2_img1.png"]
+    converted = extract_image_shard(path, out_dir, "doc", jobs, image_format="jpeg")
+    assert [os.path.basename(p) for p in converted] == ["doc_page1_img1.jpeg", "doc_page2_img1.jpeg"]
+    with Image.open(converted[0]) as img:
+        assert img.format == "JPEG" and img.size == (120, 90)
@@ -0,0 +1,86 @@
+import io
+import fitz
+import pytest
+from PIL import Image
+from pdf_tools import _canonical_xref, merge_pdf_files, parse_page_ranges
+
+def image_bytes(mode="RGB"):
+    img = Image.effect_noise((120, 90), 50).convert(mode)
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+def make_pdf(path, label, pages, image=None):
+    # Each page carries its label and number as text, so the merged order
+    # can be read back; image, if given, is drawn on every page.
+    with fitz.open() as doc:
+        for number in range(1, pages + 1):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"{label}{number}")
+            if image is not None:
+                page.insert_image(fitz.Rect(72, 100, 192, 190), stream=image)
+        doc.save(path)
+    return path
+
+def page_labels(path):
+    with fitz.open(path) as doc:
+        return [page.get_text().strip() for page in doc]
+
+def image_xrefs(path):
+    with fitz.open(path) as doc:
+        return {image[0] for page in doc for image in page.get_images(full=True)}
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("", 4, "a.pdf") == [(0, 3)]
+    assert parse_page_ranges("1-3, 5,9-", 10, "a.pdf") == [(0, 2), (4, 4), (8, 9)]
+    assert parse_page_ranges("-2", 10, "a.pdf") == [(0, 1)]
+    assert parse_page_ranges("", 0, "a.pdf") == []
+
+@pytest.mark.parametrize("spec", ["0", "3-2", "1-11", "x", "1-y"])
+def test_parse_page_ranges_rejects_bad_specs(spec):
+    with pytest.raises(ValueError, match="a.pdf"):
+        parse_page_ranges(spec, 10, "a.pdf")
+
+@pytest.mark.parametrize("engine", ["pymupdf", "pypdf2"])
+def test_merge_applies_page_ranges_per_file(tmp_path, engine):
+    a = make_pdf(str(tmp_path / "a.pdf"), "A", 5)
+    b = make_pdf(str(tmp_path / "b.pdf"), "B", 3)
+    output = str(tmp_path / "merged.pdf")
+    merge_pdf_files([a, b, a], output, page_ranges=["4-", "", "2"], engine=engine)
+    assert page_labels(output) == ["A4", "A5", "B1", "B2", "B3", "A2"]
+
+def test_merge_flushes_without_changing_the_result(tmp_path):
+    paths = [make_pdf(str(tmp_path / f"{label}.pdf"), label, 3) for label in "ABC"]
+    output = str(tmp_path / "merged.pdf")
+    merge_pdf_files(paths, output, flush_pages=2)
+    assert page_labels(output) == [f"{label}{number}" for label in "ABC" for number in (1, 2, 3)]
+    assert not (tmp_path / "merged.pdf.partial").exists()
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_merge_keeps_one_copy_of_an_image_shared_by_inputs(tmp_path, mode):
+    image = image_bytes(mode)
+    a = make_pdf(str(tmp_path / "a.pdf"), "A", 2, image)
+    b = make_pdf(str(tmp_path / "b.pdf"), "B", 2, image)
+    deduped, copied = str(tmp_path / "deduped.pdf"), str(tmp_path / "copied.pdf")
+    merge_pdf_files([a, b], deduped, garbage=1)
+    merge_pdf_files([a, b], copied, garbage=1, dedupe=False)
+    assert len(image_xrefs(copied)) == 2
+    assert len(image_xrefs(deduped)) == 1
+    assert page_labels(deduped) == ["A1", "A2", "B1", "B2"]
+
+def test_canonical_xref_matches_objects_through_their_references(tmp_path):
+    # An RGBA image refers to its own soft mask. Copied in from two inputs,
+    # the images differ in that reference and are only equal once both
+    # masks resolve to the same canonical xref.
+    image = image_bytes("RGBA")
+    sources = [make_pdf(str(tmp_path / f"{label}.pdf"), label, 1, image) for label in "AB"]
+    sources.append(make_pdf(str(tmp_path / "C.pdf"), "C", 1, image_bytes("RGBA")))
+    with fitz.open() as doc:
+        for path in sources:
+            with fitz.open(path) as src:
+                doc.insert_pdf(src)
+        first, second, other = [page.get_images(full=True)[0] for page in doc]
+        assert first[0] != second[0] and first[1] != second[1]
+        memo, index = {}, {}
+        assert _canonical_xref(doc, second[0], memo, index) == _canonical_xref(doc, first[0], memo, index)
+        assert _canonical_xref(doc, other[0], memo, index) != _canonical_xref(doc, first[0], memo, index)
@@ -0,0 +1,27 @@
+from result_cache import ResultCache, get_cache_config
+
+def make_cache(tmp_path):
+    return ResultCache({**get_cache_config(), 'root': str(tmp_path)})
+
+INPUTS = [("photo.png", "abc123")]
+
+def test_key_is_stable(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.make_key("flip_image", INPUTS, {'direction': "horizontal"}) == cache.make_key("flip_image", INPUTS, {'direction': "horizontal"})
+
+def test_key_changes_with_parameter_case(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.make_key("flip_image", INPUTS, {'direction': "Horizontal"}) != cache.make_key("flip_image", INPUTS, {'direction': "horizontal"})
+
+def test_key_changes_with_parameter_value(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.make_key("flip_image", INPUTS, {'direction': "vertical"}) != cache.make_key("flip_image", INPUTS, {'direction': "horizontal"})
+
+def test_key_changes_with_nested_parameter_case(tmp_path):
+    cache = make_cache(tmp_path)
+    pipeline = lambda direction: {'operations': [{'operation': "flip-image", 'params': {'direction': direction}}]}
+    assert cache.make_key("image_pipeline", INPUTS, pipeline("Horizontal")) != cache.make_key("image_pipeline", INPUTS, pipeline("horizontal"))
+
+def test_key_ignores_integral_float_and_dict_order(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.make_key("rotate_image", INPUTS, {'angle': 90.0, 'expand': True}) == cache.make_key("rotate_image", INPUTS, {'expand': True, 'angle': 90})
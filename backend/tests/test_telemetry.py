@@ -0,0 +1,54 @@
+import asyncio
+from telemetry import TelemetryMiddleware, operation_type_for, register_operations
+
+register_operations('/api/batch', 'batch', ['resize-image'])
+
+class RecordingWriter:
+    enabled = True
+
+    def __init__(self):
+        self.rows = []
+
+    def record(self, *row):
+        self.rows.append(row)
+
+async def ok_app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'ok'})
+
+def request(method, path):
+    writer = RecordingWriter()
+    middleware = TelemetryMiddleware(ok_app, writer)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware({'type': 'http', 'method': method, 'path': path}, receive, send))
+    return writer.rows
+
+def test_known_routes_are_mapped():
+    assert operation_type_for('/api/resize-image') == 'resize_image'
+    assert operation_type_for('/api/merge') == 'merge_pdfs'
+    assert operation_type_for('/api/batch/resize-image') == 'batch:resize_image'
+    assert operation_type_for('/api/batch/resize_image') == 'batch:resize_image'
+
+def test_unknown_paths_are_not_mapped():
+    assert operation_type_for('/api/resize-imag') is None
+    assert operation_type_for('/api/anything-at-all') is None
+    assert operation_type_for('/api/batch/not-an-operation') is None
+    assert operation_type_for('/api/jobs/typo') is None
+    assert operation_type_for('/elsewhere') is None
+
+def test_preview_upload_is_recorded_but_not_page_requests():
+    assert operation_type_for('/api/pdf/pages') == 'preview'
+    assert operation_type_for('/api/pdf/abc123/pages') is None
+    assert operation_type_for('/api/pdf/abc123/pages/0/thumbnail') is None
+
+def test_middleware_records_only_mapped_posts():
+    rows = request('POST', '/api/pdf/pages')
+    assert [row[:2] for row in rows] == [('preview', 'success')]
+    assert request('POST', '/api/typo') == []
+    assert request('GET', '/api/pdf/pages') == []
@@ -0,0 +1,42 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from metrics import WORKER_PROCESS_RESTARTS
+from worker_pool import WorkerPool, get_pool_config
+
+def die():
+    os._exit(1)
+
+def double(value):
+    return value * 2
+
+def restarts():
+    return WORKER_PROCESS_RESTARTS._values.get((), 0)
+
+def test_dead_worker_replaces_the_pool_once_and_counts_it():
+    pool = WorkerPool({**get_pool_config(), 'process_workers': 2})
+
+    async def scenario():
+        results = await asyncio.gather(pool.run("crash", die), pool.run("crash", die), return_exceptions=True)
+        return results, await pool.run("double", double, 21)
+
+    before = restarts()
+    try:
+        results, value = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    for result in results:
+        assert isinstance(result, HTTPException) and result.status_code == 503
+        assert isinstance(result.__cause__, BrokenProcessPool)
+    assert value == 42
+    assert restarts() == before + 1
+    assert pool.stats()['process_restarts'] == 1
+
+def test_restart_does_not_write_to_stdout(capsys):
+    pool = WorkerPool()
+    executor = pool._get_executor('process')
+    pool._discard_process_executor(executor)
+    pool._discard_process_executor(executor)
+    assert pool.stats()['process_restarts'] == 1
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,157 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from fastapi import HTTPException
+from metrics import WORKER_PROCESS_RESTARTS, WORKER_QUEUE_WAIT, WORKER_RUN
+
+# Default number of concurrent jobs per operation. Anything not listed here is
+# limited only by the size of the executor it runs on.
+DEFAULT_OPERATION_LIMITS = {
+    'split_pdf': 2,
+    'merge_pdfs': 2,
+    'compress_pdf': 2,
+    'pdf_to_doc': 2,
+    'doc_to_pdf': 2,
+    'extract_images': 2,
+    'images_to_pdf': 2,
+    'image': 8,
+    'image_batch': 4,
+    'render_page': 4,
+}
+
+def get_pool_config():
+    cpu_count = os.cpu_count() or 2
+    limits = dict(DEFAULT_OPERATION_LIMITS)
+    for operation in limits:
+        override = os.getenv(f'WORKER_LIMIT_{operation.upper()}')
+        if override:
+            limits[operation] = int(override)
+    return {
+        'process_workers': int(os.getenv('WORKER_PROCESSES', str(cpu_count))),
+        'thread_workers': int(os.getenv('WORKER_THREADS', str(min(32, cpu_count * 4)))),
+        'max_queue_depth': int(os.getenv('WORKER_MAX_QUEUE_DEPTH', '64')),
+        'max_operation_queue': int(os.getenv('WORKER_MAX_OPERATION_QUEUE', '16')),
+        'operation_limits': limits,
+    }
+
+class WorkerPool:
+    def __init__(self, config=None):
+        self.config = config or get_pool_config()
+        self._process_executor = None
+        self._thread_executor = None
+        self._semaphores = {}
+        self._waiting = {}
+        self._running = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._process_restarts = 0
+
+    def _get_executor(self, kind):
+        with self._lock:
+            if kind == 'process':
+                if self._process_executor is None:
+                    self._process_executor = ProcessPoolExecutor(
+                        max_workers=self.config['process_workers'],
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+                return self._process_executor
+            if kind == 'thread':
+                if self._thread_executor is None:
+                    self._thread_executor = ThreadPoolExecutor(
+                        max_workers=self.config['thread_workers'],
+                        thread_name_prefix='worker',
+                    )
+                return self._thread_executor
+        raise ValueError(f"Unknown executor kind: {kind}")
+
+    def _discard_process_executor(self, executor):
+        # A worker process that dies (e.g. to the OOM killer) breaks its
+        # whole executor. Only the first request to notice replaces it; the
+        # next one to run creates a fresh executor.
+        with self._lock:
+            if self._process_executor is not executor:
+                return
+            self._process_executor = None
+            self._process_restarts += 1
+        WORKER_PROCESS_RESTARTS.inc()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_semaphore(self, operation):
+        if operation not in self._semaphores:
+            limit = self.config['operation_limits'].get(operation)
+            if limit is None:
+                limit = max(self.config['process_workers'], self.config['thread_workers'])
+            self._semaphores[operation] = asyncio.Semaphore(limit)
+        return self._semaphores[operation]
+
+    def _check_capacity(self, operation, semaphore):
+        if self._pending >= self.config['max_queue_depth']:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry shortly.",
+                headers={'Retry-After': '5'},
+            )
+        if semaphore.locked() and self._waiting.get(operation, 0) >= self.config['max_operation_queue']:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many concurrent {operation} requests, please retry shortly.",
+                headers={'Retry-After': '2'},
+            )
+
+    async def run(self, operation, func, *args, kind='process', **kwargs):
+        semaphore = self._get_semaphore(operation)
+        self._check_capacity(operation, semaphore)
+        self._pending += 1
+        self._waiting[operation] = self._waiting.get(operation, 0) + 1
+        acquired = False
+        queued_at = time.perf_counter()
+        try:
+            async with semaphore:
+                acquired = True
+                started = time.perf_counter()
+                WORKER_QUEUE_WAIT.observe(started - queued_at, operation=operation)
+                self._waiting[operation] -= 1
+                self._running[operation] = self._running.get(operation, 0) + 1
+                executor = self._get_executor(kind)
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+                except BrokenProcessPool as e:
+                    self._discard_process_executor(executor)
+                    raise HTTPException(
+                        status_code=503,
+                        detail="A worker process crashed, please retry shortly.",
+                        headers={'Retry-After': '1'},
+                    ) from e
+                finally:
+                    self._running[operation] -= 1
+                    WORKER_RUN.observe(time.perf_counter() - started, operation=operation)
+        finally:
+            if not acquired:
+                self._waiting[operation] -= 1
+            self._pending -= 1
+
+    def stats(self):
+        return {
+            'pending': self._pending,
+            'waiting': dict(self._waiting),
+            'running': dict(self._running),
+            'operation_limits': dict(self.config['operation_limits']),
+            'process_restarts': self._process_restarts,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._process_executor is not None:
+                self._process_executor.shutdown(wait=False, cancel_futures=True)
+                self._process_executor = None
+            if self._thread_executor is not None:
+                self._thread_executor.shutdown(wait=False, cancel_futures=True)
+                self._thread_executor = None
+
+worker_pool = WorkerPool()
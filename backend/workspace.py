@@ -0,0 +1,216 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTasks
+from ingest import ingest_upload
+
+def get_workspace_config():
+    root = os.getenv('WORKSPACE_ROOT', 'temp_files')
+    if os.getenv('WORKSPACE_IN_MEMORY', 'false').lower() == 'true' and os.path.isdir('/dev/shm'):
+        root = os.path.join('/dev/shm', 'pdf_tools_workspaces')
+    return {
+        'root': root,
+        'max_bytes': int(os.getenv('WORKSPACE_MAX_BYTES', str(512 * 1024 * 1024))),
+        'total_max_bytes': int(os.getenv('WORKSPACE_TOTAL_MAX_BYTES', str(8 * 1024 * 1024 * 1024))),
+        'max_age_seconds': int(os.getenv('WORKSPACE_MAX_AGE_SECONDS', '3600')),
+        'sweep_interval_seconds': int(os.getenv('WORKSPACE_SWEEP_INTERVAL_SECONDS', '300')),
+    }
+
+def display_name(path):
+    # Drops the index prefix that keeps same-named uploads apart on disk.
+    return os.path.basename(path).split('_', 1)[1]
+
+class Workspace:
+    def __init__(self, manager, path):
+        self.manager = manager
+        self.path = path
+        self.bytes_used = 0
+        self.handed_off = False
+        self.closed = False
+        self.uploads = []
+        self.stored = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None or not self.handed_off:
+            self.cleanup()
+        return False
+
+    def file(self, filename, index=None):
+        # Files that belong to one upload carry its index, so uploads sharing
+        # a name do not overwrite each other.
+        filename = os.path.basename(filename)
+        if index is not None:
+            filename = f"{index:04d}_{filename}"
+        return os.path.join(self.path, filename)
+
+    def add_bytes(self, size):
+        self.manager._add_bytes(self, size)
+
+    def track(self, *paths):
+        for path in paths:
+            if os.path.exists(path):
+                self.add_bytes(os.path.getsize(path))
+
+    def save_upload(self, file, filename=None, kind=None):
+        # Stored under its upload index; the original name is only kept for
+        # display and the cache key.
+        filename = filename or file.filename
+        file_path = self.file(filename, self.stored)
+        self.stored += 1
+        try:
+            with open(file_path, "wb") as buffer:
+                size, digest = ingest_upload(file, kind, dest=buffer, reserve=self.add_bytes)
+        except BaseException:
+            os.remove(file_path)
+            raise
+        self.uploads.append((filename, digest))
+        return file_path
+
+    def _background(self, after):
+        background = BackgroundTasks()
+        if after is not None:
+            background.add_task(after)
+        return background
+
+    def file_response(self, path, after=None, **kwargs):
+        self.handed_off = True
+        return WorkspaceFileResponse(self, path, background=self._background(after), **kwargs)
+
+    def stream_response(self, content, after=None, **kwargs):
+        self.handed_off = True
+        return WorkspaceStreamingResponse(self, content, background=self._background(after), **kwargs)
+
+    def cleanup(self):
+        if self.closed:
+            return
+        self.closed = True
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.manager._release(self)
+
+class _ReleasesWorkspace:
+    # Background tasks only run after a response was sent in full, so the
+    # workspace is released here instead: also when the stream raises or
+    # the client disconnects half way.
+    def __init__(self, workspace, *args, **kwargs):
+        self.workspace = workspace
+        super().__init__(*args, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            close = getattr(getattr(self, 'body_iterator', None), 'aclose', None)
+            try:
+                if close is not None:
+                    await close()
+            finally:
+                self.workspace.cleanup()
+
+class WorkspaceFileResponse(_ReleasesWorkspace, FileResponse):
+    pass
+
+class WorkspaceStreamingResponse(_ReleasesWorkspace, StreamingResponse):
+    pass
+
+class WorkspaceManager:
+    def __init__(self, config=None):
+        self.config = config or get_workspace_config()
+        self.root = self.config['root']
+        self._lock = threading.Lock()
+        self._active = {}
+        self._bytes_held = 0
+        self._created = 0
+        self._swept = 0
+        self._janitor_task = None
+
+    def create(self):
+        with self._lock:
+            if self._bytes_held >= self.config['total_max_bytes']:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is out of scratch space, please retry shortly.",
+                    headers={'Retry-After': '10'},
+                )
+        path = os.path.join(self.root, uuid.uuid4().hex)
+        os.makedirs(path)
+        workspace = Workspace(self, path)
+        with self._lock:
+            self._active[path] = workspace
+            self._created += 1
+        return workspace
+
+    def _add_bytes(self, workspace, size):
+        with self._lock:
+            if workspace.bytes_used + size > self.config['max_bytes']:
+                raise HTTPException(status_code=413, detail="Request exceeds the maximum processing size.")
+            workspace.bytes_used += size
+            self._bytes_held += size
+
+    def _release(self, workspace):
+        with self._lock:
+            if self._active.pop(workspace.path, None) is not None:
+                self._bytes_held -= workspace.bytes_used
+
+    def sweep(self):
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - self.config['max_age_seconds']
+        removed = 0
+        for entry in os.scandir(self.root):
+            with self._lock:
+                active = entry.path in self._active
+            # Active workspaces are released by their own request, however
+            # long it runs; only leftovers of dead processes are swept.
+            if active:
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        with self._lock:
+            self._swept += removed
+        return removed
+
+    async def _janitor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Workspace janitor error: {e}")
+            await asyncio.sleep(self.config['sweep_interval_seconds'])
+
+    def start_janitor(self):
+        os.makedirs(self.root, exist_ok=True)
+        if self._janitor_task is None:
+            self._janitor_task = asyncio.create_task(self._janitor())
+
+    def stop_janitor(self):
+        if self._janitor_task is not None:
+            self._janitor_task.cancel()
+            self._janitor_task = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'root': self.root,
+                'active_workspaces': len(self._active),
+                'bytes_held': self._bytes_held,
+                'workspaces_created': self._created,
+                'workspaces_swept': self._swept,
+            }
+
+workspace_manager = WorkspaceManager()
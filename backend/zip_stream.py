@@ -0,0 +1,83 @@
+import asyncio
+import os
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+# Members that are already compressed are stored as-is; deflating them again
+# burns CPU for a saving of a few bytes.
+STORED_EXTENSIONS = {
+    '.pdf', '.docx', '.xlsx', '.pptx', '.zip', '.gz',
+    '.jpg', '.jpeg', '.jpx', '.jp2', '.png', '.gif', '.webp', '.avif', '.jb2',
+}
+
+class _ChunkSink:
+    # Write-only file object for ZipFile. It has no seek(), so ZipFile
+    # writes data descriptors after each member instead of seeking back.
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def compress_type_for(arcname):
+    if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def _write_chunk(dest, src):
+    chunk = src.read(CHUNK_SIZE)
+    if chunk:
+        dest.write(chunk)
+    return bool(chunk)
+
+async def stream_zip(members):
+    # members is an async iterable of (arcname, path) pairs. Each member is
+    # sent as soon as it is yielded, so the client starts receiving the
+    # archive while later members are still being produced.
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, 'w')
+    seen = set()
+    async for arcname, path in members:
+        arcname = _unique_name(arcname, seen)
+        info = zipfile.ZipInfo.from_file(path, arcname)
+        info.compress_type = compress_type_for(arcname)
+        with open(path, 'rb') as src, archive.open(info, 'w') as dest:
+            while await asyncio.to_thread(_write_chunk, dest, src):
+                data = sink.drain()
+                if data:
+                    yield data
+        data = sink.drain()
+        if data:
+            yield data
+    archive.close()
+    yield sink.drain()
+
+def _unique_name(arcname, seen):
+    name = arcname
+    stem, ext = os.path.splitext(arcname)
+    counter = 1
+    while name in seen:
+        counter += 1
+        name = f"{stem}_{counter}{ext}"
+    seen.add(name)
+    return name
+
+async def iterate_paths(paths, names=None):
+    # Members are named after their files unless names are given.
+    for path, name in zip(paths, names or map(os.path.basename, paths)):
+        yield name, path
@@ -7,6 +7,10 @@ import Dashboard from './components/Dashboard';
 import Footer from './components/Footer';
 import AboutModal from './components/AboutModal';
 import FloatingBadge from './components/FloatingBadge';
+import PagePreviews from './components/PagePreviews';
+
+const JOB_OPERATIONS = ['pdf-to-doc', 'doc-to-pdf'];
+const JOB_POLL_INTERVAL_MS = 1500;
 
 function App() {
   console.log('API Base URL:', process.env.REACT_APP_API_URL);
@@ -167,6 +171,31 @@ function App() {
       });
   };
 
+  // Long conversions are submitted as jobs and polled, so no request has to
+  // stay open for the whole conversion.
+  const runJob = async (operation, formData) => {
+    const submitted = await fetch(`${process.env.REACT_APP_API_URL}/api/jobs/${operation}`, {
+      method: 'POST',
+      body: formData,
+    });
+    if (!submitted.ok) {
+      return submitted;
+    }
+    let job = await submitted.json();
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const status = await fetch(`${process.env.REACT_APP_API_URL}${job.status_url}`);
+      if (!status.ok) {
+        return status;
+      }
+      job = await status.json();
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || `${operation} failed.`);
+    }
+    return fetch(`${process.env.REACT_APP_API_URL}${job.result_url}`);
+  };
+
   const handleOperation = (operation) => {
     const formData = new FormData();
 
@@ -184,10 +213,14 @@ function App() {
       formData.append('files', file);
     }
 
-    fetch(`${process.env.REACT_APP_API_URL}/api/${operation}`, {
-      method: 'POST',
-      body: formData,
-    })
+    const request = JOB_OPERATIONS.includes(operation)
+      ? runJob(operation, formData)
+      : fetch(`${process.env.REACT_APP_API_URL}/api/${operation}`, {
+          method: 'POST',
+          body: formData,
+        });
+
+    request
       .then(async (response) => {
         if (!response.ok) {
           const errorData = await response.json();
@@ -309,12 +342,20 @@ function App() {
                   <label htmlFor="custom">Custom Split (e.g., 1-4,6-7)</label>
                 </div>
                 {splitType === 'custom' && (
-                  <input
-                    type="text"
-                    placeholder="Enter custom ranges (e.g., 1-4,6-7)"
-                    value={customRanges}
-                    onChange={(e) => setCustomRanges(e.target.value)}
-                  />
+                  <>
+                    <input
+                      type="text"
+                      placeholder="Enter custom ranges (e.g., 1-4,6-7)"
+                      value={customRanges}
+                      onChange={(e) => setCustomRanges(e.target.value)}
+                    />
+                    {selectedFiles.length === 1 && (
+                      <PagePreviews
+                        file={selectedFiles[0]}
+                        onPageClick={(page) => setCustomRanges((ranges) => (ranges ? `${ranges},${page}-${page}` : `${page}-${page}`))}
+                      />
+                    )}
+                  </>
                 )}
                 <button onClick={handleSplitConfirm}>Split</button>
                 <button onClick={() => setShowSplitOptions(false)}>Cancel</button>
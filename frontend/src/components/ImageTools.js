@@ -1,6 +1,12 @@
 import React, { useState, useRef, useEffect } from 'react';
 import './ImageTools.css';
 
+// Headers of almost every image fit in the first 64 KB, so only that much is
+// uploaded to read its info.
+const PROBE_BYTES = 64 * 1024;
+// Images that take more memory than this once decoded get a warning.
+const LARGE_DECODE_BYTES = 512 * 1024 * 1024;
+
 const ImageTools = () => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [originalImageUrl, setOriginalImageUrl] = useState(null);
@@ -28,7 +34,7 @@ const ImageTools = () => {
     saturation: 1.0,
     blur: 0,
     sharpen: 1.0,
-    compression: { quality: 80, format: 'JPEG' }
+    compression: { quality: 80, format: 'JPEG', targetKb: 0 }
   });
 
   const fileInputRef = useRef(null);
@@ -52,16 +58,24 @@ const ImageTools = () => {
   const getImageInfo = async (file) => {
     if (!file) return;
     
-    const formData = new FormData();
-    formData.append('file', file);
-
-    try {
-      const response = await fetch(`${process.env.REACT_APP_API_URL}/api/get-image-info`, {
+    const probe = (body) => {
+      const formData = new FormData();
+      formData.append('file', body, file.name);
+      formData.append('file_size', file.size);
+      return fetch(`${process.env.REACT_APP_API_URL}/api/get-image-info`, {
         method: 'POST',
         body: formData,
       });
+    };
+
+    try {
+      let response = await probe(file.size > PROBE_BYTES ? file.slice(0, PROBE_BYTES) : file);
+      if (response.status === 422) {
+        // The header runs past the prefix, so send the whole file
+        response = await probe(file);
+      }
       const data = await response.json();
-      setImageInfo(data);
+      setImageInfo(response.ok ? data : null);
     } catch (error) {
       console.error('Error getting image info:', error);
     }
@@ -102,6 +116,8 @@ const ImageTools = () => {
       const response = await fetch(`${process.env.REACT_APP_API_URL}/api/${operation}`, {
         method: 'POST',
         body: formData,
+        // Lets the compressor pick AVIF or WebP when the format is auto
+        headers: operation === 'compress-image' ? { Accept: 'image/avif,image/webp,image/*' } : undefined,
       });
 
       if (!response.ok) {
@@ -145,35 +161,31 @@ const ImageTools = () => {
     let currentFile = selectedFile;
 
     try {
-      for (let i = 0; i < operationQueue.length; i++) {
-        const { operation, params } = operationQueue[i];
-        setBatchProgress(((i + 1) / operationQueue.length) * 100);
-
-        const formData = new FormData();
-        formData.append('file', currentFile);
-
-        // Add parameters to form data
-        Object.keys(params).forEach(key => {
-          formData.append(key, params[key]);
-        });
-
-        const response = await fetch(`${process.env.REACT_APP_API_URL}/api/${operation}`, {
-          method: 'POST',
-          body: formData,
-        });
-
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
+      // Apply the whole queue in one request so the image is decoded and encoded once
+      const formData = new FormData();
+      formData.append('file', currentFile);
+      formData.append('operations', JSON.stringify(
+        operationQueue.map(({ operation, params }) => ({ operation, params }))
+      ));
+
+      const response = await fetch(`${process.env.REACT_APP_API_URL}/api/image-pipeline`, {
+        method: 'POST',
+        body: formData,
+        // Lets a queued compress-image pick AVIF or WebP when the format is auto
+        headers: operationQueue.some(({ operation }) => operation === 'compress-image')
+          ? { Accept: 'image/avif,image/webp,image/*' } : undefined,
+      });
 
-        const blob = await response.blob();
-        const url = URL.createObjectURL(blob);
-        setPreviewImageUrl(url);
-        
-        // Update current file for next operation
-        currentFile = new File([blob], `processed_${selectedFile.name}`, { type: blob.type });
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
       }
 
+      const blob = await response.blob();
+      const url = URL.createObjectURL(blob);
+      setPreviewImageUrl(url);
+      setBatchProgress(100);
+      currentFile = new File([blob], `processed_${selectedFile.name}`, { type: blob.type });
+
       // Add batch operation to history
       const historyItem = {
         id: Date.now(),
@@ -491,8 +503,10 @@ const ImageTools = () => {
   };
 
   const applyCompression = () => {
-    const { quality, format } = editParams.compression;
-    handleImageOperation('compress-image', { quality, format });
+    const { quality, format, targetKb } = editParams.compression;
+    const params = { quality, format };
+    if (targetKb > 0) params.target_bytes = targetKb * 1024;
+    handleImageOperation('compress-image', params);
   };
 
   const quickOperations = [
@@ -627,6 +641,35 @@ const ImageTools = () => {
                       <span className="info-label">Color Mode:</span>
                       <span className="info-value">{imageInfo.mode || 'Unknown'}</span>
                     </div>
+                    {imageInfo.orientation > 1 && (
+                      <div className="info-item">
+                        <span className="info-label">Displayed As:</span>
+                        <span className="info-value">{imageInfo.display_size[0]} × {imageInfo.display_size[1]} px (EXIF orientation {imageInfo.orientation})</span>
+                      </div>
+                    )}
+                    {imageInfo.dpi && (
+                      <div className="info-item">
+                        <span className="info-label">Resolution:</span>
+                        <span className="info-value">{Math.round(imageInfo.dpi[0])} × {Math.round(imageInfo.dpi[1])} dpi</span>
+                      </div>
+                    )}
+                    {imageInfo.animated && (
+                      <div className="info-item">
+                        <span className="info-label">Frames:</span>
+                        <span className="info-value">{imageInfo.frames}</span>
+                      </div>
+                    )}
+                    {imageInfo.decoded_bytes && (
+                      <div className="info-item">
+                        <span className="info-label">Memory When Decoded:</span>
+                        <span className="info-value">{(imageInfo.decoded_bytes / 1024 / 1024).toFixed(1)} MB</span>
+                      </div>
+                    )}
+                    {imageInfo.decoded_bytes > LARGE_DECODE_BYTES && (
+                      <div className="info-warning">
+                        This image is very large once decoded; edits may be slow or fail. Consider resizing it first.
+                      </div>
+                    )}
                     {imageInfo.compression_info && (
                       <>
                         <div className="info-item">
@@ -963,11 +1006,25 @@ const ImageTools = () => {
                                 compression: { ...editParams.compression, format: e.target.value }
                               })}
                             >
+                              <option value="auto">Auto (smallest)</option>
                               <option value="JPEG">JPEG</option>
                               <option value="PNG">PNG</option>
                               <option value="WebP">WebP</option>
+                              <option value="AVIF">AVIF</option>
                             </select>
                           </div>
+                          <div className="input-group">
+                            <label>Target size (KB):</label>
+                            <input
+                              type="number"
+                              min="0"
+                              value={editParams.compression.targetKb}
+                              onChange={(e) => setEditParams({
+                                ...editParams,
+                                compression: { ...editParams.compression, targetKb: parseInt(e.target.value) || 0 }
+                              })}
+                            />
+                          </div>
                           <button onClick={applyCompression} className="btn-apply">
                             {isBatchMode ? 'Add Compression to Queue' : 'Apply Compression'}
                           </button>
@@ -0,0 +1,90 @@
+import React, { useState, useEffect, useRef } from 'react';
+import './PagePreviews.css';
+
+const THUMBNAIL_WIDTH = 120;
+const PAGE_BATCH = 200;
+
+// Shows lazily loaded thumbnails of every page of a PDF, so split ranges can
+// be picked by eye. Placeholders are sized from the page dimensions, so only
+// the thumbnails scrolled into view are ever requested.
+const PagePreviews = ({ file, onPageClick }) => {
+  const [doc, setDoc] = useState(null);
+  const [pages, setPages] = useState([]);
+  const [error, setError] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const sentinelRef = useRef(null);
+
+  useEffect(() => {
+    if (!file) return;
+    let cancelled = false;
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('limit', PAGE_BATCH);
+    setDoc(null);
+    setPages([]);
+    setError(null);
+    fetch(`${process.env.REACT_APP_API_URL}/api/pdf/pages`, { method: 'POST', body: formData })
+      .then(async (response) => {
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.detail || `HTTP error! status: ${response.status}`);
+        return data;
+      })
+      .then((data) => {
+        if (cancelled) return;
+        setDoc(data);
+        setPages(data.pages);
+      })
+      .catch((err) => !cancelled && setError(err.message));
+    return () => {
+      cancelled = true;
+    };
+  }, [file]);
+
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!doc || !sentinel || pages.length >= doc.page_count) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (!entries[0].isIntersecting || loadingMore) return;
+      setLoadingMore(true);
+      fetch(`${process.env.REACT_APP_API_URL}${doc.pages_url}?offset=${pages.length}&limit=${PAGE_BATCH}`)
+        .then((response) => response.json())
+        .then((data) => setPages((current) => [...current, ...data.pages]))
+        .catch((err) => setError(err.message))
+        .finally(() => setLoadingMore(false));
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [doc, pages, loadingMore]);
+
+  if (error) return <p className="page-previews-error">Preview unavailable: {error}</p>;
+  if (!doc) return <p className="page-previews-status">Loading page previews...</p>;
+
+  return (
+    <div className="page-previews">
+      <p className="page-previews-status">{doc.page_count} pages</p>
+      <div className="page-previews-grid">
+        {pages.map((page) => (
+          <button
+            key={page.number}
+            type="button"
+            className="page-preview"
+            onClick={() => onPageClick && onPageClick(page.number)}
+            title={`Page ${page.number}`}
+          >
+            <img
+              src={`${process.env.REACT_APP_API_URL}${doc.thumbnail_url.replace('{page}', page.number)}?width=${THUMBNAIL_WIDTH}`}
+              alt={`Page ${page.number}`}
+              loading="lazy"
+              width={THUMBNAIL_WIDTH}
+              height={Math.round((THUMBNAIL_WIDTH * page.height) / page.width)}
+            />
+            <span>{page.number}</span>
+          </button>
+        ))}
+        {pages.length < doc.page_count && <div ref={sentinelRef} className="page-previews-sentinel" />}
+      </div>
+    </div>
+  );
+};
+
+export default PagePreviews;